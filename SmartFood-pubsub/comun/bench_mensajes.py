@@ -0,0 +1,103 @@
+"""
+Tamaño y coste de codificar/decodificar los mensajes: JSON vs binario
+----------------------------------------------------------------------
+
+    python bench_mensajes.py --vocab kg_bundle.vocab.txt --n 20000
+
+Mensajes de ejemplo con la forma real (pedido con 3–8 ingredientes y los 7
+filtros nutricionales; respuesta con 5 recetas). Sin `--vocab` se usa un
+vocabulario sintético con esos términos. El tiempo de decodificación incluye
+el base64 con el que llegan los mensajes a la Cloud Function.
+
+    json      json.dumps / json.loads (antes)
+    binary    mensajes.py sin vocabulario (términos como cadenas)
+    vocab     mensajes.py con ids del vocabulario del KG
+"""
+
+import argparse
+import base64
+import random
+import time
+from typing import Callable, Dict, List
+
+from mensajes import PEDIDO, RESPUESTA, Vocab, decode, encode
+
+INGREDIENTS = ["egg", "potato", "butter", "onion", "garlic", "tomato", "chicken", "rice",
+               "milk", "flour", "salt", "sugar", "olive oil", "black pepper", "cheese", "carrot"]
+FILTERS = {
+    "has_calories": "low_calories", "has_total": "normal_fat", "has_sugar": "low_sugar",
+    "has_sodium": "normal_sodium", "has_protein": "high_protein",
+    "has_saturated": "low_saturated_fat", "has_carbs": "normal_carbs",
+}
+DISHES = ["quick and easy potato omelette", "garlic butter chicken with rice",
+          "creamy tomato soup", "cheesy baked potatoes", "carrot and onion stew"]
+
+
+def _samples(n: int, seed: int) -> Dict[int, List[Dict]]:
+    rng = random.Random(seed)
+    pedidos = [{
+        "chat_id": rng.randrange(10**9),
+        "ingredientes": rng.sample(INGREDIENTS, rng.randint(3, 8)),
+        "filters": FILTERS,
+        "k": 5,
+    } for _ in range(n)]
+    respuestas = [{
+        "chat_id": p["chat_id"],
+        "ingredientes": p["ingredientes"],
+        "recomendaciones": [{"dish": d, "score": rng.uniform(-15, -5)} for d in DISHES],
+    } for p in pedidos]
+    return {PEDIDO: pedidos, RESPUESTA: respuestas}
+
+
+def _time(fn: Callable, items: List, repeat: int = 3) -> float:
+    """µs por mensaje, mejor de `repeat` pasadas."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return best / len(items) * 1e6
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--vocab", help="kg_bundle.vocab.txt (por defecto, sintético)")
+    ap.add_argument("--n", type=int, default=20000)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    vocab = Vocab.load(args.vocab) if args.vocab else Vocab(
+        [*FILTERS, *INGREDIENTS, *FILTERS.values()]
+    )
+    samples = _samples(args.n, args.seed)
+    modes = {
+        "json":   (lambda k, p: encode(k, p, fmt="json"), lambda d: decode(d)),
+        "binary": (lambda k, p: encode(k, p, fmt="binary"), lambda d: decode(d)),
+        "vocab":  (lambda k, p: encode(k, p, vocab, fmt="binary"), lambda d: decode(d, vocab)),
+    }
+
+    print(f"{args.n} mensajes por tipo, vocabulario de {len(vocab)} términos")
+    print(f"{'tipo':<10} {'modo':<7} {'bytes':>6} {'b64':>6} {'enc µs':>7} {'dec µs':>7}")
+    for kind, name in ((PEDIDO, "pedido"), (RESPUESTA, "respuesta")):
+        payloads = samples[kind]
+        for mode, (enc, dec) in modes.items():
+            if mode == "vocab" and kind == RESPUESTA:
+                continue                  # el mensajero no tiene vocabulario
+            blobs = [base64.b64encode(enc(kind, p)) for p in payloads]
+            for p, b in zip(payloads[:100], blobs):
+                got = dec(base64.b64decode(b))
+                if kind == RESPUESTA:     # los scores viajan en float32
+                    assert [r["dish"] for r in got["recomendaciones"]] == [r["dish"] for r in p["recomendaciones"]]
+                else:
+                    assert got == p, (got, p)
+            size = sum(len(base64.b64decode(b)) for b in blobs) / len(blobs)
+            size_b64 = sum(map(len, blobs)) / len(blobs)
+            enc_us = _time(lambda p: enc(kind, p), payloads)
+            dec_us = _time(lambda b: dec(base64.b64decode(b)), blobs)
+            print(f"{name:<10} {mode:<7} {size:6.0f} {size_b64:6.0f} {enc_us:7.1f} {dec_us:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
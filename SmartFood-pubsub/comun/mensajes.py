@@ -0,0 +1,247 @@
+"""
+Formato binario versionado de los mensajes Pub/Sub entre funciones
+--------------------------------------------------------------------
+
+    webhook ──pedido──▶ recomendador ──respuesta──▶ mensajero
+    webhook ──imagen──▶ detector ──pedido──▶ recomendador
+
+    data = encode(PEDIDO, {"chat_id": 1, "ingredientes": [...], "filters": {...}, "k": 5}, vocab)
+    payload = decode(data, vocab)          # mismo dict que antes con json.loads
+
+Cada tipo de mensaje tiene un esquema fijo (`SCHEMAS`) y se empaqueta con
+`struct`, sin claves repetidas:
+
+    cabecera  "SF" | versión u8 | tipo u8 | n_vocab u32 | crc_vocab u32
+    fijo      escalares del esquema + longitud (u16) de cada lista
+    variable  ids i32 de los términos / cadenas; en las recetas, después sus scores f32
+    cadenas   tabla de cadenas separadas por \\0 hasta el final
+
+Ingredientes y filtros (`terms`, `filters`) van como id del vocabulario del
+KG (`Vocab`, exportado junto al bundle por export_bundle.py) y, si no están en
+él, como referencia a la tabla de cadenas (id negativo). El vocabulario solo
+crece por el final (incremental_update.py conserva los ids), así que la
+cabecera lleva cuántas etiquetas usó el emisor y el CRC de ese prefijo: el
+receptor con un vocabulario igual o más nuevo lo decodifica y, si no coincide,
+`decode` lanza VocabError. El recomendador fuerza entonces una recarga del
+bundle y decodifica otra vez; si sigue fallando, registra el error y descarta
+el mensaje (no se reintenta).
+
+`decode` acepta también el JSON de antes (primer byte "{"), y con
+MSG_FORMAT=json `encode` sigue escribiendo JSON, para desplegar las funciones
+en cualquier orden.
+
+Variables de entorno
+--------------------
+MSG_FORMAT   binary | json (binary)
+VOCAB_BLOB   ruta en MODEL_BUCKET del vocabulario (kg_bundle.vocab.txt) para los
+             emisores (webhook, detector); vacío = términos como cadenas
+"""
+
+import json
+import logging
+import os
+import struct
+import zlib
+from functools import lru_cache
+from typing import Dict, Iterable, List
+
+MSG_FORMAT = os.getenv("MSG_FORMAT", "binary")
+VOCAB_BLOB = os.getenv("VOCAB_BLOB", "")
+
+MAGIC = b"SF"
+VERSION = 1
+PEDIDO, IMAGEN, RESPUESTA = 1, 2, 3
+
+# tipo -> [(campo, tipo, valor por defecto)]; None = obligatorio
+SCHEMAS = {
+    PEDIDO: [
+        ("chat_id", "int", None),
+        ("k", "u16", 5),
+        ("ingredientes", "terms", ()),
+        ("filters", "filters", {}),
+    ],
+    IMAGEN: [
+        ("chat_id", "int", None),
+        ("file_id", "str", None),
+        ("k", "u16", 5),
+        ("filters", "filters", {}),
+    ],
+    RESPUESTA: [
+        ("chat_id", "int", None),
+        ("ingredientes", "terms", ()),
+        ("recomendaciones", "recs", ()),
+    ],
+}
+
+# formato struct de los escalares (las listas guardan aquí su longitud, u16) y
+# de la parte variable de cada lista de longitud n
+_SCALAR = {"int": "q", "u16": "H", "str": "i"}
+_ITEM = {"terms": "{n}i", "filters": "{n2}i", "recs": "{n}i{n}f"}
+
+_HEADER = struct.Struct("<2sBBII")
+_FIXED = {
+    kind: struct.Struct("<" + "".join(_SCALAR.get(k, "H") for _, k, _ in schema))
+    for kind, schema in SCHEMAS.items()
+}
+
+
+class VocabError(ValueError):
+    """El mensaje usa ids de un vocabulario que el receptor no tiene."""
+
+
+class Vocab:
+    """Etiquetas de términos (relaciones + entidades que no son receta) en orden de id."""
+
+    def __init__(self, labels: Iterable[str]):
+        self.labels: List[str] = list(labels)
+        self.index: Dict[str, int] = {}
+        for i, label in enumerate(self.labels):
+            self.index.setdefault(label, i)
+        self._crc: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @classmethod
+    def load(cls, path) -> "Vocab":
+        with open(path, encoding="utf-8") as f:
+            return cls(f.read().splitlines())
+
+    def save(self, path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.labels))
+
+    def crc(self, n: int | None = None) -> int:
+        """CRC32 de las primeras `n` etiquetas (todas por defecto)."""
+        n = len(self.labels) if n is None else n
+        if n not in self._crc:
+            self._crc[n] = zlib.crc32("\n".join(self.labels[:n]).encode())
+        return self._crc[n]
+
+
+def load_vocab(bucket: str, blob: str = VOCAB_BLOB, dest: str = "/tmp/kg_vocab.txt") -> Vocab | None:
+    """Vocabulario desde GCS (una vez por instancia); None si no hay VOCAB_BLOB o falla."""
+    if not blob:
+        return None
+    try:
+        if not os.path.exists(dest):
+            from google.cloud import storage
+            storage.Client().bucket(bucket).blob(blob).download_to_filename(dest)
+        return Vocab.load(dest)
+    except Exception as e:          # sin vocabulario los términos viajan como cadenas
+        logging.warning(f"Vocabulario {blob} no disponible: {e}")
+        return None
+
+
+@lru_cache(maxsize=256)
+def _struct(fmt: str) -> struct.Struct:
+    return struct.Struct("<" + fmt)
+
+
+def encode(kind: int, payload: Dict, vocab: Vocab | None = None, fmt: str | None = None) -> bytes:
+    """Mensaje `kind` (PEDIDO / IMAGEN / RESPUESTA) en binario, o JSON si fmt/MSG_FORMAT = json."""
+    if (fmt or MSG_FORMAT) == "json":
+        return json.dumps(payload).encode()
+    try:
+        return _encode_binary(kind, payload, vocab)
+    except (ValueError, TypeError):  # cadenas con \0, valores fuera de rango o no str: JSON de reserva
+        return json.dumps(payload).encode()
+
+
+def _encode_binary(kind: int, payload: Dict, vocab: Vocab | None) -> bytes:
+    index = vocab.index if vocab is not None else {}
+    strings: List[str] = []
+    used_vocab = False
+
+    def terms(labels) -> List[int]:
+        nonlocal used_vocab
+        ids = [index.get(label) for label in labels]
+        for j, i in enumerate(ids):
+            if i is None:
+                ids[j] = ~len(strings)
+                strings.append(labels[j])
+            else:
+                used_vocab = True
+        return ids
+
+    fixed, variable, variable_fmt = [], [], []
+    for name, kind_, default in SCHEMAS[kind]:
+        value = payload.get(name, default)
+        if value is None:
+            raise KeyError(name)
+        if kind_ in ("int", "u16"):
+            fixed.append(int(value))
+        elif kind_ == "str":
+            fixed.append(~len(strings))
+            strings.append(str(value))
+        elif kind_ == "terms":
+            fixed.append(len(value))
+            variable += terms(list(value))
+            variable_fmt.append(f"{len(value)}i")
+        elif kind_ == "filters":
+            fixed.append(len(value))
+            variable += terms([label for pair in value.items() for label in pair])
+            variable_fmt.append(f"{2 * len(value)}i")
+        elif kind_ == "recs":
+            fixed.append(len(value))
+            variable += [~(len(strings) + j) for j in range(len(value))]
+            strings += [r["dish"] for r in value]
+            variable += [float(r["score"]) for r in value]
+            variable_fmt.append(f"{len(value)}i{len(value)}f")
+
+    table = "\0".join(strings)
+    if strings and table.count("\0") != len(strings) - 1:
+        raise ValueError("cadena con \\0")
+    try:
+        return b"".join((
+            _HEADER.pack(MAGIC, VERSION, kind, len(vocab) if used_vocab else 0,
+                         vocab.crc() if used_vocab else 0),
+            _FIXED[kind].pack(*fixed),
+            _struct("".join(variable_fmt)).pack(*variable),
+            table.encode(),
+        ))
+    except struct.error as e:
+        raise ValueError(str(e)) from None
+
+
+def decode(data: bytes, vocab: Vocab | None = None) -> Dict:
+    """Dict del mensaje, sea binario o JSON."""
+    if data[:2] != MAGIC:
+        return json.loads(data)
+    _, version, kind, n_vocab, crc = _HEADER.unpack_from(data)
+    if version != VERSION or kind not in SCHEMAS:
+        raise ValueError(f"Mensaje de versión {version} / tipo {kind} desconocido")
+    if n_vocab and (vocab is None or n_vocab > len(vocab) or vocab.crc(n_vocab) != crc):
+        raise VocabError(f"vocabulario del emisor ({n_vocab} términos) no disponible")
+
+    schema = SCHEMAS[kind]
+    fixed_struct = _FIXED[kind]
+    fixed = fixed_struct.unpack_from(data, _HEADER.size)
+    offset = _HEADER.size + fixed_struct.size
+    variable_struct = _struct("".join(
+        _ITEM[k].format(n=n, n2=2 * n) for (_, k, _), n in zip(schema, fixed) if k in _ITEM
+    ))
+    variable = variable_struct.unpack_from(data, offset)
+    strings = data[offset + variable_struct.size:].decode().split("\0")
+    labels = vocab.labels if vocab is not None else ()
+
+    out: Dict = {}
+    pos = 0
+    for (name, kind_, _), value in zip(schema, fixed):
+        if kind_ in ("int", "u16"):
+            out[name] = value
+        elif kind_ == "str":
+            out[name] = strings[~value]
+        elif kind_ == "terms":
+            out[name] = [labels[i] if i >= 0 else strings[~i] for i in variable[pos:pos + value]]
+            pos += value
+        elif kind_ == "filters":
+            items = [labels[i] if i >= 0 else strings[~i] for i in variable[pos:pos + 2 * value]]
+            out[name] = dict(zip(items[::2], items[1::2]))
+            pos += 2 * value
+        elif kind_ == "recs":
+            dishes = [strings[~i] for i in variable[pos:pos + value]]
+            scores = variable[pos + value:pos + 2 * value]
+            out[name] = [{"dish": d, "score": sc} for d, sc in zip(dishes, scores)]
+            pos += 2 * value
+    return out
@@ -0,0 +1,145 @@
+"""
+Publicación en Pub/Sub con batching configurable y flush explícito
+-------------------------------------------------------------------
+
+`PublisherClient.publish` devuelve un future y envía en segundo plano; si la
+función vuelve sin esperarlo, la instancia puede congelarse con el mensaje
+aún en el batch y perderse. Este envoltorio guarda los futures de cada
+invocación (por hilo: cada petición concurrente espera solo los suyos) y
+`flush()` los espera antes de devolver la respuesta:
+
+    from publisher import Publisher
+    publisher = Publisher()
+    topic = publisher.topic_path(PROJECT_ID, "mensaje_respuesta")
+    publisher.publish(topic, data)
+    publisher.flush()          # lanza PublishError si algún mensaje no se publicó
+
+Con varias peticiones concurrentes en la instancia (detector, concurrencia 16)
+los mensajes que llegan dentro de PUBSUB_MAX_LATENCY_MS salen en la misma
+llamada a la API. `stats()` da, por topic, número de mensajes, errores y la
+latencia p50/p99 desde `publish` hasta la confirmación del servidor.
+
+`set_default_client` cambia el cliente de los Publisher que se creen después
+sin `client` explícito (fused.py lo sustituye por colas en memoria).
+
+Variables de entorno
+--------------------
+PUBSUB_MAX_MESSAGES    mensajes máx. por batch (100)
+PUBSUB_MAX_BYTES       bytes máx. por batch (1000000)
+PUBSUB_MAX_LATENCY_MS  espera máx. antes de enviar un batch incompleto (10)
+PUBSUB_FLUSH_TIMEOUT   segundos máx. que espera flush() (30)
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, List
+
+from google.cloud import pubsub_v1
+
+MAX_MESSAGES   = int(os.getenv("PUBSUB_MAX_MESSAGES", "100"))
+MAX_BYTES      = int(os.getenv("PUBSUB_MAX_BYTES", "1000000"))
+MAX_LATENCY_MS = float(os.getenv("PUBSUB_MAX_LATENCY_MS", "10"))
+FLUSH_TIMEOUT  = float(os.getenv("PUBSUB_FLUSH_TIMEOUT", "30"))
+
+_DEFAULT_CLIENT = None
+
+
+def set_default_client(client) -> None:
+    """Cliente (con `topic_path` y `publish` como PublisherClient) para los Publisher sin `client`."""
+    global _DEFAULT_CLIENT
+    _DEFAULT_CLIENT = client
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """Percentil por el método del rango más cercano de una lista ya ordenada."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(len(values) * q / 100) - 1))]
+
+
+class PublishError(RuntimeError):
+    """Algún mensaje no llegó a publicarse; la función debe fallar para que se reintente."""
+
+
+class _TopicStats:
+    __slots__ = ("count", "errors", "latencies")
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.errors = 0
+        self.latencies: "deque[float]" = deque(maxlen=window)   # segundos
+
+
+class Publisher:
+    def __init__(self, max_messages: int = MAX_MESSAGES, max_bytes: int = MAX_BYTES,
+                 max_latency_ms: float = MAX_LATENCY_MS, client=None, window: int = 1000):
+        self.batch_settings = pubsub_v1.types.BatchSettings(
+            max_messages=max_messages, max_bytes=max_bytes, max_latency=max_latency_ms / 1e3,
+        )
+        self.client = client or _DEFAULT_CLIENT or pubsub_v1.PublisherClient(batch_settings=self.batch_settings)
+        self._local = threading.local()            # futures pendientes de la petición en curso
+        self._stats: Dict[str, _TopicStats] = defaultdict(lambda: _TopicStats(window))
+        self._lock = threading.Lock()
+
+    def topic_path(self, project: str, topic: str) -> str:
+        return self.client.topic_path(project, topic)
+
+    def publish(self, topic: str, data: bytes, **attrs: str):
+        """Encola `data` en el batch del topic; devuelve el future de la librería."""
+        start = time.perf_counter()
+        future = self.client.publish(topic, data, **attrs)
+        future.add_done_callback(lambda f: self._record(topic, start, f))
+        self._pending().append((topic, future))
+        return future
+
+    def flush(self, timeout: float = FLUSH_TIMEOUT) -> List[str]:
+        """Espera a todo lo publicado desde el último flush; devuelve los message_id."""
+        pending, self._local.pending = self._pending(), []
+        deadline = time.monotonic() + timeout
+        ids, errors = [], []
+        for topic, future in pending:
+            try:
+                ids.append(future.result(timeout=max(deadline - time.monotonic(), 0)))
+            except Exception as e:
+                errors.append(f"{topic.rsplit('/', 1)[-1]}: {e!r}")
+        if errors:
+            raise PublishError(f"{len(errors)}/{len(pending)} mensajes sin publicar: {'; '.join(errors[:3])}")
+        return ids
+
+    def _pending(self) -> List:
+        if not hasattr(self._local, "pending"):
+            self._local.pending = []
+        return self._local.pending
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """{topic: {count, errors, p50_ms, p99_ms}} sobre los últimos `window` mensajes."""
+        out = {}
+        with self._lock:
+            for topic, s in self._stats.items():
+                lat = sorted(s.latencies)
+                out[topic.rsplit("/", 1)[-1]] = {
+                    "count": s.count,
+                    "errors": s.errors,
+                    "p50_ms": _percentile(lat, 50) * 1e3,
+                    "p99_ms": _percentile(lat, 99) * 1e3,
+                }
+        return out
+
+    def log_stats(self) -> None:
+        for topic, s in self.stats().items():
+            logging.info(f"[Pub/Sub] {topic}: {s['count']} msgs, {s['errors']} errores, "
+                         f"p50 {s['p50_ms']:.1f} ms, p99 {s['p99_ms']:.1f} ms")
+
+    def _record(self, topic: str, start: float, future) -> None:
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            s = self._stats[topic]
+            if future.exception() is None:
+                s.count += 1
+                s.latencies.append(elapsed)
+            else:
+                s.errors += 1
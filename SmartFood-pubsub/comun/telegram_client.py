@@ -0,0 +1,155 @@
+"""
+Cliente saliente de Telegram compartido por las funciones
+-----------------------------------------------------------
+
+`deploy.sh` copia los módulos de `comun/` junto al main.py de cada función,
+así que se importa como un módulo de primer nivel:
+
+    from telegram_client import TelegramClient
+    tg = TelegramClient(BOT_TOKEN)
+    tg.send(chat_id, "…")            # síncrono, con reintentos
+    tg.send_async(chat_id, "…")      # encola y vuelve al momento
+
+* Una `requests.Session` por instancia: la conexión TLS con api.telegram.org
+  se reutiliza (keep-alive) en lugar de abrir una nueva por mensaje.
+* 429: se espera lo que diga `parameters.retry_after` (si no supera
+  `max_retry_after`) y se reintenta; 5xx y errores de red, con backoff
+  exponencial. Otros 4xx (p. ej. Markdown inválido) no se reintentan.
+* `send_async` deja el mensaje en una cola acotada (`queue_size`) que vacía un
+  único hilo en orden, así que los mensajes a un mismo chat no se adelantan
+  entre sí. Si la cola está llena el mensaje se descarta y se registra.
+  `flush()` espera a que la cola se vacíe; se llama también al salir.
+  Cloud Functions puede quitar la CPU a la instancia entre invocaciones: lo
+  que quede en la cola sale en cuanto llega la siguiente petición.
+
+Variables de entorno (valores por defecto del constructor)
+-----------------------------------------------------------
+TELEGRAM_API_URL   base de la API (https://api.telegram.org; los tests apuntan a un stub)
+TELEGRAM_POOL      conexiones máx. en el pool (10)
+TELEGRAM_RETRIES   reintentos por mensaje (3)
+TELEGRAM_QUEUE     mensajes máx. pendientes en send_async (1000)
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+POOL    = int(os.getenv("TELEGRAM_POOL", "10"))
+RETRIES = int(os.getenv("TELEGRAM_RETRIES", "3"))
+QUEUE   = int(os.getenv("TELEGRAM_QUEUE", "1000"))
+
+
+class TelegramClient:
+    def __init__(self, token: str, base_url: str = API_URL, pool_size: int = POOL,
+                 retries: int = RETRIES, queue_size: int = QUEUE, timeout: float = 10.0,
+                 backoff: float = 0.5, max_retry_after: float = 30.0):
+        self.base_url = f"{base_url.rstrip('/')}/bot{token}"
+        self.file_url = f"{base_url.rstrip('/')}/file/bot{token}"
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.sent = self.failed = self.dropped = 0
+        self._queue: "queue.Queue[tuple]" = queue.Queue(queue_size)
+        self._worker: threading.Thread | None = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush, 5.0)
+
+    # ───────── síncrono ─────────
+    def call(self, method: str, **params: Any) -> Any:
+        """POST a la API de Bot; devuelve `result` o None si falla tras los reintentos."""
+        error = ""
+        for attempt in range(self.retries + 1):
+            try:
+                r = self.session.post(f"{self.base_url}/{method}", json=params, timeout=self.timeout)
+                body: Dict = r.json() if r.content else {}
+            except (requests.RequestException, ValueError) as e:
+                wait, error = self.backoff * 2 ** attempt, str(e)
+            else:
+                if r.ok and body.get("ok", True):
+                    return body.get("result")
+                error = body.get("description") or f"HTTP {r.status_code}"
+                if r.status_code == 429:
+                    wait = float(body.get("parameters", {}).get("retry_after", 1))
+                    if wait > self.max_retry_after:
+                        break
+                elif r.status_code >= 500:
+                    wait = self.backoff * 2 ** attempt
+                else:
+                    break
+            if attempt < self.retries:
+                time.sleep(wait)
+        logging.error(f"Telegram {method} error: {error}")
+        return None
+
+    def send(self, chat_id: int, text: str, parse_mode: str | None = "Markdown") -> bool:
+        ok = self.call("sendMessage", chat_id=chat_id, text=text, parse_mode=parse_mode) is not None
+        with self._lock:
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+        return ok
+
+    def get_file(self, file_id: str) -> bytes:
+        """Contenido de un fichero subido a Telegram (getFile + descarga)."""
+        result = self.call("getFile", file_id=file_id)
+        if result is None:
+            raise RuntimeError(f"getFile falló para {file_id}")
+        resp = self.session.get(f"{self.file_url}/{result['file_path']}", timeout=30)
+        resp.raise_for_status()
+        return resp.content
+
+    # ───────── asíncrono ─────────
+    def send_async(self, chat_id: int, text: str, parse_mode: str | None = "Markdown") -> bool:
+        """Encola el mensaje; False si la cola estaba llena y se descartó."""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((chat_id, text, parse_mode))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            logging.warning(f"Cola de Telegram llena, mensaje a {chat_id} descartado")
+            return False
+        return True
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Espera a que se hayan enviado los mensajes encolados; False si vence `timeout`."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._drain, name="telegram-send", daemon=True)
+                self._worker.start()
+
+    def _drain(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                self.send(*item)
+            except Exception as e:                 # el hilo no debe morir por un mensaje
+                logging.error(f"Telegram error: {e}")
+            finally:
+                self._queue.task_done()
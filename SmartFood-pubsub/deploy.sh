@@ -22,12 +22,27 @@ TOPIC_RESPUESTA="mensaje_respuesta"            # entrada Mensajero
 BUCKET_MODELOS="smartfood-models"
 KGE_MODEL_BLOB="kge/trained_model.pkl"
 KGE_CSV_BLOB="kge/new_triplets20_optimized.csv"
+# Bundle del KG (recomendador/export_bundle.py): vacío = .pkl + CSV de arriba.
+# Tras subirlo, p. ej. KGE_BUNDLE_BLOB="kge/kg_bundle.bin" y
+# KGE_VOCAB_BLOB="kge/kg_bundle.vocab.txt" (ids de términos en los mensajes, comun/mensajes.py)
+KGE_BUNDLE_BLOB=""
+KGE_VOCAB_BLOB=""
 YOLO_BLOB="yolo/best.pt"
 
 # Telegram
 BOT_TOKEN="YOUR_TELEGRAM_BOT_TOKEN" # esta en un .env
 # ------------------------------------------------------------
 
+# Cada función se despliega desde una copia de su carpeta con los módulos
+# compartidos de ./comun (telegram_client.py, publisher.py, mensajes.py) al lado de su main.py
+_source() {
+  local dir
+  dir="$(mktemp -d)"
+  cp -r "./$1/." "$dir/"
+  find ./comun -maxdepth 1 -name "*.py" ! -name "bench_*" -exec cp {} "$dir/" \;
+  echo "$dir"
+}
+
 echo "Creando topics (si no existen)…"
 gcloud pubsub topics create "$TOPIC_INGREDIENTES" --project="$PROJECT" --quiet || true
 gcloud pubsub topics create "$TOPIC_RESPUESTA"    --project="$PROJECT" --quiet || true
@@ -37,39 +52,40 @@ gcloud pubsub topics create "$TOPIC_RESPUESTA"    --project="$PROJECT" --quiet |
 echo "Desplegando Webhook…"
 gcloud functions deploy webhook \
   --gen2 --runtime python310 --region "$REGION" \
-  --source ./webhook --entry-point main \
+  --source "$(_source webhook)" --entry-point main \
   --trigger-http --allow-unauthenticated \
   --memory 1Gi --timeout 120s \
-  --set-env-vars "BOT_TOKEN=$BOT_TOKEN,TOPIC_RECOMENDAR=$TOPIC_INGREDIENTES"
+  --set-env-vars "BOT_TOKEN=$BOT_TOKEN,TOPIC_RECOMENDAR=$TOPIC_INGREDIENTES,MODEL_BUCKET=$BUCKET_MODELOS,VOCAB_BLOB=$KGE_VOCAB_BLOB"
 
 
 # 2) Recomendador(Pub/Sub)
 echo "Desplegando Recomendador…"
 gcloud functions deploy recomendador \
   --gen2 --runtime python310 --region "$REGION" \
-  --source ./recomendador --entry-point main \
+  --source "$(_source recomendador)" --entry-point main \
   --trigger-topic "$TOPIC_INGREDIENTES" \
   --memory 3Gi --timeout 300s \
-  --set-env-vars "MODEL_BUCKET=$BUCKET_MODELOS,MODEL_BLOB=$KGE_MODEL_BLOB,CSV_BLOB=$KGE_CSV_BLOB,TOPIC_MENSAJERO=$TOPIC_RESPUESTA"
+  --set-env-vars "MODEL_BUCKET=$BUCKET_MODELOS,BUNDLE_BLOB=$KGE_BUNDLE_BLOB,MODEL_BLOB=$KGE_MODEL_BLOB,CSV_BLOB=$KGE_CSV_BLOB,TOPIC_MENSAJERO=$TOPIC_RESPUESTA"
 
 
 # 3) Mensajero(Pub/Sub)
 echo "Desplegando Mensajero…"
 gcloud functions deploy mensajero \
   --gen2 --runtime python310 --region "$REGION" \
-  --source ./mensajero --entry-point main \
+  --source "$(_source mensajero)" --entry-point main \
   --trigger-topic "$TOPIC_RESPUESTA" \
   --memory 256MB --timeout 60s \
   --set-env-vars "BOT_TOKEN=$BOT_TOKEN"
 
 
-# 4) Detector YOLO
+# 4) Detector YOLO (concurrencia > 1 para que el micro-batching agrupe fotos)
 echo "Desplegando Detector YOLO…"
 gcloud functions deploy detector \
   --gen2 --runtime python310 --region "$REGION" \
-  --source ./detector --entry-point main \
+  --source "$(_source detector)" --entry-point main \
   --trigger-http --allow-unauthenticated \
   --memory 2Gi --timeout 180s \
-  --set-env-vars "MODEL_BUCKET=$BUCKET_MODELOS,YOLO_MODEL_BLOB=$YOLO_BLOB,TOPIC_SALIDA=$TOPIC_INGREDIENTES"
+  --cpu 2 --concurrency 16 \
+  --set-env-vars "MODEL_BUCKET=$BUCKET_MODELOS,YOLO_MODEL_BLOB=$YOLO_BLOB,TOPIC_SALIDA=$TOPIC_INGREDIENTES,VOCAB_BLOB=$KGE_VOCAB_BLOB"
 
 echo "Despliegue de las 4 funciones completado"
\ No newline at end of file
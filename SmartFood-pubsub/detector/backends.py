@@ -0,0 +1,61 @@
+"""
+Backends de inferencia del detector
+------------------------------------
+
+El artefacto que se carga lo elige DETECTOR_BACKEND:
+
+    torch        best.pt            pesos PyTorch + fuse() (por defecto)
+    torchscript  best.torchscript   grafo TorchScript, sin dependencias de Python del modelo
+    onnx         best.onnx          ONNX Runtime fp32
+    onnx-int8    best.int8.onnx     ONNX Runtime con cuantización int8 (dinámica o estática)
+
+Los artefactos se generan offline con `export_model.py`. Todos se envuelven
+en `ultralytics.YOLO`, que hace el mismo pre/post-procesado (letterbox, NMS)
+para cualquier formato, así que el resto del detector no cambia.
+
+TorchScript se traza a un tamaño fijo (las anclas del cabezal quedan como
+constantes del grafo): `dynamic=False`, y main.py fija la escalera de
+resolución a ese tamaño (EXPORT_IMGSZ, ver resolution.py).
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict
+
+from ultralytics import YOLO
+
+
+@dataclass(frozen=True)
+class Backend:
+    name: str
+    suffix: str            # sufijo del artefacto respecto a best.pt
+    fuse: bool = False     # fusionar conv+bn (solo pesos PyTorch)
+    dynamic: bool = True   # acepta cualquier imgsz; False = solo el de la exportación
+
+    def artifact(self, weights: str) -> str:
+        """Ruta del artefacto de este backend a partir de la de los pesos .pt."""
+        return str(Path(weights).with_suffix(self.suffix))
+
+    def load(self, path: Path) -> YOLO:
+        model = YOLO(str(path), task="detect")
+        if self.fuse:
+            model.fuse()
+        return model
+
+
+BACKENDS: Dict[str, Backend] = {
+    b.name: b for b in (
+        Backend("torch",       ".pt", fuse=True),
+        Backend("torchscript", ".torchscript", dynamic=False),
+        Backend("onnx",        ".onnx"),
+        Backend("onnx-int8",   ".int8.onnx"),
+    )
+}
+
+
+def get_backend(name: str) -> Backend:
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"DETECTOR_BACKEND desconocido: {name} "
+                         f"(opciones: {', '.join(BACKENDS)})") from None
@@ -0,0 +1,70 @@
+"""
+Micro-batching de inferencias YOLO
+-----------------------------------
+
+Con concurrencia > 1 en la Cloud Function varias fotos llegan casi a la vez
+a la misma instancia. En lugar de una inferencia por evento, cada evento
+deja su imagen en la cola y espera su Future; un hilo de fondo junta las
+imágenes que llegan dentro de `window_ms` (hasta `max_batch`), las pasa a
+YOLO en una sola llamada y reparte la lista de ingredientes de cada imagen
+a su Future. Si el batch falla, o devuelve otro número de resultados que de
+imágenes, todos sus Futures terminan con la excepción: ninguno queda sin
+resolver.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Tuple
+
+
+class MicroBatcher:
+    """Agrupa peticiones por ventana de tiempo y tamaño máximo de batch."""
+
+    def __init__(self,
+                 run_batch: Callable[[List[Any]], List[Any]],
+                 max_batch: int = 8,
+                 window_ms: float = 50.0):
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.window = window_ms / 1000
+        self._queue: "queue.Queue[Tuple[Any, Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="yolo-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        fut: Future = Future()
+        self._queue.put((item, fut))
+        return fut
+
+    def _collect(self) -> List[Tuple[Any, Future]]:
+        batch = [self._queue.get()]                      # bloquea hasta la 1ª imagen
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = list(self.run_batch(items))
+                if len(results) != len(items):
+                    raise RuntimeError(f"run_batch devolvió {len(results)} resultados para {len(items)} imágenes")
+            except Exception as e:
+                logging.exception(f"Batch YOLO de {len(items)} imágenes falló")
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            logging.info(f"Batch YOLO: {len(items)} imágenes")
+            for (_, fut), res in zip(batch, results):
+                fut.set_result(res)
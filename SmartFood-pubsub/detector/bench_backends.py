@@ -0,0 +1,116 @@
+"""
+Paridad, latencia y memoria de los backends del detector
+---------------------------------------------------------
+
+    python bench_backends.py --weights best.pt --images val/*.jpg \\
+        --backends torch torchscript onnx onnx-int8 --check
+
+Cada backend se ejecuta en un proceso aparte (la memoria residente máxima
+no se contamina entre backends). La salida PyTorch es la referencia:
+
+    ingr    Jaccard medio entre los conjuntos de ingredientes por imagen
+            (lo que realmente se publica al recomendador)
+    box     fracción de cajas de referencia con una caja de la misma clase e IoU >= 0.5
+
+Con `--check` el script termina con código 1 si algún backend queda por
+debajo de `--min-ingr`, para usarlo como test de paridad antes de desplegar.
+"""
+
+import argparse
+import multiprocessing as mp
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from backends import get_backend
+
+DEFAULT_IMAGE = Path(__file__).resolve().parents[2] / "file_0.jpg"
+
+
+def _run(backend: str, weights: str, images: List[str], rounds: int, out: mp.Queue) -> None:
+    import cv2
+
+    b = get_backend(backend)
+    model = b.load(Path(b.artifact(weights)))
+    arrays = [cv2.imread(p) for p in images]
+    model(arrays[0], verbose=False, device="cpu")              # calentamiento
+
+    lat, dets = [], []
+    for r in range(rounds):
+        for img in arrays:
+            t0 = time.perf_counter()
+            res = model(img, verbose=False, device="cpu")[0]
+            lat.append(time.perf_counter() - t0)
+            if r == 0:
+                dets.append({
+                    "cls": res.boxes.cls.numpy().astype(int),
+                    "xyxy": res.boxes.xyxy.numpy(),
+                    "names": [model.names[int(c)] for c in res.boxes.cls],
+                })
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    out.put({"lat": np.array(lat), "dets": dets, "rss_mb": rss_mb})
+
+
+def _area(x: np.ndarray) -> np.ndarray:
+    return np.prod(x[:, 2:] - x[:, :2], axis=1)
+
+
+def _iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    return inter / (_area(a)[:, None] + _area(b)[None] - inter + 1e-9)
+
+
+def _parity(ref: List[Dict], got: List[Dict]) -> Dict[str, float]:
+    jac, matched, total = [], 0, 0
+    for r, g in zip(ref, got):
+        a, b = set(r["names"]), set(g["names"])
+        jac.append(len(a & b) / len(a | b) if a | b else 1.0)
+        total += len(r["cls"])
+        if len(r["cls"]) and len(g["cls"]):
+            iou = _iou(r["xyxy"], g["xyxy"])
+            same = r["cls"][:, None] == g["cls"][None]
+            matched += int(((iou >= 0.5) & same).any(1).sum())
+    return {"ingr": float(np.mean(jac)), "box": matched / total if total else 1.0}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--weights", default="best.pt")
+    ap.add_argument("--images", nargs="*", default=[str(DEFAULT_IMAGE)])
+    ap.add_argument("--backends", nargs="+", default=["torch", "torchscript", "onnx", "onnx-int8"])
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--check", action="store_true")
+    ap.add_argument("--min-ingr", type=float, default=0.9)
+    args = ap.parse_args()
+
+    ctx = mp.get_context("spawn")
+    results = {}
+    for name in ["torch"] + [b for b in args.backends if b != "torch"]:
+        q = ctx.Queue()
+        p = ctx.Process(target=_run, args=(name, args.weights, args.images, args.rounds, q))
+        p.start()
+        results[name] = q.get()
+        p.join()
+
+    ref = results["torch"]["dets"]
+    failed = False
+    print(f"{'backend':12s} {'ms/img':>8} {'p95':>8} {'RSS MB':>8} {'ingr':>6} {'box':>6}")
+    for name, r in results.items():
+        par = _parity(ref, r["dets"])
+        print(f"{name:12s} {r['lat'].mean() * 1e3:8.1f} {np.percentile(r['lat'], 95) * 1e3:8.1f} "
+              f"{r['rss_mb']:8.0f} {par['ingr']:6.3f} {par['box']:6.3f}")
+        failed |= par["ingr"] < args.min_ingr
+
+    if args.check and failed:
+        print(f"Paridad por debajo de {args.min_ingr}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
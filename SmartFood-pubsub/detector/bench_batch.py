@@ -0,0 +1,50 @@
+"""
+Benchmark de throughput YOLO en CPU por tamaño de batch
+---------------------------------------------------------
+
+    python bench_batch.py --weights best.pt --images fotos/*.jpg --sizes 1 2 4 8 16 32
+
+Sin `--images` se repite `file_0.jpg` de la raíz del repo. Imprime imágenes/s
+por tamaño de batch, que es lo que decide BATCH_MAX / BATCH_WINDOW_MS.
+"""
+
+import argparse
+import itertools
+import time
+from pathlib import Path
+
+import torch
+from ultralytics import YOLO
+
+DEFAULT_IMAGE = Path(__file__).resolve().parents[2] / "file_0.jpg"
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--weights", default="best.pt")
+    ap.add_argument("--images", nargs="*", default=[str(DEFAULT_IMAGE)])
+    ap.add_argument("--sizes", nargs="+", type=int, default=[1, 2, 4, 8, 16, 32])
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--threads", type=int, default=0, help="torch.set_num_threads (0 = por defecto)")
+    args = ap.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    model = YOLO(args.weights)
+    model.fuse()
+    model(args.images[0], verbose=False, device="cpu")          # calentamiento
+
+    print(f"{'batch':>5} {'img/s':>8} {'ms/img':>8}")
+    for bs in args.sizes:
+        batch = list(itertools.islice(itertools.cycle(args.images), bs))
+        t0 = time.perf_counter()
+        for _ in range(args.rounds):
+            model(batch, verbose=False, device="cpu")
+        elapsed = time.perf_counter() - t0
+        n = bs * args.rounds
+        print(f"{bs:>5} {n / elapsed:8.2f} {elapsed / n * 1e3:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Exporta best.pt a los backends de CPU del detector
+----------------------------------------------------
+
+    python export_model.py --weights best.pt --formats torchscript onnx
+    python export_model.py --weights best.pt --formats onnx --int8 static \\
+        --calib-data ../../foodseg103.yaml --calib-images 200
+
+Genera junto a los pesos:
+
+    best.torchscript   (DETECTOR_BACKEND=torchscript)  tamaño fijo --imgsz (= EXPORT_IMGSZ)
+    best.onnx          (DETECTOR_BACKEND=onnx)       batch dinámico, para el micro-batching
+    best.int8.onnx     (DETECTOR_BACKEND=onnx-int8)
+
+`--int8 dynamic` cuantiza solo los pesos; `--int8 static` calibra también las
+activaciones con imágenes de validación de FoodSeg103 (ruta `val` del yaml).
+Después se suben al bucket junto a best.pt (ver backends.py). La paridad de
+etiquetas con best.pt se comprueba con tests/test_detector_parity.py.
+"""
+
+import argparse
+import random
+from pathlib import Path
+from typing import Iterator, List
+
+import cv2
+import numpy as np
+import yaml
+from ultralytics import YOLO
+
+from backends import BACKENDS
+
+IMG_EXT = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def _letterbox(img: np.ndarray, size: int) -> np.ndarray:
+    """Mismo preprocesado que ultralytics: resize con aspecto + relleno gris, RGB, CHW, [0, 1]."""
+    h, w = img.shape[:2]
+    r = size / max(h, w)
+    nh, nw = round(h * r), round(w * r)
+    img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    out = np.full((size, size, 3), 114, dtype=np.uint8)
+    out[top:top + nh, left:left + nw] = img
+    return out[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+
+
+def _calib_images(data_yaml: Path, n: int, seed: int) -> List[Path]:
+    cfg = yaml.safe_load(data_yaml.read_text())
+    val = Path(cfg["val"])
+    if not val.is_absolute():
+        val = Path(cfg.get("path", data_yaml.parent)) / val
+    images = sorted(p for p in val.rglob("*") if p.suffix.lower() in IMG_EXT)
+    if not images:
+        raise FileNotFoundError(f"Sin imágenes de calibración en {val}")
+    random.Random(seed).shuffle(images)
+    return images[:n]
+
+
+class FoodSegCalibration:
+    """CalibrationDataReader de onnxruntime sobre imágenes de validación."""
+
+    def __init__(self, images: List[Path], input_name: str, imgsz: int):
+        self._it: Iterator = (
+            {input_name: _letterbox(cv2.imread(str(p)), imgsz)[None]} for p in images
+        )
+
+    def get_next(self):
+        return next(self._it, None)
+
+
+def _quantize(onnx_path: Path, out: Path, mode: str, args) -> None:
+    from onnxruntime import InferenceSession
+    from onnxruntime.quantization import (
+        QuantFormat, QuantType, quantize_dynamic, quantize_static,
+    )
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    prep = onnx_path.with_suffix(".prep.onnx")
+    quant_pre_process(str(onnx_path), str(prep))
+
+    if mode == "dynamic":
+        quantize_dynamic(str(prep), str(out), weight_type=QuantType.QUInt8)
+    else:
+        input_name = InferenceSession(str(prep)).get_inputs()[0].name
+        images = _calib_images(args.calib_data, args.calib_images, args.seed)
+        quantize_static(
+            str(prep), str(out),
+            calibration_data_reader=FoodSegCalibration(images, input_name, args.imgsz),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+        )
+    prep.unlink(missing_ok=True)
+
+    # ultralytics lee names/stride/imgsz de los metadatos del ONNX original
+    import onnx
+    src, dst = onnx.load(str(onnx_path)), onnx.load(str(out))
+    onnx.helper.set_model_props(dst, {p.key: p.value for p in src.metadata_props})
+    onnx.save(dst, str(out))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--weights", default="best.pt", type=Path)
+    ap.add_argument("--formats", nargs="+", default=["onnx"], choices=["torchscript", "onnx"])
+    ap.add_argument("--int8", choices=["dynamic", "static"])
+    ap.add_argument("--imgsz", type=int, default=640)
+    ap.add_argument("--calib-data", type=Path,
+                    default=Path(__file__).resolve().parents[2] / "foodseg103.yaml")
+    ap.add_argument("--calib-images", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    model = YOLO(str(args.weights))
+    for fmt in args.formats:
+        kwargs = {"dynamic": True, "simplify": True} if fmt == "onnx" else {}
+        path = Path(model.export(format=fmt, imgsz=args.imgsz, device="cpu", **kwargs))
+        print(f"{fmt:12s} -> {path}")
+
+    if args.int8:
+        onnx_path = Path(BACKENDS["onnx"].artifact(str(args.weights)))
+        if not onnx_path.exists():
+            raise FileNotFoundError(f"{onnx_path} no existe: exporta antes con --formats onnx")
+        out = Path(BACKENDS["onnx-int8"].artifact(str(args.weights)))
+        _quantize(onnx_path, out, args.int8, args)
+        print(f"int8 ({args.int8}) -> {out}")
+
+
+if __name__ == "__main__":
+    main()
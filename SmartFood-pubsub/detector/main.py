@@ -4,8 +4,8 @@ Detector YOLO  Pub/Sub imagen -> Pub/Sub ingredientes
 Topic IN  : ingredientes_imagen    (TOPIC_IN)
 Topic OUT : ingredientes_detectados (TOPIC_OUT)
 
-Payload de entrada
-------------------
+Payload de entrada (mensaje IMAGEN de comun/mensajes.py, o el mismo dict en JSON)
+---------------------------------------------------------------------------------
 {
   "chat_id"      : 123456,
   "file_id"      : "<telegram file_id>",   # viene del webhook
@@ -16,29 +16,61 @@ Variables de entorno
 --------------------
 MODEL_BUCKET   bucket donde está best.pt
 MODEL_BLOB     ruta dentro del bucket
+DETECTOR_BACKEND  torch | torchscript | onnx | onnx-int8 (torch, ver backends.py)
+BACKEND_BLOB   ruta del artefacto del backend (por defecto MODEL_BLOB con su sufijo)
 TG_TOKEN       token bot Telegram, para descargar la foto
+TELEGRAM_*     pool y reintentos del cliente de Telegram (ver telegram_client.py)
+BATCH_MAX      nº máx. de imágenes por inferencia YOLO (8)
+BATCH_WINDOW_MS  ventana de espera para juntar imágenes en un batch (50)
+DETECT_TIMEOUT   segundos máx. que un evento espera su resultado del batch (120)
+IMGSZ_LADDER, DET_CONF, ESCALATE_CONF, TILE_*  política de resolución (resolution.py)
+EXPORT_IMGSZ     tamaño con el que se exportó un backend estático (torchscript); la
+                 escalera se fija a él (640, el --imgsz de export_model.py)
+DEBUG_SAVE_DIR   si se define, guarda ahí cada foto descargada (solo depuración);
+                 por defecto la imagen se decodifica en memoria sin tocar /tmp
+PUBSUB_*         batching y flush de la publicación (ver publisher.py)
+VOCAB_BLOB, MSG_FORMAT  formato de los mensajes (ver mensajes.py)
 """
 
-import base64, json, logging, os
+import base64, logging, os, threading
 from pathlib import Path
 from typing import List
 
-import functions_framework, torch
+import cv2
+import functions_framework, numpy as np, torch
 from ultralytics import YOLO
-import requests
-from google.cloud import pubsub_v1, storage, exceptions as gexc
+from google.cloud import storage, exceptions as gexc
 import google.auth
 
+from backends import get_backend
+from batcher import MicroBatcher
+from mensajes import PEDIDO, decode, encode, load_vocab
+from publisher import Publisher
+from resolution import ResolutionPolicy, detect_adaptive
+from telegram_client import TelegramClient
+
 # ---------- ENV ----------
 MODEL_BUCKET = os.getenv("MODEL_BUCKET", "smartfood-models")
 MODEL_BLOB   = os.getenv("MODEL_BLOB",   "yolo/best.pt")
+BACKEND      = get_backend(os.getenv("DETECTOR_BACKEND", "torch"))
+BACKEND_BLOB = os.getenv("BACKEND_BLOB") or BACKEND.artifact(MODEL_BLOB)
 TOPIC_OUT    = os.getenv("TOPIC_OUT",   "ingredientes_detectados")
 TG_TOKEN     = os.environ["BOT_TOKEN"]
+BATCH_MAX       = int(os.getenv("BATCH_MAX", "8"))
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "50"))
+DETECT_TIMEOUT  = float(os.getenv("DETECT_TIMEOUT", "120"))
+DEBUG_SAVE_DIR  = os.getenv("DEBUG_SAVE_DIR")
+EXPORT_IMGSZ    = int(os.getenv("EXPORT_IMGSZ", "640"))
+POLICY          = ResolutionPolicy.from_env()
+if not BACKEND.dynamic:
+    POLICY = POLICY.pinned(EXPORT_IMGSZ)
 
 PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT") or google.auth.default()[1]
 TMP = Path("/tmp/yolo"); TMP.mkdir(exist_ok=True)
 
-publisher = pubsub_v1.PublisherClient()
+VOCAB = load_vocab(MODEL_BUCKET)
+tg = TelegramClient(TG_TOKEN)
+publisher = Publisher()
 topic_out = publisher.topic_path(PROJECT_ID, TOPIC_OUT)
 
 # ---------- Carga del modelo ----------
@@ -47,42 +79,53 @@ def _get_model() -> YOLO:
     global _MODEL
     if _MODEL:
         return _MODEL
-    dest = TMP / "best.pt"
+    dest = TMP / Path(BACKEND_BLOB).name
     if not dest.exists():
-        logging.info("⬇️  Descargando modelo YOLO desde GCS…")
-        storage.Client().bucket(MODEL_BUCKET).blob(MODEL_BLOB).download_to_filename(dest)
-    _MODEL = YOLO(str(dest))
-    _MODEL.fuse()               
+        logging.info(f"⬇️  Descargando modelo YOLO ({BACKEND.name}) desde GCS…")
+        storage.Client().bucket(MODEL_BUCKET).blob(BACKEND_BLOB).download_to_filename(dest)
+    _MODEL = BACKEND.load(dest)
     return _MODEL
 
 # ---------- utilidades ----------
-def _download_telegram_file(file_id: str) -> Path:
-    # 1) obtener path
-    r = requests.get(f"https://api.telegram.org/bot{TG_TOKEN}/getFile",
-                     params={"file_id": file_id}, timeout=15)
-    r.raise_for_status()
-    file_path = r.json()["result"]["file_path"]
-
-    # 2) descargar binario
-    url = f"https://api.telegram.org/file/bot{TG_TOKEN}/{file_path}"
-    dest = TMP / Path(file_path).name
-    with requests.get(url, stream=True, timeout=30) as resp:
-        resp.raise_for_status()
-        with open(dest, "wb") as f:
-            for chunk in resp.iter_content(chunk_size=1 << 14):
-                f.write(chunk)
-    return dest
-
-def _detect(image_path: Path) -> List[str]:
-    model = _get_model()
-    results = model(image_path, verbose=False)[0]        
-    return list({model.names[int(c)] for c in results.boxes.cls})
+def _download_telegram_file(file_id: str) -> bytes:
+    # getFile + descarga a memoria por la sesión compartida (keep-alive y reintentos)
+    data = tg.get_file(file_id)
+
+    if DEBUG_SAVE_DIR:
+        dest = Path(DEBUG_SAVE_DIR); dest.mkdir(parents=True, exist_ok=True)
+        (dest / f"{file_id}.jpg").write_bytes(data)
+    return data
+
+def _decode(data: bytes) -> np.ndarray:
+    """JPEG/PNG en memoria -> array BGR, el formato que YOLO espera para numpy."""
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("No se pudo decodificar la imagen")
+    return img
+
+def _detect_batch(images: List[np.ndarray]) -> List[List[str]]:
+    """Batch YOLO a baja resolución; solo las imágenes dudosas se repiten a más píxeles."""
+    return detect_adaptive(_get_model(), images, POLICY)
+
+_BATCHER: MicroBatcher | None = None
+_BATCHER_LOCK = threading.Lock()
+
+def _get_batcher() -> MicroBatcher:
+    global _BATCHER
+    with _BATCHER_LOCK:
+        if _BATCHER is None:
+            _BATCHER = MicroBatcher(_detect_batch, BATCH_MAX, BATCH_WINDOW_MS)
+    return _BATCHER
+
+def _detect(image: np.ndarray) -> List[str]:
+    # TimeoutError -> main() responde sin ingredientes en lugar de colgarse hasta el timeout de la función
+    return _get_batcher().submit(image).result(timeout=DETECT_TIMEOUT)
 
 # ---------- entrypoint ----------
 @functions_framework.cloud_event
 def main(event):
     try:
-        data = json.loads(base64.b64decode(event.data["message"]["data"]).decode())
+        data = decode(base64.b64decode(event.data["message"]["data"]))
         chat_id   = data["chat_id"]
         file_id   = data["file_id"]
         k         = int(data.get("k", 5))
@@ -91,8 +134,8 @@ def main(event):
         return
 
     try:
-        img_path = _download_telegram_file(file_id)
-        ingredientes = _detect(img_path)
+        image = _decode(_download_telegram_file(file_id))
+        ingredientes = _detect(image)
     except Exception as e:                                
         logging.exception(f"Detector failed: {e}")
         ingredientes = []
@@ -103,4 +146,5 @@ def main(event):
         "filters": data.get("filters", {}),
         "k": k,
     }
-    publisher.publish(topic_out, json.dumps(payload).encode())
+    publisher.publish(topic_out, encode(PEDIDO, payload, VOCAB))
+    publisher.flush()   # no volver con el mensaje aún en el batch (la instancia se congela)
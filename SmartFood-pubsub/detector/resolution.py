@@ -0,0 +1,110 @@
+"""
+Política de resolución adaptativa del detector
+-----------------------------------------------
+
+La mayoría de fotos de nevera/plato se resuelven con pocos píxeles, así que
+cada batch se infiere primero al tamaño más pequeño de la escalera
+`sizes` y solo las imágenes dudosas (sin cajas o con confianza máxima por
+debajo de `escalate_conf`) se repiten al siguiente tamaño.
+
+Las imágenes muy grandes (lado mayor >= `tile_min_side`) que siguen siendo
+dudosas al mayor tamaño se trocean en teselas solapadas de `tile_size`
+píxeles; los ingredientes de las teselas se unen a los de la imagen entera.
+
+Configuración por entorno (ver `ResolutionPolicy.from_env`):
+
+    IMGSZ_LADDER    tamaños de inferencia, de menor a mayor   ("320,640")
+    DET_CONF        umbral de confianza de las cajas          (0.25)
+    ESCALATE_CONF   confianza máx. por debajo de la cual se sube de tamaño (0.5)
+    TILE_MIN_SIDE   lado mínimo (px) para trocear; 0 = sin teselas (1600)
+    TILE_SIZE       lado de cada tesela en px                 (640)
+    TILE_OVERLAP    solape entre teselas, fracción            (0.2)
+
+Los backends exportados a tamaño fijo (TorchScript) usan `pinned(imgsz)`: un
+único tamaño, el de exportación, también para las teselas.
+"""
+
+import os
+from dataclasses import dataclass, replace
+from typing import List, Sequence, Set, Tuple
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class ResolutionPolicy:
+    sizes: Tuple[int, ...] = (320, 640)
+    conf: float = 0.25
+    escalate_conf: float = 0.5
+    tile_min_side: int = 1600
+    tile_size: int = 640
+    tile_overlap: float = 0.2
+
+    @classmethod
+    def from_env(cls) -> "ResolutionPolicy":
+        return cls(
+            sizes=tuple(int(s) for s in os.getenv("IMGSZ_LADDER", "320,640").split(",")),
+            conf=float(os.getenv("DET_CONF", "0.25")),
+            escalate_conf=float(os.getenv("ESCALATE_CONF", "0.5")),
+            tile_min_side=int(os.getenv("TILE_MIN_SIDE", "1600")),
+            tile_size=int(os.getenv("TILE_SIZE", "640")),
+            tile_overlap=float(os.getenv("TILE_OVERLAP", "0.2")),
+        )
+
+    def pinned(self, imgsz: int) -> "ResolutionPolicy":
+        """La misma política con un solo tamaño de inferencia (backend estático)."""
+        return replace(self, sizes=(imgsz,), tile_size=imgsz)
+
+    def needs_more(self, result) -> bool:
+        """True si la predicción no tiene cajas o ninguna supera escalate_conf."""
+        conf = result.boxes.conf
+        return len(conf) == 0 or float(conf.max()) < self.escalate_conf
+
+    def wants_tiles(self, image: np.ndarray) -> bool:
+        return bool(self.tile_min_side) and max(image.shape[:2]) >= self.tile_min_side
+
+
+def _tiles(image: np.ndarray, size: int, overlap: float) -> List[np.ndarray]:
+    h, w = image.shape[:2]
+    step = max(1, int(size * (1 - overlap)))
+    ys = list(range(0, max(h - size, 0) + 1, step))
+    xs = list(range(0, max(w - size, 0) + 1, step))
+    if ys[-1] + size < h:
+        ys.append(h - size)
+    if xs[-1] + size < w:
+        xs.append(w - size)
+    return [image[y:y + size, x:x + size] for y in ys for x in xs]
+
+
+def _labels(model, result) -> Set[str]:
+    return {model.names[int(c)] for c in result.boxes.cls}
+
+
+def detect_adaptive(model, images: Sequence[np.ndarray], policy: ResolutionPolicy) -> List[List[str]]:
+    """Ingredientes por imagen, subiendo la resolución solo donde hace falta."""
+    labels: List[Set[str]] = [set() for _ in images]
+    pending = list(range(len(images)))
+
+    for size in policy.sizes:
+        if not pending:
+            break
+        preds = model([images[i] for i in pending], imgsz=size, conf=policy.conf, verbose=False)
+        doubtful = []
+        for i, r in zip(pending, preds):
+            labels[i] = _labels(model, r)
+            if policy.needs_more(r):
+                doubtful.append(i)
+        pending = doubtful
+
+    # teselas de las imágenes grandes que siguen dudosas al mayor tamaño
+    crops, owner = [], []
+    for i in (i for i in pending if policy.wants_tiles(images[i])):
+        for crop in _tiles(images[i], policy.tile_size, policy.tile_overlap):
+            crops.append(crop)
+            owner.append(i)
+    if crops:
+        preds = model(crops, imgsz=policy.tile_size, conf=policy.conf, verbose=False)
+        for i, r in zip(owner, preds):
+            labels[i] |= _labels(model, r)
+
+    return [sorted(found) for found in labels]
@@ -0,0 +1,269 @@
+"""
+SmartFood en un solo proceso: las 4 funciones unidas por colas en memoria
+--------------------------------------------------------------------------
+
+    pip install -r webhook/requirements.txt -r detector/requirements.txt \
+                -r recomendador/requirements.txt -r mensajero/requirements.txt
+    BOT_TOKEN=... GOOGLE_CLOUD_PROJECT=local python fused.py      # POST / = webhook
+
+Importa los main.py de webhook, detector, recomendador y mensajero tal cual
+(mismos módulos, mismas variables de entorno, modelos cargados una vez) y
+sustituye Pub/Sub por una asyncio.Queue por topic:
+
+    HTTP ──▶ webhook ─┬─ TOPIC_DETECT_IMG ──▶ detector ─┐
+                      └─ TOPIC_RECOMENDAR ◀─────────────┘
+                              │
+                              ▼
+                         recomendador ── TOPIC_MENSAJERO ──▶ mensajero
+
+Los mensajes son los mismos bytes que viajarían por Pub/Sub (mensajes.py) y
+llegan a cada handler en un evento con la forma del de Cloud Functions, así
+que el código de las funciones no cambia. Cada etapa tiene sus workers (los
+handlers son bloqueantes y corren en hilos); `publish` devuelve un future que
+se resuelve al entrar el mensaje en la cola, de modo que `publisher.flush()`
+hace de contrapresión cuando una cola está llena. Un handler que falla se
+registra y el mensaje se descarta, como una función sin reintentos.
+
+Ojo con la contrapresión: con la cola llena `flush()` espera hasta
+PUBSUB_FLUSH_TIMEOUT (30 s) y lanza PublishError; el handler que publicaba
+cuenta como fallido aunque su mensaje entre en la cola en cuanto haya hueco.
+FUSED_QUEUE debe cubrir la mayor ráfaga esperada (o subir el timeout): la
+cola de una etapa se vacía al ritmo de sus workers, y cada cola llena se
+avisa en el log.
+
+Para pruebas de carga sin Telegram: TELEGRAM_API_URL apuntando a un stub
+(ver telegram_client.py). GET /stats da la profundidad de las colas y la
+latencia de cada etapa.
+
+Variables de entorno
+--------------------
+FUSED_HOST, FUSED_PORT   dirección del servidor HTTP (0.0.0.0, 8080)
+FUSED_STAGES             etapas que se cargan (webhook,detector,recomendador,mensajero);
+                         los mensajes a un topic sin etapa se descartan con un aviso
+FUSED_WORKERS            workers por etapa, p. ej. "detector=16,recomendador=1,mensajero=4"
+FUSED_QUEUE              capacidad de cada cola (1000)
+FUSED_WARMUP             1 = cargar los modelos al arrancar y no en el primer mensaje (1)
+TOPIC_RECOMENDAR, TOPIC_DETECT_IMG, TOPIC_MENSAJERO  los de cada función
+"""
+
+import asyncio
+import base64
+import importlib.util
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import ModuleType
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent
+sys.path[:0] = [str(ROOT / "comun")] + [str(ROOT / d) for d in ("webhook", "detector", "recomendador", "mensajero")]
+
+import publisher as _publisher  # noqa: E402
+
+FUSED_HOST    = os.getenv("FUSED_HOST", "0.0.0.0")
+FUSED_PORT    = int(os.getenv("FUSED_PORT", "8080"))
+FUSED_STAGES  = os.getenv("FUSED_STAGES", "webhook,detector,recomendador,mensajero").split(",")
+FUSED_WORKERS = os.getenv("FUSED_WORKERS", "")
+FUSED_QUEUE   = int(os.getenv("FUSED_QUEUE", "1000"))
+FUSED_WARMUP  = os.getenv("FUSED_WARMUP", "1") == "1"
+
+# etapa Pub/Sub -> topic del que lee (mismos nombres y defaults que en deploy.sh)
+SUBSCRIPTIONS = {
+    "detector":     os.getenv("TOPIC_DETECT_IMG", "ingredientes_imagen"),
+    "recomendador": os.getenv("TOPIC_RECOMENDAR", "ingredientes_detectados"),
+    "mensajero":    os.getenv("TOPIC_MENSAJERO", "mensaje_respuesta"),
+}
+# concurrencia de cada función desplegada (detector --concurrency 16)
+WORKERS = {"detector": 16, "recomendador": 1, "mensajero": 4}
+
+
+def _parse_workers(spec: str) -> Dict[str, int]:
+    workers = dict(WORKERS)
+    for item in filter(None, spec.split(",")):
+        stage, n = item.split("=")
+        workers[stage.strip()] = int(n)
+    return workers
+
+
+class _Event:
+    """Lo que usan los handlers del CloudEvent de Pub/Sub: event.data["message"]["data"]."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes, message_id: str):
+        self.data = {"message": {"data": base64.b64encode(data), "messageId": message_id}}
+
+
+class LocalClient:
+    """Sustituto de PublisherClient: cada topic es una asyncio.Queue del bucle del pipeline."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int = FUSED_QUEUE):
+        self.loop = loop
+        self.maxsize = maxsize
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self._ids = itertools.count(1)
+
+    def topic_path(self, project: str, topic: str) -> str:
+        return f"projects/{project}/topics/{topic}"
+
+    def subscribe(self, topic: str) -> asyncio.Queue:
+        """Cola del topic; se crea en el hilo del bucle antes de arrancar los workers."""
+        if topic not in self.queues:
+            self.queues[topic] = asyncio.Queue(self.maxsize)
+        return self.queues[topic]
+
+    def publish(self, topic: str, data: bytes, **attrs: str):
+        """concurrent.futures.Future con el message_id, resuelto al entrar en la cola."""
+        return asyncio.run_coroutine_threadsafe(self._put(topic.rsplit("/", 1)[-1], data), self.loop)
+
+    async def _put(self, topic: str, data: bytes) -> str:
+        message_id = str(next(self._ids))
+        queue = self.queues.get(topic)
+        if queue is None:
+            logging.warning(f"[fused] topic {topic} sin etapa cargada, mensaje {message_id} descartado")
+        else:
+            if queue.full():
+                logging.warning(f"[fused] cola {topic} llena ({queue.maxsize}), "
+                                "el publicador espera (ver FUSED_QUEUE)")
+            await queue.put((time.perf_counter(), data, message_id))
+        return message_id
+
+
+class Pipeline:
+    def __init__(self, stages: List[str] = FUSED_STAGES, workers: str = FUSED_WORKERS,
+                 queue_size: int = FUSED_QUEUE):
+        self.loop = asyncio.new_event_loop()
+        self.workers = _parse_workers(workers)
+        self.loop.set_default_executor(ThreadPoolExecutor(
+            sum(self.workers[s] for s in stages if s in SUBSCRIPTIONS) or 1,
+            thread_name_prefix="fused",
+        ))
+        self.client = LocalClient(self.loop, queue_size)
+        _publisher.set_default_client(self.client)
+        self._thread = threading.Thread(target=self.loop.run_forever, name="fused-loop", daemon=True)
+        self._tasks: List[asyncio.Task] = []
+        self._latency: Dict[str, _publisher._TopicStats] = {}
+
+        os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "local")   # sin google.auth.default()
+        self.modules: Dict[str, ModuleType] = {stage: self._load(stage) for stage in stages}
+
+    @staticmethod
+    def _load(stage: str) -> ModuleType:
+        """main.py de la función como módulo `<etapa>_main` (todas se llaman main.py)."""
+        spec = importlib.util.spec_from_file_location(f"{stage}_main", ROOT / stage / "main.py")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        logging.info(f"[fused] {stage} cargado")
+        return module
+
+    def warmup(self) -> None:
+        """Carga los modelos ahora en vez de en el primer mensaje."""
+        if "recomendador" in self.modules:
+            self.modules["recomendador"]._load_assets()
+        if "detector" in self.modules:
+            self.modules["detector"]._get_model()
+
+    def start(self) -> None:
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+
+    async def _start(self) -> None:
+        for stage, module in self.modules.items():
+            if stage not in SUBSCRIPTIONS:
+                continue
+            topic = SUBSCRIPTIONS[stage]
+            queue = self.client.subscribe(topic)
+            self._latency[stage] = _publisher._TopicStats(1000)
+            for _ in range(self.workers[stage]):
+                self._tasks.append(asyncio.create_task(self._worker(stage, module.main, queue)))
+
+    async def _worker(self, stage: str, handler, queue: asyncio.Queue) -> None:
+        stats = self._latency[stage]
+        while True:
+            enqueued, data, message_id = await queue.get()
+            try:
+                await asyncio.to_thread(handler, _Event(data, message_id))
+                stats.count += 1
+                stats.latencies.append(time.perf_counter() - enqueued)
+            except Exception:
+                stats.errors += 1
+                logging.exception(f"[fused] {stage} falló con el mensaje {message_id}")
+            finally:
+                queue.task_done()
+
+    def drain(self, timeout: float = 30) -> None:
+        """Espera a que se vacíen las colas (en orden de etapa, una puede alimentar a la siguiente)."""
+        async def _join():
+            for stage in SUBSCRIPTIONS:
+                if stage in self._latency:
+                    await self.client.queues[SUBSCRIPTIONS[stage]].join()
+
+        asyncio.run_coroutine_threadsafe(asyncio.wait_for(_join(), timeout), self.loop).result()
+
+    def stop(self, timeout: float = 30) -> None:
+        try:
+            self.drain(timeout)
+        finally:
+            asyncio.run_coroutine_threadsafe(self._cancel(), self.loop).result(timeout)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
+
+    async def _cancel(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """{etapa: {queued, count, errors, p50_ms, p99_ms}}, latencia desde la publicación hasta el fin del handler."""
+        out = {}
+        for stage, s in self._latency.items():
+            lat = sorted(s.latencies)
+            out[stage] = {
+                "queued": self.client.queues[SUBSCRIPTIONS[stage]].qsize(),
+                "count": s.count,
+                "errors": s.errors,
+                "p50_ms": _publisher._percentile(lat, 50) * 1e3,
+                "p99_ms": _publisher._percentile(lat, 99) * 1e3,
+            }
+        return out
+
+
+def create_app(pipeline: Pipeline):
+    """App Flask con el webhook en POST / (lo que hace functions_framework con la función HTTP)."""
+    from flask import Flask, jsonify, request
+
+    app = Flask("smartfood-fused")
+    webhook = pipeline.modules.get("webhook")
+
+    @app.post("/")
+    def _webhook():
+        if webhook is None:
+            return "webhook no cargado", 404
+        return webhook.main(request)
+
+    @app.get("/stats")
+    def _stats():
+        return jsonify(pipeline.stats())
+
+    return app
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    pipeline = Pipeline()
+    if FUSED_WARMUP:
+        pipeline.warmup()
+    pipeline.start()
+    try:
+        create_app(pipeline).run(host=FUSED_HOST, port=FUSED_PORT, threaded=True)
+    finally:
+        pipeline.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,8 @@
 Mensajero entrega las recomendaciones al usuario (Telegram)
 ------------------------------------------------------------
 Trigger  : Pub/Sub topic 'mensaje_respuesta'
-Payload  : {
+Payload  : mensaje RESPUESTA de comun/mensajes.py, o el mismo dict en JSON:
+{
     "chat_id": 123456,
     "ingredientes": ["potato", "egg", "butter"],
     "recomendaciones": [
@@ -11,23 +12,19 @@ Payload  : {
 }
 """
 
-import base64, json, logging, os
+import base64, logging, os
 
 import functions_framework
-import requests
+
+from mensajes import decode
+from telegram_client import TelegramClient
 
 BOT_TOKEN = os.environ["BOT_TOKEN"]         
-TELEGRAM_API = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
+tg = TelegramClient(BOT_TOKEN)
 
 def _send(chat_id: int, text: str) -> None:
-    try:
-        requests.post(
-            TELEGRAM_API,
-            json={"chat_id": chat_id, "text": text, "parse_mode": "Markdown"},
-            timeout=10,
-        )
-    except Exception as e:                   
-        logging.error(f"Telegram error: {e}")
+    # síncrono: el mensaje de Pub/Sub solo se confirma cuando Telegram lo ha recibido
+    tg.send(chat_id, text)
 
 @functions_framework.cloud_event
 def main(event):
@@ -35,7 +32,7 @@ def main(event):
 
     try:
         data_b64 = event.data["message"]["data"]
-        payload = json.loads(base64.b64decode(data_b64).decode())
+        payload = decode(base64.b64decode(data_b64))
         chat_id = payload["chat_id"]
         ingredientes = payload.get("ingredientes", [])      
         recs = payload.get("recomendaciones", [])
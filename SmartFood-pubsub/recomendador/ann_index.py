@@ -0,0 +1,125 @@
+"""
+Índice ANN local sobre los embeddings de receta
+-------------------------------------------------
+
+IVF (k-means + listas invertidas) en PyTorch puro, sin servicios externos:
+las recetas se agrupan en `nlist` celdas y cada consulta solo recorre las
+`nprobe` celdas más cercanas a su vector, en vez de puntuar todo el catálogo.
+
+`KGEQueryEncoder` traduce los términos de una petición (relación, cola, peso)
+al espacio de las cabezas del modelo KGE:
+
+    DistMult  f = <h, r, t>       → q = Σ w·(r ⊙ t)        producto interno (exacto)
+    TransE    f = -‖h + r - t‖    → q = media_w(t - r)      distancia L2
+    RotatE    f = -‖h ∘ r - t‖    → q = media_w(t ∘ r̄)     distancia L2
+
+Para L2 la suma de distancias se aproxima por la distancia al centroide
+ponderado, así que los candidatos se reordenan después con el score exacto.
+"""
+
+from typing import Tuple
+
+import torch
+
+_METRICS = {
+    "DistMultInteraction": "ip",
+    "TransEInteraction":   "l2",
+    "RotatEInteraction":   "l2",
+}
+
+
+def _real(x: torch.Tensor) -> torch.Tensor:
+    """Vectores complejos como reales [Re, Im] (conserva distancias L2)."""
+    return torch.view_as_real(x).flatten(-2) if x.is_complex() else x
+
+
+class KGEQueryEncoder:
+    """Vectores de receta y de consulta para el modelo KGE entrenado."""
+
+    def __init__(self, model: torch.nn.Module):
+        self.kind = type(model.interaction).__name__
+        if self.kind not in _METRICS:
+            raise ValueError(f"ANN no soportado para {self.kind}")
+        self.metric = _METRICS[self.kind]
+        self.entities = model.entity_representations[0]
+        self.relations = model.relation_representations[0]
+
+    @torch.no_grad()
+    def recipe_vectors(self, recipe_idx: torch.Tensor) -> torch.Tensor:
+        return _real(self.entities(indices=recipe_idx)).float()
+
+    @torch.no_grad()
+    def query(self, rt: torch.Tensor, weights: torch.Tensor) -> torch.Tensor:
+        """Vector de consulta (D,) para los términos rt (N, 2) con pesos (N,)."""
+        r = self.relations(indices=rt[:, 0])
+        t = self.entities(indices=rt[:, 1])
+        if self.kind == "DistMultInteraction":
+            target = r * t
+        elif self.kind == "TransEInteraction":
+            target = t - r
+        else:
+            target = t * r.conj()
+
+        target = _real(target).float()
+        w = weights.float()[:, None]
+        if self.metric == "ip":
+            return (w * target).sum(0)
+        return (w * target).sum(0) / w.sum().clamp_min(1e-12)
+
+
+class IVFIndex:
+    """Índice IVF: centroides k-means y vectores reordenados por celda."""
+
+    def __init__(self,
+                 vectors: torch.Tensor,
+                 metric: str = "l2",
+                 nlist: int = 0,
+                 niter: int = 10,
+                 seed: int = 0):
+        x = vectors.float()
+        n = x.shape[0]
+        nlist = min(nlist or max(1, int(n ** 0.5)), n)
+        self.metric = metric
+
+        g = torch.Generator().manual_seed(seed)
+        centroids = x[torch.randperm(n, generator=g)[:nlist]].clone()
+        for _ in range(niter):
+            assign = torch.cdist(x, centroids).argmin(1)
+            sums = torch.zeros_like(centroids).index_add_(0, assign, x)
+            counts = torch.bincount(assign, minlength=nlist)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        assign = torch.cdist(x, centroids).argmin(1)
+        order = torch.argsort(assign, stable=True)
+        counts = torch.bincount(assign, minlength=nlist)
+
+        self.centroids = centroids
+        self.vectors = x[order]                      # contiguos por celda
+        self.ids = order                             # posición original de cada fila
+        self.offsets = torch.cat([torch.zeros(1, dtype=torch.long), counts.cumsum(0)])
+
+    def _sim(self, q: torch.Tensor, x: torch.Tensor) -> torch.Tensor:
+        if self.metric == "ip":
+            return x @ q
+        return -torch.cdist(q[None], x)[0]
+
+    def search(self, q: torch.Tensor, k: int, nprobe: int = 8) -> Tuple[torch.Tensor, torch.Tensor]:
+        """(similitudes, posiciones) de los k vecinos aproximados de q (D,).
+
+        Se recorren al menos `nprobe` celdas y las que hagan falta para reunir k candidatos.
+        """
+        cells = torch.argsort(self._sim(q, self.centroids), descending=True).tolist()
+        sizes = (self.offsets[1:] - self.offsets[:-1]).tolist()
+
+        chosen, total = [], 0
+        for c in cells:
+            if len(chosen) >= nprobe and total >= k:
+                break
+            chosen.append(c)
+            total += sizes[c]
+
+        rows = torch.cat([torch.arange(self.offsets[c], self.offsets[c + 1]) for c in chosen])
+        sims = self._sim(q, self.vectors[rows])
+        top_s, top_p = torch.topk(sims, k=min(k, rows.numel()))
+        return top_s, self.ids[rows[top_p]]
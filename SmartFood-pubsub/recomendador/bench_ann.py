@@ -0,0 +1,90 @@
+"""
+Benchmark recall / latencia del modo ANN frente al top-k exacto
+-----------------------------------------------------------------
+
+Genera peticiones sintéticas a partir del vocabulario del KG (1-8
+ingredientes + los 7 filtros nutricionales) y compara `_recommend_batch`
+con el índice IVF contra el resultado exacto actual.
+
+    GOOGLE_CLOUD_PROJECT=… python bench_ann.py --queries 200 --k 5 --nprobe 4 8 16
+
+Usa los mismos artefactos y variables de entorno que la función (BUNDLE_BLOB, …).
+"""
+
+import argparse
+import random
+import time
+
+import main as rec
+from ann_index import IVFIndex, KGEQueryEncoder
+
+NIVELES = {
+    "has_calories":  "calories",
+    "has_total":     "fat",
+    "has_sugar":     "sugar",
+    "has_sodium":    "sodium",
+    "has_protein":   "protein",
+    "has_saturated": "saturated_fat",
+    "has_carbs":     "carbs",
+}
+
+
+def _peticiones(n: int, k: int, seed: int):
+    rng = random.Random(seed)
+    tf = rec._TF
+    rel_ing = tf.relation_to_id["has_ingredient"]
+    ing_ids = tf.mapped_triples[tf.mapped_triples[:, 1] == rel_ing][:, 2].unique().tolist()
+    ingredientes = [tf.entity_id_to_label[i] for i in ing_ids]
+
+    out = []
+    for _ in range(n):
+        ingr = rng.sample(ingredientes, k=min(len(ingredientes), rng.randint(1, 8)))
+        filters = {
+            rel: f"{rng.choice(['low', 'normal', 'high'])}_{suf}" for rel, suf in NIVELES.items()
+        }
+        out.append((ingr, filters, k))
+    return out
+
+
+def _timed(peticiones):
+    t0 = time.perf_counter()
+    res = [rec._recommend_batch([p])[0] for p in peticiones]
+    return res, (time.perf_counter() - t0) / len(peticiones) * 1e3
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--nlist", type=int, default=0)
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rec._load_assets()
+    rec._RESULTS.maxsize = 0            # medir siempre el scoring, nunca la caché
+    peticiones = _peticiones(args.queries, args.k, args.seed)
+
+    rec._ANN = None
+    exact, ms_exact = _timed(peticiones)
+    print(f"exacto        {ms_exact:8.3f} ms/petición  ({rec._RECIPE_IDX.numel()} recetas)")
+
+    rec._ENCODER = KGEQueryEncoder(rec._MODEL)
+    t0 = time.perf_counter()
+    rec._ANN = IVFIndex(rec._ENCODER.recipe_vectors(rec._RECIPE_IDX),
+                        metric=rec._ENCODER.metric, nlist=args.nlist)
+    print(f"índice IVF    {rec._ANN.centroids.shape[0]} celdas, "
+          f"construido en {time.perf_counter() - t0:.2f} s")
+
+    for nprobe in args.nprobe:
+        rec.ANN_NPROBE = nprobe
+        approx, ms = _timed(peticiones)
+        recall = sum(
+            len({r["dish"] for r in a} & {r["dish"] for r in e}) / max(1, len(e))
+            for a, e in zip(approx, exact)
+        ) / len(exact)
+        print(f"ANN nprobe={nprobe:<3} {ms:8.3f} ms/petición  recall@{args.k}={recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
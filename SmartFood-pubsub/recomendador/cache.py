@@ -0,0 +1,72 @@
+"""
+Caché LRU en proceso para el recomendador
+-------------------------------------------
+
+Vive mientras viva la instancia de la Cloud Function. Expulsa por tamaño
+(LRU) y por antigüedad (TTL) y se vacía entera cuando cambia la versión del
+bundle del modelo, para no servir recomendaciones de un modelo anterior.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+
+class LRUCache:
+    """LRU con TTL, versión de modelo y contadores de aciertos/fallos."""
+
+    def __init__(self, maxsize: int, ttl: float = 0.0):
+        self.maxsize = maxsize          # 0 = caché desactivada
+        self.ttl = ttl                  # segundos; 0 = sin caducidad
+        self.version: str | None = None
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl and time.monotonic() - item[0] > self.ttl:
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def set_version(self, version: str | None) -> None:
+        """Invalida todo el contenido si cambia la versión del modelo."""
+        with self._lock:
+            if version != self.version:
+                self._data.clear()
+                self.version = version
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "version": self.version,
+        }
@@ -0,0 +1,122 @@
+"""
+Exporta el modelo PyKEEN entrenado + CSV de triples a un bundle binario
+-----------------------------------------------------------------------
+
+Paso offline (se ejecuta tras el entrenamiento, no en la Cloud Function):
+
+    python export_bundle.py \\
+        --model   trained_model.pkl \\
+        --triples new_triplets20_optimized.csv \\
+        --out     kg_bundle.bin \\
+        --version 2025-06-30
+
+y se sube el resultado a gs://$MODEL_BUCKET/$BUNDLE_BLOB. Junto al bundle se
+escribe `kg_bundle.vocab.txt`, el vocabulario de términos con el que webhook y
+detector codifican los mensajes (VOCAB_BLOB, ver comun/mensajes.py).
+
+`--model-kwargs` añade/sobrescribe los argumentos con los que se reconstruye
+el modelo al cargar (p. ej. '{"scoring_fct_norm": 2}' para TransE con L2);
+`embedding_dim` se deduce de los pesos.
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import torch
+from pykeen.triples import TriplesFactory
+
+from kg_bundle import query_pairs, recipe_heads, term_labels, vocab_path, write_bundle
+
+
+def read_labeled(path: Path) -> np.ndarray:
+    """Array [N, 3] de etiquetas desde el CSV head,relation,tail."""
+    df = (
+        pd.read_csv(path, dtype=str, header=0, low_memory=False)
+          .applymap(str.strip)
+    )
+    return df[["head", "relation", "tail"]].to_numpy()
+
+
+def load_triples(path: Path) -> TriplesFactory:
+    """TriplesFactory desde el CSV (ids en orden alfabético, como al entrenar)."""
+    return TriplesFactory.from_labeled_triples(read_labeled(path), create_inverse_triples=True)
+
+
+def export(model: torch.nn.Module,
+           tf: TriplesFactory,
+           out: Path,
+           *,
+           version: str,
+           model_kwargs: Dict | None = None,
+           table_dtype: str = "float32",
+           chunk: int = 256,
+           previous_terms: List[str] = ()) -> None:
+    """Escribe modelo + TriplesFactory (+ tabla de scores) como bundle en `out`, y su vocabulario."""
+    model.eval()
+    recipe_idx = recipe_heads(tf.mapped_triples, tf.relation_to_id["has_ingredient"])
+    arrays = {
+        "mapped_triples": tf.mapped_triples.numpy(),
+        "recipe_idx": recipe_idx.numpy(),
+    }
+    arrays.update({
+        f"param/{k}": v.detach().cpu().numpy() for k, v in model.state_dict().items()
+    })
+
+    if table_dtype != "none":
+        pairs = query_pairs(tf.mapped_triples, recipe_idx)
+        with torch.no_grad():
+            table = torch.cat([
+                model.score_h(pairs[i:i + chunk], heads=recipe_idx)
+                for i in range(0, len(pairs), chunk)
+            ])
+        arrays["table_pairs"] = pairs.numpy()
+        arrays["table"] = table.to(getattr(torch, table_dtype)).numpy()
+
+    kwargs = {"embedding_dim": model.entity_representations[0].shape[0]}
+    kwargs.update(model_kwargs or {})
+
+    entities = [tf.entity_id_to_label[i] for i in range(tf.num_entities)]
+    relations = [tf.relation_id_to_label[i] for i in range(tf.real_num_relations)]
+    terms = term_labels(entities, relations, recipe_idx, previous_terms)
+    write_bundle(
+        out,
+        version=version,
+        model_class=type(model).__name__,
+        model_kwargs=kwargs,
+        inverse_triples=tf.create_inverse_triples,
+        entities=entities,
+        relations=relations,
+        arrays=arrays,
+        terms=terms,
+    )
+    vocab_path(out).write_text("\n".join(terms), encoding="utf-8")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model",   required=True, type=Path)
+    ap.add_argument("--triples", required=True, type=Path)
+    ap.add_argument("--out",     required=True, type=Path)
+    ap.add_argument("--version", default=time.strftime("%Y%m%d%H%M%S"))
+    ap.add_argument("--model-kwargs", default="{}", type=json.loads)
+    ap.add_argument("--table-dtype", default="float32", choices=["float32", "float16", "none"],
+                    help="dtype de la tabla precalculada de scores (none = no incluirla)")
+    ap.add_argument("--chunk", default=256, type=int)
+    args = ap.parse_args()
+
+    model = torch.load(args.model, map_location="cpu", weights_only=False)
+    export(model, load_triples(args.triples), args.out,
+           version=args.version, model_kwargs=args.model_kwargs,
+           table_dtype=args.table_dtype, chunk=args.chunk)
+    print(f"Bundle {args.version} escrito en {args.out} "
+          f"({args.out.stat().st_size / 2**20:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
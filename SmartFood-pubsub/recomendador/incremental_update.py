@@ -0,0 +1,179 @@
+"""
+Actualización incremental del KG + reentrenamiento en caliente
+----------------------------------------------------------------
+
+Paso offline semanal, alternativa a repetir HPO + entrenamiento completo
+(`notebooks/pykeen.ipynb`) cada vez que cambia el catálogo:
+
+    python incremental_update.py \\
+        --bundle  kg_bundle.bin \\
+        --triples new_triplets20_optimized.csv \\
+        --out     kg_bundle.new.bin --epochs 5
+
+    # sin bundle previo: modelo .pkl + CSV con el que se entrenó
+    python incremental_update.py --model trained_model.pkl --old-triples old.csv \\
+        --triples new.csv --out kg_bundle.new.bin
+
+1. Vocabularios: las entidades y relaciones que ya existían conservan su id;
+   las nuevas se añaden al final (orden alfabético entre ellas). Las que
+   desaparecen del CSV se quedan en el vocabulario sin triples.
+2. Modelo: se reconstruye con el nuevo tamaño y se copian las filas de los
+   embeddings anteriores; solo las filas nuevas parten de la inicialización.
+3. Entrenamiento: unas pocas épocas sLCWA sobre los triples nuevos y los
+   "afectados" (todos los de una receta con algún triple nuevo y los que tocan
+   una entidad nueva), más una muestra `--replay` del resto para no derivar.
+4. Se escribe un bundle con versión nueva (y su vocabulario de términos, que
+   solo crece por el final); subido a gs://$MODEL_BUCKET/$BUNDLE_BLOB
+   el recomendador lo recarga solo (BUNDLE_RELOAD_S en main.py).
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import torch
+from pykeen.models import model_resolver
+from pykeen.training import SLCWATrainingLoop
+from pykeen.triples import TriplesFactory
+
+from export_bundle import export, load_triples, read_labeled
+from kg_bundle import read_bundle, recipe_heads, term_labels
+
+
+def extend_vocab(old: Dict[str, int], labels) -> Dict[str, int]:
+    """Copia de `old` con las etiquetas nuevas de `labels` añadidas a partir de len(old)."""
+    new = dict(old)
+    for label in sorted(set(labels) - old.keys()):
+        new[label] = len(new)
+    return new
+
+
+def resize_state(old: Dict[str, torch.Tensor], new: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+    """`new` con las primeras filas de cada parámetro sustituidas por las de `old`."""
+    out = {}
+    for name, value in new.items():
+        prev = old.get(name)
+        if prev is not None and prev.dim() and prev.shape[1:] == value.shape[1:]:
+            value = value.clone()
+            n = min(len(prev), len(value))
+            value[:n] = prev[:n]
+        elif prev is not None and prev.shape == value.shape:
+            value = prev
+        out[name] = value
+    return out
+
+
+def _keys(mapped: torch.Tensor, num_entities: int, num_relations: int) -> torch.Tensor:
+    return (mapped[:, 0] * num_relations + mapped[:, 1]) * num_entities + mapped[:, 2]
+
+
+def affected_triples(old: torch.Tensor, new: torch.Tensor, num_old_entities: int,
+                     num_entities: int, num_relations: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    """(máscara de triples nuevos, máscara de triples a reentrenar) sobre `new`."""
+    added = ~torch.isin(_keys(new, num_entities, num_relations), _keys(old, num_entities, num_relations))
+    changed_heads = new[added, 0].unique()
+    touched = (
+        torch.isin(new[:, 0], changed_heads)
+        | (new[:, 0] >= num_old_entities)
+        | (new[:, 2] >= num_old_entities)
+    )
+    return added, touched
+
+
+def _previous(args) -> Tuple[torch.Tensor, Dict[str, int], Dict[str, int], str, Dict,
+                             Dict[str, torch.Tensor], List[str]]:
+    """mapped_triples, id maps, clase, kwargs, state_dict y vocabulario de términos anteriores."""
+    if args.bundle:
+        bundle = read_bundle(args.bundle)
+        return (
+            bundle.tensor("mapped_triples").clone(),
+            {label: i for i, label in enumerate(bundle.entities)},
+            {label: i for i, label in enumerate(bundle.relations)},
+            bundle.model_class,
+            dict(bundle.model_kwargs),
+            {k: v.clone() for k, v in bundle.state_dict().items()},
+            bundle.terms,
+        )
+    model = torch.load(args.model, map_location="cpu", weights_only=False)
+    tf = load_triples(args.old_triples)
+    kwargs = {"embedding_dim": model.entity_representations[0].shape[0]}
+    terms = term_labels(
+        [tf.entity_id_to_label[i] for i in range(tf.num_entities)],
+        [tf.relation_id_to_label[i] for i in range(tf.real_num_relations)],
+        recipe_heads(tf.mapped_triples, tf.relation_to_id["has_ingredient"]),
+    )
+    return (tf.mapped_triples, tf.entity_to_id, tf.relation_to_id,
+            type(model).__name__, kwargs, model.state_dict(), terms)
+
+
+def main(argv: List[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    prev = ap.add_mutually_exclusive_group(required=True)
+    prev.add_argument("--bundle", type=Path, help="bundle anterior (kg_bundle.bin)")
+    prev.add_argument("--model", type=Path, help="trained_model.pkl anterior (requiere --old-triples)")
+    ap.add_argument("--old-triples", type=Path)
+    ap.add_argument("--triples", required=True, type=Path, help="CSV head,relation,tail completo y actualizado")
+    ap.add_argument("--out", required=True, type=Path)
+    ap.add_argument("--version", default=time.strftime("%Y%m%d%H%M%S"))
+    ap.add_argument("--model-kwargs", default="{}", type=json.loads)
+    ap.add_argument("--epochs", type=int, default=5)
+    ap.add_argument("--batch-size", type=int, default=1024)
+    ap.add_argument("--lr", type=float, default=1e-3)
+    ap.add_argument("--replay", type=float, default=0.1,
+                    help="fracción de triples no afectados que se mezclan en el reentrenamiento")
+    ap.add_argument("--table-dtype", default="float32", choices=["float32", "float16", "none"])
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+    if args.model and not args.old_triples:
+        ap.error("--model requiere --old-triples")
+    torch.manual_seed(args.seed)
+
+    (old_mapped, old_entities, old_relations, model_class, model_kwargs,
+     old_state, old_terms) = _previous(args)
+    model_kwargs.update(args.model_kwargs)
+
+    labeled = read_labeled(args.triples)
+    entity_to_id = extend_vocab(old_entities, [*labeled[:, 0], *labeled[:, 2]])
+    relation_to_id = extend_vocab(old_relations, labeled[:, 1])
+    tf = TriplesFactory.from_labeled_triples(
+        labeled, create_inverse_triples=True,
+        entity_to_id=entity_to_id, relation_to_id=relation_to_id,
+    )
+
+    model = model_resolver.make(model_class, triples_factory=tf, **model_kwargs)
+    model.load_state_dict(resize_state(old_state, model.state_dict()))
+
+    added, touched = affected_triples(old_mapped, tf.mapped_triples, len(old_entities),
+                                      tf.num_entities, tf.real_num_relations)
+    replay = ~touched & (torch.rand(len(touched)) < args.replay)
+    train = tf.mapped_triples[touched | replay]
+    print(f"{tf.num_entities - len(old_entities)} entidades y "
+          f"{tf.real_num_relations - len(old_relations)} relaciones nuevas; "
+          f"{int(added.sum())} triples nuevos, {int(touched.sum())} afectados, "
+          f"{int(replay.sum())} de repaso")
+
+    if len(train) and args.epochs:
+        train_tf = TriplesFactory(
+            mapped_triples=train, entity_to_id=entity_to_id,
+            relation_to_id=relation_to_id, create_inverse_triples=True,
+        )
+        loop = SLCWATrainingLoop(
+            model=model, triples_factory=train_tf,
+            optimizer=torch.optim.Adam(model.parameters(), lr=args.lr),
+        )
+        start = time.perf_counter()
+        losses = loop.train(triples_factory=train_tf, num_epochs=args.epochs,
+                            batch_size=args.batch_size, use_tqdm=False)
+        print(f"{args.epochs} épocas en {time.perf_counter() - start:.1f}s, pérdida final {losses[-1]:.4f}")
+
+    export(model, tf, args.out, version=args.version, model_kwargs=model_kwargs,
+           table_dtype=args.table_dtype, previous_terms=old_terms)
+    print(f"Bundle {args.version} escrito en {args.out} "
+          f"({args.out.stat().st_size / 2**20:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
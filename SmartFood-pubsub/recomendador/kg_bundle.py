@@ -0,0 +1,192 @@
+"""
+Bundle binario del grafo de conocimiento para el recomendador
+---------------------------------------------------------------
+
+Sustituye al par CSV de triples + `.pkl` en el arranque en frío: todo lo que
+necesita el recomendador se escribe offline (ver `export_bundle.py`) en un
+único fichero que se abre con `np.memmap`, sin parsear CSV ni reconstruir
+el TriplesFactory desde etiquetas.
+
+Formato (FORMAT = 1)
+--------------------
+    [0, 8)        magic  b"SFKGBNDL"
+    [8, 16)       longitud del header JSON (uint64 little-endian)
+    [16, …)       header JSON utf-8
+    …             arrays crudos, cada uno alineado a 64 bytes
+
+Header:
+
+    {
+      "format"   : 1,
+      "version"  : "2025-06-30",            # versión del artefacto
+      "model"    : {"class": "TransE", "kwargs": {"embedding_dim": 256},
+                    "inverse_triples": true},
+      "entities" : ["bacon", …],            # etiqueta en la posición = id
+      "relations": ["has_calories", …],
+      "terms"    : ["has_calories", …],     # opcional, vocabulario de comun/mensajes.py
+      "arrays"   : {"mapped_triples": {"dtype": "<i8", "shape": [N, 3], "offset": …},
+                    "recipe_idx"    : {…},
+                    "param/<clave state_dict>": {…},
+                    "table_pairs"   : {…},  # opcional, ver main._build_table
+                    "table"         : {…}}
+    }
+"""
+
+import json
+import struct
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import torch
+
+FORMAT = 1
+MAGIC  = b"SFKGBNDL"
+ALIGN  = 64
+PARAM  = "param/"
+
+
+@dataclass
+class KGBundle:
+    version: str
+    model_class: str
+    model_kwargs: Dict
+    inverse_triples: bool
+    entities: List[str]
+    relations: List[str]
+    arrays: Dict[str, np.memmap]
+    terms: List[str] = field(default_factory=list)
+
+    def tensor(self, name: str) -> torch.Tensor:
+        """Tensor sobre el memmap (copy-on-write, las páginas se leen bajo demanda)."""
+        return torch.from_numpy(self.arrays[name])
+
+    def state_dict(self) -> Dict[str, torch.Tensor]:
+        return {
+            name[len(PARAM):]: self.tensor(name)
+            for name in self.arrays if name.startswith(PARAM)
+        }
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_bundle(path: Path,
+                 *,
+                 version: str,
+                 model_class: str,
+                 model_kwargs: Dict,
+                 inverse_triples: bool,
+                 entities: List[str],
+                 relations: List[str],
+                 arrays: Dict[str, np.ndarray],
+                 terms: List[str] | None = None) -> None:
+    arrays = {k: np.ascontiguousarray(v) for k, v in arrays.items()}
+
+    # El header incluye los offsets, que dependen de su propia longitud:
+    # se reserva sitio con offsets provisionales y se recalcula hasta que cuadra.
+    offsets = {k: 0 for k in arrays}
+    while True:
+        header = json.dumps({
+            "format": FORMAT,
+            "version": version,
+            "model": {"class": model_class, "kwargs": model_kwargs,
+                      "inverse_triples": inverse_triples},
+            "entities": entities,
+            "relations": relations,
+            **({"terms": terms} if terms is not None else {}),
+            "arrays": {
+                k: {"dtype": v.dtype.str, "shape": list(v.shape), "offset": offsets[k]}
+                for k, v in arrays.items()
+            },
+        }).encode()
+        pos = _align(len(MAGIC) + 8 + len(header))
+        new_offsets = {}
+        for k, v in arrays.items():
+            new_offsets[k] = pos
+            pos = _align(pos + v.nbytes)
+        if new_offsets == offsets:
+            break
+        offsets = new_offsets
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for k, v in arrays.items():
+            f.write(b"\0" * (offsets[k] - f.tell()))
+            f.write(v.tobytes())
+
+
+def _read_header(path: Path) -> Dict:
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} no es un bundle KG")
+        (size,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(size))
+    if header["format"] != FORMAT:
+        raise ValueError(f"Formato de bundle {header['format']} no soportado")
+    return header
+
+
+def read_version(path: Path) -> str:
+    """Versión del artefacto leyendo solo el header."""
+    return _read_header(path)["version"]
+
+
+def read_bundle(path: Path) -> KGBundle:
+    header = _read_header(path)
+    arrays = {
+        k: np.memmap(path, dtype=np.dtype(a["dtype"]), mode="c",
+                     offset=a["offset"], shape=tuple(a["shape"]))
+        for k, a in header["arrays"].items()
+    }
+    terms = header.get("terms")
+    if terms is None:
+        terms = term_labels(header["entities"], header["relations"], arrays["recipe_idx"])
+    return KGBundle(
+        version=header["version"],
+        model_class=header["model"]["class"],
+        model_kwargs=header["model"]["kwargs"],
+        inverse_triples=header["model"]["inverse_triples"],
+        entities=header["entities"],
+        relations=header["relations"],
+        arrays=arrays,
+        terms=terms,
+    )
+
+
+def vocab_path(bundle_path: Path) -> Path:
+    """Fichero con `terms` (una etiqueta por línea) que se sube junto al bundle."""
+    return Path(bundle_path).with_suffix(".vocab.txt")
+
+
+def term_labels(entities: List[str], relations: List[str], recipe_idx,
+                previous: List[str] = ()) -> List[str]:
+    """Vocabulario de los mensajes: relaciones y entidades que no son receta.
+
+    Con `previous` (el del bundle anterior) solo se añaden al final las
+    etiquetas nuevas, para que los ids que ya usan las funciones no cambien.
+    """
+    recipes = set(np.asarray(recipe_idx).tolist())
+    labels = [*relations, *(e for i, e in enumerate(entities) if i not in recipes)]
+    seen = set(previous)
+    return [*previous, *(label for label in dict.fromkeys(labels) if label not in seen)]
+
+
+def recipe_heads(mapped_triples: torch.Tensor, rel_id_ing: int) -> torch.Tensor:
+    """Ids de entidades que participan como head en "has_ingredient" (recetas)."""
+    mask = mapped_triples[:, 1] == rel_id_ing
+    return torch.unique(mapped_triples[mask][:, 0])
+
+
+def query_pairs(mapped_triples: torch.Tensor,
+                recipe_idx: torch.Tensor,
+                skip_rel: int | None = None) -> torch.Tensor:
+    """Pares (rel_id, tail_id) distintos de los triples cuya cabeza es una receta."""
+    triples = mapped_triples[torch.isin(mapped_triples[:, 0], recipe_idx)]
+    if skip_rel is not None:
+        triples = triples[triples[:, 1] != skip_rel]
+    return torch.unique(triples[:, 1:], dim=0)
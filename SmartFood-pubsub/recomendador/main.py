@@ -4,7 +4,8 @@ Recomendador PyKEEN Pub/Sub ➜ Pub/Sub
 
 Topic de entrada : ingredientes_detectados
     Llegan mensajes del webhook (texto) y del detector YOLO (imagen).  
-    Formato del payload entrante:
+    Formato del payload entrante (mensaje PEDIDO de comun/mensajes.py, o el
+    mismo dict en JSON):
 
         {
           "chat_id"      : 123456,           # ID del chat de Telegram
@@ -24,28 +25,68 @@ Topic de salida  : mensaje_respuesta
 Variables de entorno (se inyectan en el despliegue)
 ---------------------------------------------------
 MODEL_BUCKET     bucket GCS con los artefactos 
+BUNDLE_BLOB      ruta al bundle binario del KG (ver export_bundle.py, p. ej. kge/kg_bundle.bin);
+                 vacío (por defecto) = formato antiguo MODEL_BLOB + CSV_BLOB
 MODEL_BLOB       ruta al `.pkl` entrenado
 CSV_BLOB         ruta al CSV triples
 TOPIC_MENSAJERO  nombre del topic de salida
+W_INGREDIENT     peso de cada término has_ingredient en la suma (1.0)
+W_FILTER         peso de cada filtro nutricional en la suma (1.0)
+SCORE_CHUNK      máx. pares (relación, cola) por forward del modelo (256)
+PRECOMPUTE       términos precalculados al arrancar: all | filters | none (all)
+TABLE_DTYPE      dtype de la tabla precalculada: float32 | float16 (float32)
+ANN              1 = top-k aproximado con índice IVF sobre embeddings de receta (0)
+ANN_NLIST        nº de celdas del índice (0 = √num_recetas)
+ANN_NPROBE       celdas recorridas por consulta (8)
+ANN_RERANK       candidatos ANN por receta pedida, reordenados con score exacto (4)
+CACHE_SIZE       nº máx. de respuestas en la caché LRU en proceso (1024; 0 = desactivada)
+CACHE_TTL        segundos de vida de cada respuesta cacheada (600; 0 = sin caducidad)
+TERM_CACHE_MB    memoria máx. de la caché de vectores por término (64; 0 = desactivada);
+                 solo guarda pares que no están en la tabla precalculada, así que con
+                 PRECOMPUTE=all apenas se usa: sirve con PRECOMPUTE=filters | none
+BUNDLE_RELOAD_S  cada cuántos segundos se comprueba si hay un bundle nuevo en GCS
+                 (p. ej. de incremental_update.py) y se recarga en caliente (300; 0 = nunca)
+PUBSUB_*         batching y flush de la publicación (ver publisher.py)
 """
 
 
-import base64, json, logging, os
+import base64, logging, os, time
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 import google.auth
 import functions_framework
 import pandas as pd
 import torch
-from google.cloud import pubsub_v1, storage
+from google.cloud import storage
+from pykeen.models import model_resolver
 from pykeen.triples import TriplesFactory
 
+from ann_index import IVFIndex, KGEQueryEncoder
+from cache import LRUCache
+from kg_bundle import KGBundle, query_pairs, read_bundle, recipe_heads, term_labels
+from mensajes import RESPUESTA, Vocab, VocabError, decode, encode
+from publisher import Publisher
+
 # ───── ENV ─────
 MODEL_BUCKET    = os.getenv("MODEL_BUCKET",   "smartfood-models")
+BUNDLE_BLOB     = os.getenv("BUNDLE_BLOB",    "")
 MODEL_BLOB      = os.getenv("MODEL_BLOB",     "kge/trained_model.pkl")
 CSV_BLOB        = os.getenv("CSV_BLOB",       "kge/new_triplets20_optimized.csv")
 TOPIC_MENSAJERO = os.getenv("TOPIC_MENSAJERO", "mensaje_respuesta")
+W_INGREDIENT    = float(os.getenv("W_INGREDIENT", "1.0"))
+W_FILTER        = float(os.getenv("W_FILTER",     "1.0"))
+SCORE_CHUNK     = int(os.getenv("SCORE_CHUNK",    "256"))
+PRECOMPUTE      = os.getenv("PRECOMPUTE",         "all")
+TABLE_DTYPE     = getattr(torch, os.getenv("TABLE_DTYPE", "float32"))
+ANN             = os.getenv("ANN", "0") == "1"
+ANN_NLIST       = int(os.getenv("ANN_NLIST",      "0"))
+ANN_NPROBE      = int(os.getenv("ANN_NPROBE",     "8"))
+ANN_RERANK      = int(os.getenv("ANN_RERANK",     "4"))
+CACHE_SIZE      = int(os.getenv("CACHE_SIZE",     "1024"))
+CACHE_TTL       = float(os.getenv("CACHE_TTL",    "600"))
+TERM_CACHE_MB   = float(os.getenv("TERM_CACHE_MB", "64"))
+BUNDLE_RELOAD_S = float(os.getenv("BUNDLE_RELOAD_S", "300"))
 
 PROJECT_ID = (
     os.getenv("GOOGLE_CLOUD_PROJECT")
@@ -62,8 +103,24 @@ DEVICE = torch.device("cpu")
 _MODEL: torch.nn.Module | None = None
 _TF: TriplesFactory | None = None
 _RECIPE_IDX: torch.Tensor | None = None       
+_BUNDLE_VERSION: str | None = None
+_BUNDLE_GEN: int | None = None                # generación GCS del bundle cargado
+_LAST_CHECK = 0.0
+_TABLE: torch.Tensor | None = None            # [num_queries × num_recetas]
+_TABLE_ROW: Dict[Tuple[int, int], int] = {}   # (rel_id, tail_id) -> fila
+_ANN: IVFIndex | None = None
+_ENCODER: KGEQueryEncoder | None = None
+_VOCAB: Vocab | None = None                   # ids de términos de los mensajes (mensajes.py)
+# (ingredientes ordenados sin duplicados, filtros ordenados, k) -> top-k
+_RESULTS = LRUCache(CACHE_SIZE, CACHE_TTL)
+# (rel_id, tail_id) -> vector de scores sobre recetas, para términos fuera de _TABLE
+_TERMS = LRUCache(0)
+
+# estado que sustituye una recarga del bundle (se restaura si la carga falla)
+_ASSETS = ("_MODEL", "_TF", "_RECIPE_IDX", "_BUNDLE_VERSION", "_BUNDLE_GEN",
+           "_TABLE", "_TABLE_ROW", "_ANN", "_ENCODER", "_VOCAB")
 
-publisher = pubsub_v1.PublisherClient()
+publisher = Publisher()
 topic_out = publisher.topic_path(PROJECT_ID, TOPIC_MENSAJERO)
 
 # ───────── helpers ─────────
@@ -73,12 +130,92 @@ def _download(bucket: str, blob: str, dest: Path) -> Path:
     storage.Client().bucket(bucket).blob(blob).download_to_filename(dest)
     return dest
 
+def _download_bundle() -> Path:
+    """Descarga la generación actual del bundle; cada generación va a su propio fichero."""
+    global _BUNDLE_GEN, _LAST_CHECK
+    blob = storage.Client().bucket(MODEL_BUCKET).get_blob(BUNDLE_BLOB)
+    if blob is None:
+        raise FileNotFoundError(f"bundle gs://{MODEL_BUCKET}/{BUNDLE_BLOB} no encontrado "
+                                "(súbelo con export_bundle.py o deja BUNDLE_BLOB vacío)")
+    dest = TMP / f"kg_bundle.{blob.generation}.bin"
+    if not dest.exists():
+        blob.download_to_filename(dest)
+    _BUNDLE_GEN, _LAST_CHECK = blob.generation, time.monotonic()
+    return dest
+
+def _maybe_reload(force: bool = False) -> None:
+    """Recarga el bundle si su generación en GCS ha cambiado (como mucho cada BUNDLE_RELOAD_S).
+
+    Si la descarga o la carga fallan se restaura el estado anterior, que sigue sirviendo.
+    """
+    global _MODEL, _LAST_CHECK
+    if not BUNDLE_BLOB or _MODEL is None:
+        return
+    if not force and (not BUNDLE_RELOAD_S or time.monotonic() - _LAST_CHECK < BUNDLE_RELOAD_S):
+        return
+    _LAST_CHECK = time.monotonic()
+    blob = storage.Client().bucket(MODEL_BUCKET).get_blob(BUNDLE_BLOB)
+    if blob is None or blob.generation == _BUNDLE_GEN:
+        return
+
+    old = TMP / f"kg_bundle.{_BUNDLE_GEN}.bin"
+    serving = {name: globals()[name] for name in _ASSETS}
+    _MODEL = None
+    try:
+        _load_assets()
+    except Exception:
+        # el bundle anterior sigue sirviendo; se reintenta tras BUNDLE_RELOAD_S
+        logging.exception(f"[Recomendador] bundle {blob.generation} no cargado, "
+                          f"se sigue con {serving['_BUNDLE_VERSION']}")
+        (TMP / f"kg_bundle.{blob.generation}.bin").unlink(missing_ok=True)
+        globals().update(serving)
+        _RESULTS.set_version(_BUNDLE_VERSION)
+        _TERMS.set_version(_BUNDLE_VERSION)
+        return
+    # /tmp es memoria en Cloud Functions; el memmap anterior sigue válido hasta soltarse
+    old.unlink(missing_ok=True)
+
 def _load_assets() -> None:
     """Carga modelo y TriplesFactory (una sola vez)."""
     global _MODEL, _TF, _RECIPE_IDX
     if _MODEL and _TF is not None and _RECIPE_IDX is not None:
         return
 
+    if BUNDLE_BLOB:
+        bundle = read_bundle(_download_bundle())
+        _load_bundle(bundle)
+    else:
+        bundle = None
+        _load_legacy()
+
+    _build_table(bundle)
+    if ANN:
+        _build_ann()
+    _RESULTS.set_version(_BUNDLE_VERSION)
+    _TERMS.set_version(_BUNDLE_VERSION)
+    _TERMS.maxsize = int(TERM_CACHE_MB * 2**20) // (4 * _RECIPE_IDX.numel())
+
+def _load_bundle(bundle: KGBundle) -> None:
+    """Modelo y TriplesFactory desde el bundle memmap, sin parsear CSV ni etiquetas."""
+    global _MODEL, _TF, _RECIPE_IDX, _BUNDLE_VERSION, _VOCAB
+    _TF = TriplesFactory(
+        mapped_triples=bundle.tensor("mapped_triples"),
+        entity_to_id={label: i for i, label in enumerate(bundle.entities)},
+        relation_to_id={label: i for i, label in enumerate(bundle.relations)},
+        create_inverse_triples=bundle.inverse_triples,
+    )
+    _MODEL = model_resolver.make(bundle.model_class, triples_factory=_TF, **bundle.model_kwargs)
+    _MODEL.load_state_dict(bundle.state_dict())
+    _MODEL.to(DEVICE).eval()
+
+    _RECIPE_IDX = bundle.tensor("recipe_idx")
+    _BUNDLE_VERSION = bundle.version
+    _VOCAB = Vocab(bundle.terms)
+    logging.info(f"[Recomendador] bundle KG {bundle.version} cargado")
+
+def _load_legacy() -> None:
+    """Modelo `.pkl` + CSV de triples (formato anterior al bundle)."""
+    global _MODEL, _TF, _RECIPE_IDX, _VOCAB
     model_path = _download(MODEL_BUCKET, MODEL_BLOB, TMP / "model.pkl")
     csv_path   = _download(MODEL_BUCKET, CSV_BLOB,   TMP / "triples.csv")
 
@@ -95,59 +232,238 @@ def _load_assets() -> None:
     )
 
     # ids de entidades que participan como head en "has_ingredient" de recetas
+    _RECIPE_IDX = recipe_heads(_TF.mapped_triples, _TF.relation_to_id["has_ingredient"])
+    _VOCAB = Vocab(term_labels(
+        [_TF.entity_id_to_label[i] for i in range(_TF.num_entities)],
+        [_TF.relation_id_to_label[i] for i in range(_TF.real_num_relations)],
+        _RECIPE_IDX,
+    ))
+
+def _build_table(bundle: KGBundle | None = None) -> None:
+    """Precalcula los scores de los pares (relación, cola) conocidos contra las recetas.
+
+    El vocabulario son los pares distintos que aparecen en triples cuya cabeza
+    es una receta: ingredientes y niveles nutricionales (low_calories … high_carbs).
+    Si el bundle ya trae la tabla se usa directamente desde el memmap.
+    """
+    global _TABLE, _TABLE_ROW
+    if PRECOMPUTE == "none":
+        _TABLE, _TABLE_ROW = None, {}
+        return
+
     rel_id_ing = _TF.relation_to_id["has_ingredient"]
-    mask       = _TF.mapped_triples[:, 1] == rel_id_ing
-    _RECIPE_IDX = torch.unique(_TF.mapped_triples[mask][:, 0])
-
-def _score_safe(rel: str, tail: str) -> torch.Tensor:
-    """Vector de scores (ceros si rel/tail no existen)."""
-    if rel not in _TF.relation_to_id or tail not in _TF.entity_to_id:
-        logging.warning(f"[Recomendador] label desconocido – rel:{rel} tail:{tail}")
-        return torch.zeros(_TF.num_entities, device=DEVICE)
-    r = _TF.relation_to_id[rel]
-    t = _TF.entity_to_id[tail]
+    if bundle is not None and "table" in bundle.arrays:
+        pairs, _TABLE = bundle.tensor("table_pairs"), bundle.tensor("table")
+        if PRECOMPUTE == "filters":
+            keep = pairs[:, 0] != rel_id_ing
+            pairs, _TABLE = pairs[keep], _TABLE[keep]
+    else:
+        skip = rel_id_ing if PRECOMPUTE == "filters" else None
+        pairs = query_pairs(_TF.mapped_triples, _RECIPE_IDX, skip_rel=skip)
+        _TABLE = _score_recipes(pairs).to(TABLE_DTYPE)
+
+    _TABLE_ROW = {(r, t): i for i, (r, t) in enumerate(pairs.tolist())}
+    logging.info(f"[Recomendador] tabla precalculada {tuple(_TABLE.shape)} {_TABLE.dtype}")
+
+def _build_ann() -> None:
+    """Índice IVF sobre los embeddings de las recetas (modo ANN opcional)."""
+    global _ANN, _ENCODER
+    try:
+        _ENCODER = KGEQueryEncoder(_MODEL)
+    except ValueError as e:
+        logging.warning(f"[Recomendador] {e}; se usa top-k exacto")
+        return
+    _ANN = IVFIndex(_ENCODER.recipe_vectors(_RECIPE_IDX), metric=_ENCODER.metric, nlist=ANN_NLIST)
+    logging.info(f"[Recomendador] índice ANN {_ANN.centroids.shape[0]} celdas ({_ENCODER.metric})")
+
+# (ingredientes, filtros, k) de una petición de chat
+Peticion = Tuple[List[str], Dict[str, str], int]
+
+def _terms(ingredientes: List[str],
+           filters: Dict[str, str]) -> List[Tuple[int, int, float]]:
+    """(rel_id, tail_id, peso) de cada término; descarta labels desconocidos."""
+    queries  = [("has_ingredient", ing, W_INGREDIENT) for ing in ingredientes]
+    queries += [(rel, ent, W_FILTER) for rel, ent in filters.items()]
+
+    terms = []
+    for rel, tail, w in queries:
+        if rel not in _TF.relation_to_id or tail not in _TF.entity_to_id:
+            logging.warning(f"[Recomendador] label desconocido – rel:{rel} tail:{tail}")
+            continue
+        terms.append((_TF.relation_to_id[rel], _TF.entity_to_id[tail], w))
+    return terms
+
+def _score_recipes(rt: torch.Tensor) -> torch.Tensor:
+    """Scores (N, num_recetas) de un batch (N, 2) relación/cola, en bloques de SCORE_CHUNK.
+
+    Solo se puntúan las cabezas-receta; el resto de entidades nunca se devuelve.
+    """
+    out = torch.empty(rt.shape[0], _RECIPE_IDX.numel(), device=DEVICE)
     with torch.no_grad():
-        return _MODEL.score_h(torch.tensor([[r, t]], device=DEVICE)).squeeze(0)
+        for i in range(0, rt.shape[0], SCORE_CHUNK):
+            out[i:i + SCORE_CHUNK] = _MODEL.score_h(rt[i:i + SCORE_CHUNK], heads=_RECIPE_IDX)
+    return out
 
-def _recommend(ingredientes: List[str],
-               filters: Dict[str, str],
-               k: int) -> List[Dict]:
-    combined = torch.zeros(_TF.num_entities, device=DEVICE)
+def _term_scores(pairs: List[Tuple[int, int]]) -> torch.Tensor:
+    """Scores (N, num_recetas) de cada par (relación, cola).
+
+    Orden de búsqueda: tabla precalculada, caché de vectores por término y,
+    solo para los pares nunca vistos, un único forward cuyo resultado se cachea.
+    """
+    out = torch.empty(len(pairs), _RECIPE_IDX.numel(), device=DEVICE)
+
+    rows = [_TABLE_ROW.get(p, -1) for p in pairs]
+    hit  = [i for i, row in enumerate(rows) if row >= 0]
+    if hit:
+        out[hit] = _TABLE[[rows[i] for i in hit]].float()
+
+    miss = []
+    for i, row in enumerate(rows):
+        if row >= 0:
+            continue
+        vec = _TERMS.get(pairs[i])
+        if vec is None:
+            miss.append(i)
+        else:
+            out[i] = vec
+
+    if miss:
+        scores = _score_recipes(torch.tensor([pairs[i] for i in miss], device=DEVICE))
+        for i, vec in zip(miss, scores):
+            # copia: una vista de la fila retendría el batch entero y rompería TERM_CACHE_MB
+            _TERMS.put(pairs[i], vec.clone())
+        out[miss] = scores
+    return out
+
+def _topk_exact(terms: List[List[Tuple[int, int, float]]],
+                k: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Top-k exacto con un único batch de términos únicos.
+
+    Cada petición es una fila de la matriz de pesos W (B × N) sobre los N
+    pares (relación, cola) distintos; la puntuación final es W @ scores.
+    """
+    index: Dict[Tuple[int, int], int] = {}
+    rows, cols, vals = [], [], []
+    for b, terms_b in enumerate(terms):
+        for r, t, w in terms_b:
+            rows.append(b)
+            cols.append(index.setdefault((r, t), len(index)))
+            vals.append(w)
+
+    combined = torch.zeros(len(terms), _RECIPE_IDX.numel(), device=DEVICE)
+    if index:
+        scores  = _term_scores(list(index))
+        weights = torch.zeros(len(terms), len(index), device=DEVICE)
+        weights.index_put_(
+            (torch.tensor(rows), torch.tensor(cols)),
+            torch.tensor(vals, dtype=weights.dtype),
+            accumulate=True,
+        )
+        combined = weights @ scores
 
-    for ing in ingredientes:
-        combined += _score_safe("has_ingredient", ing)
+    return torch.topk(combined, k=k, dim=1)
 
-    for rel, ent in filters.items():
-        combined += _score_safe(rel, ent)
+def _topk_ann(terms: List[List[Tuple[int, int, float]]],
+              k: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Top-k aproximado: candidatos del índice IVF reordenados con el score exacto."""
+    top_s, top_pos = _topk_exact([[] for _ in terms], k)
+    for b, terms_b in enumerate(terms):
+        if not terms_b:
+            continue
+        rt = torch.tensor([(r, t) for r, t, _ in terms_b], device=DEVICE)
+        w  = torch.tensor([w for _, _, w in terms_b], device=DEVICE)
 
-    # Filtrar solo las entidades-receta
-    recipe_scores = combined[_RECIPE_IDX]
-    top_s, top_pos = torch.topk(recipe_scores, k=min(k, recipe_scores.numel()))
+        # al menos k candidatos aunque ANN_RERANK sea 0; menos solo si el catálogo es menor
+        _, cand = _ANN.search(_ENCODER.query(rt, w), max(k, k * ANN_RERANK), ANN_NPROBE)
+        with torch.no_grad():
+            exact = w @ _MODEL.score_h(rt, heads=_RECIPE_IDX[cand])
+        s, p = torch.topk(exact, k=min(k, cand.numel()))
+        top_s[b, :len(s)], top_pos[b, :len(s)] = s, cand[p]
+    return top_s, top_pos
+
+def _canonical(ingredientes: List[str], filters: Dict[str, str], k: int) -> Tuple:
+    """Clave de caché: ingredientes ordenados sin duplicados, filtros ordenados y k."""
+    return tuple(sorted(set(ingredientes))), tuple(sorted(filters.items())), k
+
+def _recommend_batch(peticiones: List[Peticion]) -> List[List[Dict]]:
+    """Top-k de varias peticiones de chat a la vez; las repetidas salen de la caché."""
+    keys = [_canonical(*p) for p in peticiones]
+    out  = [_RESULTS.get(key) for key in keys]
+
+    miss = {key: None for key, recs in zip(keys, out) if recs is None}
+    if miss:
+        recs = _score_peticiones([(list(i), dict(f), k) for i, f, k in miss])
+        for key, r in zip(miss, recs):
+            _RESULTS.put(key, r)
+            miss[key] = r
+    return [recs if recs is not None else miss[key] for key, recs in zip(keys, out)]
+
+def _score_peticiones(peticiones: List[Peticion]) -> List[List[Dict]]:
+    """Top-k sin caché para un lote de peticiones."""
+    if not peticiones:
+        return []
+
+    terms = [_terms(ingredientes, filters) for ingredientes, filters, _ in peticiones]
+    max_k = min(max(k for _, _, k in peticiones), _RECIPE_IDX.numel())
+    if _ANN is not None:
+        top_s, top_pos = _topk_ann(terms, max_k)
+    else:
+        top_s, top_pos = _topk_exact(terms, max_k)
     top_ids = _RECIPE_IDX[top_pos]
 
     return [
-        {"dish": _TF.entity_id_to_label[int(i)], "score": float(s)}
-        for i, s in zip(top_ids.tolist(), top_s.tolist())
+        [
+            {"dish": _TF.entity_id_to_label[int(i)], "score": float(s)}
+            for i, s in zip(top_ids[b, :k].tolist(), top_s[b, :k].tolist())
+        ]
+        for b, (_, _, k) in enumerate(peticiones)
     ]
 
+def _recommend(ingredientes: List[str],
+               filters: Dict[str, str],
+               k: int) -> List[Dict]:
+    return _recommend_batch([(ingredientes, filters, k)])[0]
+
+def _decode(raw: bytes) -> Dict:
+    """Pedido binario o JSON; si trae ids de un vocabulario más nuevo, comprueba antes si hay bundle nuevo.
+
+    Sin bundle (formato antiguo) no hay nada que recargar y el VocabError se propaga.
+    """
+    try:
+        return decode(raw, _VOCAB)
+    except VocabError:
+        if not BUNDLE_BLOB:
+            raise
+        _maybe_reload(force=True)
+        return decode(raw, _VOCAB)
+
 # ───────── entry-point ─────────
 @functions_framework.cloud_event
 def main(event):
+    _maybe_reload()
     _load_assets()
 
-    data = json.loads(base64.b64decode(event.data["message"]["data"]).decode())
+    try:
+        data = _decode(base64.b64decode(event.data["message"]["data"]))
+    except VocabError as e:
+        # reintentarlo no lo arregla: los emisores usan un vocabulario que esta instancia no tiene
+        logging.error(f"[Recomendador] pedido descartado: {e} (¿VOCAB_BLOB sin BUNDLE_BLOB?)")
+        return
     chat_id   = data["chat_id"]
     ingr      = data["ingredientes"]          
     filters   = data.get("filters", {})
     k         = int(data.get("k", 5))
 
     recs = _recommend(ingr, filters, k)
+    logging.debug(f"[Recomendador] caché {_RESULTS.stats()}")
 
     publisher.publish(
         topic_out,
-        json.dumps({
+        encode(RESPUESTA, {
             "chat_id": chat_id,
             "ingredientes": ingr,         
             "recomendaciones": recs,
-        }).encode(),
+        }),
     )
+    publisher.flush()   # no volver con el mensaje aún en el batch (la instancia se congela)
+    logging.debug(f"[Recomendador] Pub/Sub {publisher.stats()}")
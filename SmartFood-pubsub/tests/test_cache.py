@@ -0,0 +1,89 @@
+"""
+Tests de recomendador/cache.py (LRU con TTL y versión del bundle).
+
+    cd SmartFood-pubsub && python -m unittest tests.test_cache
+"""
+
+import sys
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "recomendador"))
+
+from cache import LRUCache  # noqa: E402
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_get_put_and_counters(self):
+        cache = LRUCache(4)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("a", []), [])
+        cache.put("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("a"), 1)
+        stats = cache.stats()
+        self.assertEqual((stats["size"], stats["hits"], stats["misses"]), (1, 2, 2))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")                                   # "b" pasa a ser el más antiguo
+        cache.put("c", 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+
+    def test_put_existing_key_refreshes_it(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.put("a", 10)
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 10)
+
+    def test_ttl_expires_entries(self):
+        cache = LRUCache(4, ttl=0.01)
+        cache.put("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_no_ttl_never_expires(self):
+        cache = LRUCache(4)
+        cache.put("a", 1)
+        time.sleep(0.01)
+        self.assertEqual(cache.get("a"), 1)
+
+    def test_set_version_invalidates_only_on_change(self):
+        cache = LRUCache(4)
+        cache.set_version("v1")
+        cache.put("a", 1)
+        cache.set_version("v1")                          # misma versión: se conserva
+        self.assertEqual(cache.get("a"), 1)
+        cache.set_version("v2")                          # bundle nuevo: nada del anterior
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["version"], "v2")
+        cache.put("a", 2)
+        cache.set_version("v1")                          # vuelta atrás (recarga fallida)
+        self.assertIsNone(cache.get("a"))
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = LRUCache(0)
+        cache.put("a", 1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_clear(self):
+        cache = LRUCache(4)
+        cache.put("a", 1)
+        cache.clear()
+        self.assertIsNone(cache.get("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Paridad de etiquetas entre best.pt y los backends exportados del detector.
+
+Necesita ultralytics/cv2 y los artefactos de export_model.py junto a los
+pesos; si faltan, se salta (el backend que no tenga artefacto, también):
+
+    cd SmartFood-pubsub/detector && python export_model.py --weights best.pt --formats torchscript onnx
+    cd .. && DETECTOR_WEIGHTS=detector/best.pt python -m unittest tests.test_detector_parity
+
+DETECTOR_WEIGHTS  ruta a best.pt (detector/best.pt)
+PARITY_IMAGES     imágenes separadas por comas (file_0.jpg de la raíz del repo)
+PARITY_MIN_INGR   Jaccard medio mínimo entre conjuntos de ingredientes (0.9)
+EXPORT_IMGSZ      tamaño de exportación de los backends estáticos (640)
+"""
+
+import os
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "detector"))
+
+from resolution import ResolutionPolicy, detect_adaptive  # noqa: E402
+
+WEIGHTS      = Path(os.getenv("DETECTOR_WEIGHTS", str(ROOT / "detector" / "best.pt")))
+IMAGES       = os.getenv("PARITY_IMAGES", str(ROOT.parent / "file_0.jpg")).split(",")
+MIN_INGR     = float(os.getenv("PARITY_MIN_INGR", "0.9"))
+EXPORT_IMGSZ = int(os.getenv("EXPORT_IMGSZ", "640"))
+
+try:
+    import cv2
+    from backends import BACKENDS
+except ImportError:                      # sin ultralytics / opencv
+    BACKENDS = None
+
+
+class PinnedPolicyTest(unittest.TestCase):
+    def test_pinned_uses_only_export_size(self):
+        policy = ResolutionPolicy(sizes=(320, 640, 960), tile_size=512).pinned(640)
+        self.assertEqual((policy.sizes, policy.tile_size), ((640,), 640))
+
+
+@unittest.skipUnless(BACKENDS is not None and WEIGHTS.exists(),
+                     "requiere ultralytics, opencv y DETECTOR_WEIGHTS")
+class BackendParityTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.images = [cv2.imread(p) for p in IMAGES]
+        cls.policy = ResolutionPolicy.from_env()
+        ref = BACKENDS["torch"].load(WEIGHTS)
+        cls.ref = {
+            "dynamic": detect_adaptive(ref, cls.images, cls.policy),
+            "pinned": detect_adaptive(ref, cls.images, cls.policy.pinned(EXPORT_IMGSZ)),
+        }
+
+    def test_exported_backends_match_pt(self):
+        for name, backend in BACKENDS.items():
+            artifact = Path(backend.artifact(str(WEIGHTS)))
+            if name == "torch" or not artifact.exists():
+                continue
+            with self.subTest(backend=name):
+                # misma política que main.py: los estáticos, al tamaño de exportación
+                mode = "dynamic" if backend.dynamic else "pinned"
+                policy = self.policy if backend.dynamic else self.policy.pinned(EXPORT_IMGSZ)
+                got = detect_adaptive(backend.load(artifact), self.images, policy)
+                jaccard = [
+                    len(set(a) & set(b)) / len(set(a) | set(b)) if set(a) | set(b) else 1.0
+                    for a, b in zip(self.ref[mode], got)
+                ]
+                self.assertGreaterEqual(sum(jaccard) / len(jaccard), MIN_INGR,
+                                        f"{name}: {got} vs {self.ref[mode]}")
+
+
+if __name__ == "__main__":
+    unittest.main()
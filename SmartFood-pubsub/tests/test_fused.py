@@ -0,0 +1,109 @@
+"""
+Tests de fused.py con handlers de prueba en lugar de los main.py reales
+(sin modelos, Telegram ni GCS).
+
+    cd SmartFood-pubsub && python -m unittest tests.test_fused
+"""
+
+import base64
+import sys
+import threading
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import fused  # noqa: E402
+from publisher import Publisher, PublishError, set_default_client  # noqa: E402
+
+TOPIC_IN = fused.SUBSCRIPTIONS["recomendador"]
+TOPIC_OUT = fused.SUBSCRIPTIONS["mensajero"]
+
+
+class PipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.delivered = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+        def recomendador(event):
+            data = base64.b64decode(event.data["message"]["data"])
+            if data == b"boom":
+                raise RuntimeError("boom")
+            self.gate.wait(5)
+            publisher = Publisher()              # creado después: usa el LocalClient
+            publisher.publish(publisher.topic_path("local", TOPIC_OUT), data.upper())
+            publisher.flush(timeout=5)
+
+        def mensajero(event):
+            self.delivered.append(base64.b64decode(event.data["message"]["data"]))
+
+        self.handlers = {"recomendador": recomendador, "mensajero": mensajero}
+        self.pipelines = []
+
+    def tearDown(self):
+        self.gate.set()
+        for pipeline in self.pipelines:
+            pipeline.stop(timeout=5)
+        set_default_client(None)
+
+    def _pipeline(self, **kwargs) -> fused.Pipeline:
+        load = lambda stage: SimpleNamespace(main=self.handlers[stage])   # noqa: E731
+        with mock.patch.object(fused.Pipeline, "_load", staticmethod(load)):
+            pipeline = fused.Pipeline(stages=["recomendador", "mensajero"], **kwargs)
+        pipeline.start()
+        self.pipelines.append(pipeline)
+        return pipeline
+
+    def test_delivery_drain_and_stats(self):
+        pipeline = self._pipeline(workers="recomendador=2")
+        publisher = Publisher()
+        topic = publisher.topic_path("local", TOPIC_IN)
+        for i in range(20):
+            publisher.publish(topic, f"pedido {i}".encode())
+        self.assertEqual(len(publisher.flush(timeout=5)), 20)
+
+        pipeline.drain(timeout=5)
+        self.assertEqual(sorted(self.delivered), sorted(f"PEDIDO {i}".encode() for i in range(20)))
+        stats = pipeline.stats()
+        self.assertEqual({s: (v["count"], v["errors"], v["queued"]) for s, v in stats.items()},
+                         {"recomendador": (20, 0, 0), "mensajero": (20, 0, 0)})
+        self.assertGreater(stats["mensajero"]["p99_ms"], 0)
+
+    def test_failing_handler_is_counted_and_dropped(self):
+        pipeline = self._pipeline()
+        publisher = Publisher()
+        topic = publisher.topic_path("local", TOPIC_IN)
+        publisher.publish(topic, b"boom")
+        publisher.publish(topic, b"ok")
+        publisher.flush(timeout=5)
+        pipeline.drain(timeout=5)
+        self.assertEqual(self.delivered, [b"OK"])
+        self.assertEqual(pipeline.stats()["recomendador"]["errors"], 1)
+
+    def test_topic_without_stage_is_dropped(self):
+        self._pipeline()
+        publisher = Publisher()
+        with self.assertLogs(level="WARNING"):
+            publisher.publish(publisher.topic_path("local", "ingredientes_imagen"), b"foto")
+            self.assertEqual(len(publisher.flush(timeout=5)), 1)
+
+    def test_full_queue_blocks_flush(self):
+        pipeline = self._pipeline(workers="recomendador=1", queue_size=1)
+        self.gate.clear()                        # el recomendador se queda con el 1er mensaje
+        publisher = Publisher()
+        topic = publisher.topic_path("local", TOPIC_IN)
+        for i in range(3):                       # 1 en el handler, 1 en la cola, 1 esperando
+            publisher.publish(topic, f"p{i}".encode())
+        with self.assertRaises(PublishError):
+            publisher.flush(timeout=0.2)
+
+        self.gate.set()                          # el mensaje que esperaba entra igualmente
+        pipeline.drain(timeout=5)
+        self.assertEqual(sorted(self.delivered), [b"P0", b"P1", b"P2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+"""
+Tests de recomendador/incremental_update.py que no necesitan entrenar.
+
+    cd SmartFood-pubsub && python -m unittest tests.test_incremental_update
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "recomendador"))
+
+try:
+    import torch
+    from incremental_update import affected_triples, extend_vocab, resize_state
+except ImportError:                      # sin torch / pykeen
+    torch = None
+
+
+@unittest.skipIf(torch is None, "requiere torch y pykeen")
+class IncrementalUpdateTest(unittest.TestCase):
+    def test_extend_vocab_keeps_ids_and_appends_sorted(self):
+        old = {"egg": 0, "potato": 1, "recipe 1": 2}
+        new = extend_vocab(old, ["quinoa", "egg", "avocado", "potato", "quinoa"])
+        self.assertEqual({k: new[k] for k in old}, old)
+        self.assertEqual(new["avocado"], 3)
+        self.assertEqual(new["quinoa"], 4)
+        self.assertEqual(len(new), 5)
+        self.assertEqual(old, {"egg": 0, "potato": 1, "recipe 1": 2})   # no se modifica
+
+    def test_resize_state_copies_old_rows(self):
+        old = {"entity.weight": torch.arange(6.0).reshape(3, 2), "bias": torch.tensor([7.0])}
+        new = {
+            "entity.weight": torch.full((5, 2), -1.0),
+            "bias": torch.tensor([0.0]),
+            "other": torch.zeros(4, 3),
+        }
+        out = resize_state(old, new)
+        self.assertTrue(torch.equal(out["entity.weight"][:3], old["entity.weight"]))
+        self.assertTrue(torch.equal(out["entity.weight"][3:], torch.full((2, 2), -1.0)))
+        self.assertTrue(torch.equal(out["bias"], old["bias"]))
+        self.assertIs(out["other"], new["other"])
+        self.assertTrue(torch.equal(new["entity.weight"], torch.full((5, 2), -1.0)))   # sin tocar `new`
+
+    def test_resize_state_skips_incompatible_rows(self):
+        old = {"w": torch.ones(3, 2)}
+        new = {"w": torch.zeros(4, 3)}
+        self.assertTrue(torch.equal(resize_state(old, new)["w"], new["w"]))
+
+    def test_affected_triples(self):
+        # (head, rel, tail); entidades 0-3 existían, 4 es nueva
+        old = torch.tensor([[0, 0, 2], [1, 0, 3]])
+        new = torch.tensor([[0, 0, 2], [0, 0, 3], [1, 0, 3], [1, 0, 4]])
+        added, touched = affected_triples(old, new, num_old_entities=4, num_entities=5, num_relations=1)
+        self.assertEqual(added.tolist(), [False, True, False, True])
+        self.assertEqual(touched.tolist(), [True, True, True, True])
+
+        new = torch.tensor([[0, 0, 2], [0, 0, 3], [1, 0, 3]])
+        added, touched = affected_triples(old, new, num_old_entities=4, num_entities=4, num_relations=1)
+        self.assertEqual(added.tolist(), [False, True, False])
+        self.assertEqual(touched.tolist(), [True, True, False])
+
+
+if __name__ == "__main__":
+    unittest.main()
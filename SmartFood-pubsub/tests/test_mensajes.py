@@ -0,0 +1,109 @@
+"""
+Tests de comun/mensajes.py: ida y vuelta de cada tipo, vocabularios y JSON.
+
+    cd SmartFood-pubsub && python -m unittest tests.test_mensajes
+"""
+
+import json
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "comun"))
+
+from mensajes import IMAGEN, PEDIDO, RESPUESTA, Vocab, VocabError, decode, encode  # noqa: E402
+
+FILTERS = {"has_calories": "low_calories", "has_sugar": "normal_sugar"}
+OLD = Vocab(["has_calories", "has_sugar", "egg", "potato", "low_calories", "normal_sugar"])
+NEW = Vocab(OLD.labels + ["quinoa"])                     # solo crece por el final
+
+PEDIDO_MSG = {"chat_id": 123456789012, "k": 5, "ingredientes": ["egg", "potato"], "filters": FILTERS}
+
+
+class RoundTripTest(unittest.TestCase):
+    def test_pedido_with_and_without_vocab(self):
+        for vocab in (None, OLD):
+            with self.subTest(vocab=vocab is not None):
+                data = encode(PEDIDO, PEDIDO_MSG, vocab, fmt="binary")
+                self.assertEqual(data[:2], b"SF")
+                self.assertEqual(decode(data, vocab), PEDIDO_MSG)
+        self.assertLess(len(encode(PEDIDO, PEDIDO_MSG, OLD, fmt="binary")),
+                        len(encode(PEDIDO, PEDIDO_MSG, fmt="json")))
+
+    def test_unknown_terms_travel_as_strings(self):
+        msg = dict(PEDIDO_MSG, ingredientes=["egg", "dragon fruit"], filters={"has_fiber": "high_fiber"})
+        self.assertEqual(decode(encode(PEDIDO, msg, OLD, fmt="binary"), OLD), msg)
+
+    def test_defaults(self):
+        got = decode(encode(PEDIDO, {"chat_id": 1, "ingredientes": ["egg"]}, fmt="binary"))
+        self.assertEqual(got, {"chat_id": 1, "k": 5, "ingredientes": ["egg"], "filters": {}})
+
+    def test_imagen(self):
+        msg = {"chat_id": -42, "file_id": "AgACAgQAAxkBAAIB", "k": 3, "filters": FILTERS}
+        self.assertEqual(decode(encode(IMAGEN, msg, fmt="binary")), msg)
+
+    def test_respuesta(self):
+        msg = {
+            "chat_id": 7,
+            "ingredientes": ["egg"],
+            "recomendaciones": [{"dish": "potato omelette", "score": -5.5}, {"dish": "fried egg", "score": 0.25}],
+        }
+        self.assertEqual(decode(encode(RESPUESTA, msg, fmt="binary")), msg)   # scores exactos en float32
+
+
+class VocabTest(unittest.TestCase):
+    def test_newer_receiver_decodes_older_sender(self):
+        self.assertEqual(decode(encode(PEDIDO, PEDIDO_MSG, OLD, fmt="binary"), NEW), PEDIDO_MSG)
+
+    def test_older_receiver_raises(self):
+        data = encode(PEDIDO, dict(PEDIDO_MSG, ingredientes=["quinoa"]), NEW, fmt="binary")
+        with self.assertRaises(VocabError):
+            decode(data, OLD)
+        with self.assertRaises(VocabError):
+            decode(data, None)
+
+    def test_different_vocab_raises(self):
+        other = Vocab(["egg", "has_calories", "has_sugar", "potato", "low_calories", "normal_sugar"])
+        with self.assertRaises(VocabError):
+            decode(encode(PEDIDO, PEDIDO_MSG, OLD, fmt="binary"), other)
+
+    def test_message_without_vocab_ids_needs_no_vocab(self):
+        msg = dict(PEDIDO_MSG, ingredientes=["dragon fruit"], filters={})
+        self.assertEqual(decode(encode(PEDIDO, msg, OLD, fmt="binary")), msg)
+
+    def test_save_load(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "vocab.txt"
+            NEW.save(path)
+            loaded = Vocab.load(path)
+        self.assertEqual(loaded.labels, NEW.labels)
+        self.assertEqual(loaded.crc(len(OLD)), OLD.crc())
+
+
+class JSONTest(unittest.TestCase):
+    def test_json_format_and_legacy_decode(self):
+        data = encode(PEDIDO, PEDIDO_MSG, OLD, fmt="json")
+        self.assertEqual(json.loads(data), PEDIDO_MSG)
+        self.assertEqual(decode(data, OLD), PEDIDO_MSG)
+
+    def test_fallback_to_json(self):
+        cases = {
+            "nul": dict(PEDIDO_MSG, ingredientes=["egg\0potato"]),
+            "none": dict(PEDIDO_MSG, ingredientes=["egg", None]),
+            "filter_none": dict(PEDIDO_MSG, filters={"has_sugar": None}),
+            "k_range": dict(PEDIDO_MSG, k=70000),
+        }
+        for name, msg in cases.items():
+            with self.subTest(name):
+                data = encode(PEDIDO, msg, OLD, fmt="binary")
+                self.assertEqual(data[:1], b"{")
+                self.assertEqual(decode(data, OLD), msg)
+
+    def test_missing_required_field(self):
+        with self.assertRaises(KeyError):
+            encode(PEDIDO, {"ingredientes": ["egg"]}, fmt="binary")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+Tests de comun/publisher.py.
+
+La prueba de ráfaga necesita el emulador de Pub/Sub y se salta sin él:
+
+    gcloud beta emulators pubsub start --project=test &
+    $(gcloud beta emulators pubsub env-init)
+    cd SmartFood-pubsub && python -m unittest discover tests
+"""
+
+import json
+import os
+import sys
+import threading
+import unittest
+import uuid
+from concurrent.futures import Future
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "comun"))
+
+from publisher import Publisher, PublishError  # noqa: E402
+
+PROJECT = os.getenv("PUBSUB_PROJECT_ID", "test")
+
+
+class _ManualClient:
+    """Cliente con futures que resuelve el test, para probar flush sin red."""
+
+    def __init__(self):
+        self.futures = []
+
+    def topic_path(self, project, topic):
+        return f"projects/{project}/topics/{topic}"
+
+    def publish(self, topic, data, **attrs):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+
+class FlushTest(unittest.TestCase):
+    def setUp(self):
+        self.client = _ManualClient()
+        self.publisher = Publisher(client=self.client)
+        self.topic = self.client.topic_path(PROJECT, "t")
+
+    def test_flush_waits_and_returns_ids(self):
+        for i in range(3):
+            self.publisher.publish(self.topic, b"x")
+        timer = threading.Timer(0.05, lambda: [f.set_result(str(i)) for i, f in enumerate(self.client.futures)])
+        timer.start()
+        self.assertEqual(self.publisher.flush(timeout=5), ["0", "1", "2"])
+        self.assertEqual(self.publisher.stats()["t"]["count"], 3)
+        self.assertEqual(self.publisher.flush(), [])
+
+    def test_flush_raises_on_failure(self):
+        self.publisher.publish(self.topic, b"ok").set_result("1")
+        self.publisher.publish(self.topic, b"ko").set_exception(RuntimeError("boom"))
+        with self.assertRaises(PublishError):
+            self.publisher.flush(timeout=1)
+        self.assertEqual(self.publisher.stats()["t"]["errors"], 1)
+
+    def test_flush_timeout(self):
+        self.publisher.publish(self.topic, b"x")
+        with self.assertRaises(PublishError):
+            self.publisher.flush(timeout=0.05)
+
+    def test_flush_only_waits_for_own_thread(self):
+        blocked = threading.Thread(target=lambda: self.publisher.publish(self.topic, b"otro"))
+        blocked.start()
+        blocked.join()
+        self.publisher.publish(self.topic, b"mio").set_result("mio")
+        self.assertEqual(self.publisher.flush(timeout=0.5), ["mio"])
+
+
+@unittest.skipUnless(os.getenv("PUBSUB_EMULATOR_HOST"), "requiere PUBSUB_EMULATOR_HOST")
+class EmulatorTest(unittest.TestCase):
+    def setUp(self):
+        from google.cloud import pubsub_v1
+
+        self.publisher = Publisher(max_messages=50, max_latency_ms=20)
+        self.subscriber = pubsub_v1.SubscriberClient()
+        name = f"test-{uuid.uuid4().hex[:8]}"
+        self.topic = self.publisher.topic_path(PROJECT, name)
+        self.subscription = self.subscriber.subscription_path(PROJECT, name)
+        self.publisher.client.create_topic(name=self.topic)
+        self.subscriber.create_subscription(name=self.subscription, topic=self.topic)
+
+    def tearDown(self):
+        self.subscriber.delete_subscription(subscription=self.subscription)
+        self.publisher.client.delete_topic(topic=self.topic)
+        self.subscriber.close()
+
+    def test_burst_is_delivered(self):
+        threads, per_thread = 8, 50
+        ids = []
+
+        def request(t):
+            for i in range(per_thread):
+                self.publisher.publish(self.topic, json.dumps({"chat_id": t, "i": i}).encode())
+            ids.extend(self.publisher.flush(timeout=30))
+
+        workers = [threading.Thread(target=request, args=(t,)) for t in range(threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        self.assertEqual(len(set(ids)), threads * per_thread)
+        stats = self.publisher.stats()[self.topic.rsplit("/", 1)[-1]]
+        self.assertEqual((stats["count"], stats["errors"]), (threads * per_thread, 0))
+        self.assertGreater(stats["p99_ms"], 0)
+
+        received = set()
+        while len(received) < threads * per_thread:
+            resp = self.subscriber.pull(subscription=self.subscription, max_messages=1000, timeout=10)
+            if not resp.received_messages:
+                break
+            for m in resp.received_messages:
+                data = json.loads(m.message.data)
+                received.add((data["chat_id"], data["i"]))
+            self.subscriber.acknowledge(subscription=self.subscription,
+                                        ack_ids=[m.ack_id for m in resp.received_messages])
+        self.assertEqual(received, {(t, i) for t in range(threads) for i in range(per_thread)})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Tests de comun/telegram_client.py contra un servidor stub local de la API de Bot.
+
+    cd SmartFood-pubsub && python -m unittest discover tests
+"""
+
+import json
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "comun"))
+
+from telegram_client import TelegramClient  # noqa: E402
+
+
+class _StubTelegram(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"                  # keep-alive
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        method = self.path.rsplit("/", 1)[-1]
+        with server.lock:
+            server.calls.append((method, body))
+            server.ports.add(self.client_address[1])
+            status, reply = server.replies.pop(0) if server.replies else (200, None)
+        if reply is None:
+            result = {"file_path": "photos/a.jpg"} if method == "getFile" else {"message_id": len(server.calls)}
+            reply = {"ok": True, "result": result}
+        if server.delay:
+            time.sleep(server.delay)
+        self._reply(status, json.dumps(reply).encode())
+
+    def do_GET(self):
+        self._reply(200, b"JPEGDATA")
+
+    def _reply(self, status, data):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def _too_many(retry_after):
+    return 429, {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                 "parameters": {"retry_after": retry_after}}
+
+
+class TelegramClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubTelegram)
+        self.server.lock = threading.Lock()
+        self.server.calls, self.server.ports, self.server.replies = [], set(), []
+        self.server.delay = 0.0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.tg = TelegramClient("TOKEN", base_url=self.url, retries=2, backoff=0.01)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_send_reuses_connection(self):
+        for i in range(5):
+            self.assertTrue(self.tg.send(1, f"msg {i}"))
+        self.assertEqual([b["text"] for _, b in self.server.calls], [f"msg {i}" for i in range(5)])
+        self.assertEqual(self.server.calls[0], ("sendMessage", {"chat_id": 1, "text": "msg 0", "parse_mode": "Markdown"}))
+        self.assertEqual(len(self.server.ports), 1)
+
+    def test_429_waits_retry_after(self):
+        self.server.replies = [_too_many(1)]
+        start = time.monotonic()
+        self.assertTrue(self.tg.send(1, "hola"))
+        self.assertGreaterEqual(time.monotonic() - start, 1.0)
+        self.assertEqual(len(self.server.calls), 2)
+
+    def test_429_beyond_max_retry_after_gives_up(self):
+        self.server.replies = [_too_many(120)]
+        self.assertFalse(self.tg.send(1, "hola"))
+        self.assertEqual(len(self.server.calls), 1)
+        self.assertEqual(self.tg.failed, 1)
+
+    def test_server_errors_retried_then_fail(self):
+        self.server.replies = [(500, {"ok": False})] * 3
+        self.assertFalse(self.tg.send(1, "hola"))
+        self.assertEqual(len(self.server.calls), 3)           # 1 + retries
+
+    def test_bad_request_not_retried(self):
+        self.server.replies = [(400, {"ok": False, "description": "can't parse entities"})]
+        self.assertFalse(self.tg.send(1, "*roto"))
+        self.assertEqual(len(self.server.calls), 1)
+
+    def test_send_async_returns_immediately_and_keeps_order(self):
+        self.server.delay = 0.05
+        start = time.monotonic()
+        for i in range(5):
+            self.assertTrue(self.tg.send_async(1, f"msg {i}"))
+        self.assertLess(time.monotonic() - start, 0.05)
+        self.assertTrue(self.tg.flush(timeout=5))
+        self.assertEqual([b["text"] for _, b in self.server.calls], [f"msg {i}" for i in range(5)])
+        self.assertEqual(self.tg.sent, 5)
+
+    def test_send_async_bounded_queue_drops(self):
+        tg = TelegramClient("TOKEN", base_url=self.url, queue_size=2)
+        self.server.delay = 0.2
+        results = [tg.send_async(1, f"msg {i}") for i in range(6)]
+        self.assertFalse(all(results))
+        self.assertTrue(tg.flush(timeout=5))
+        self.assertEqual(tg.dropped, results.count(False))
+        self.assertEqual(tg.sent, results.count(True))
+
+    def test_async_retry_after_429(self):
+        self.server.replies = [_too_many(1)]
+        self.tg.send_async(1, "a")
+        self.tg.send_async(1, "b")
+        self.assertFalse(self.tg.flush(timeout=0.2))
+        self.assertTrue(self.tg.flush(timeout=5))
+        self.assertEqual([b["text"] for _, b in self.server.calls], ["a", "a", "b"])
+
+    def test_get_file(self):
+        self.assertEqual(self.tg.get_file("abc"), b"JPEGDATA")
+        self.assertEqual(self.server.calls, [("getFile", {"file_id": "abc"})])
+
+
+if __name__ == "__main__":
+    unittest.main()
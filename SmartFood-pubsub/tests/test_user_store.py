@@ -0,0 +1,198 @@
+"""
+Tests de webhook/user_store.py con los backends en proceso (memory / sqlite).
+
+    cd SmartFood-pubsub && python -m unittest discover tests
+"""
+
+import sys
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "webhook"))
+
+from user_store import MemoryBackend, SQLiteBackend, UserStore, make_backend  # noqa: E402
+
+START = {"state_index": 0, "prefs": {}, "state": "awaiting"}
+
+
+def _start():
+    return {"state_index": 0, "prefs": {}, "state": "awaiting"}
+
+
+class _CountingBackend(MemoryBackend):
+    def __init__(self):
+        super().__init__()
+        self.ops = []
+
+    def get(self, key):
+        self.ops.append(("get", key))
+        return super().get(key)
+
+    def set(self, key, doc):
+        self.ops.append(("set", key))
+        super().set(key, doc)
+
+    def update(self, key, fields):
+        self.ops.append(("update", key))
+        super().update(key, fields)
+
+
+class _FailingBackend(MemoryBackend):
+    """Falla las actualizaciones mientras `down` sea True."""
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+
+    def update(self, key, fields):
+        if self.down:
+            raise ConnectionError("backend caído")
+        super().update(key, fields)
+
+
+class UserStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = _CountingBackend()
+        self.store = UserStore(self.backend, ttl=0, flush_after=3600)
+
+    def test_get_reads_through_once(self):
+        self.backend.set("1", {"state": "ready"})
+        self.backend.ops.clear()
+        self.assertEqual(self.store.get(1), {"state": "ready"})
+        self.assertEqual(self.store.get(1), {"state": "ready"})
+        self.assertEqual(self.backend.ops, [("get", "1")])
+        self.assertIsNone(self.store.get(2))
+
+    def test_set_is_written_immediately(self):
+        self.store.set(1, _start())
+        self.assertEqual(self.backend.get("1"), START)
+
+    def test_update_is_deferred_until_flush(self):
+        self.store.set(1, _start())
+        self.store.update(1, {"prefs.has_sugar": "low_sugar", "state_index": 1}, flush=False)
+        self.store.update(1, {"prefs.has_total": "low_fat", "state_index": 2}, flush=False)
+        self.assertEqual(self.backend.get("1"), START)
+        self.assertEqual(self.store.get(1)["prefs"], {"has_sugar": "low_sugar", "has_total": "low_fat"})
+
+        self.backend.ops.clear()
+        self.store.flush()
+        self.assertEqual(self.backend.ops, [("update", "1")])
+        self.assertEqual(self.backend.get("1"), {
+            "state_index": 2, "state": "awaiting",
+            "prefs": {"has_sugar": "low_sugar", "has_total": "low_fat"},
+        })
+
+    def test_update_with_flush_writes_pending_fields_too(self):
+        self.store.set(1, _start())
+        self.store.update(1, {"prefs.has_sugar": "low_sugar"}, flush=False)
+        self.store.update(1, {"state": "ready"})
+        self.assertEqual(self.backend.get("1")["prefs"], {"has_sugar": "low_sugar"})
+        self.assertEqual(self.backend.get("1")["state"], "ready")
+
+    def test_stale_pending_is_flushed_on_next_request(self):
+        store = UserStore(self.backend, flush_after=0.01)
+        store.set(1, _start())
+        store.update(1, {"state_index": 1}, flush=False)
+        time.sleep(0.02)
+        store.get(2)
+        self.assertEqual(self.backend.get("1")["state_index"], 1)
+
+    def test_ttl_expires_cached_reads(self):
+        store = UserStore(self.backend, ttl=0.01)
+        self.backend.set("1", {"state": "awaiting"})
+        store.get(1)
+        self.backend.set("1", {"state": "ready"})          # otra instancia
+        self.assertEqual(store.get(1), {"state": "awaiting"})
+        time.sleep(0.02)
+        self.assertEqual(store.get(1), {"state": "ready"})
+
+    def test_eviction_flushes_pending(self):
+        store = UserStore(self.backend, cache_size=1, ttl=0, flush_after=3600)
+        store.set(1, _start())
+        store.update(1, {"state_index": 3}, flush=False)
+        store.set(2, _start())
+        self.assertEqual(self.backend.get("1")["state_index"], 3)
+
+    def test_late_flush_does_not_undo_other_instance(self):
+        """La instancia A se queda con respuestas pendientes; B termina el cuestionario."""
+        a = UserStore(self.backend, ttl=0, flush_after=3600)
+        b = UserStore(self.backend, ttl=0, flush_after=3600)
+        a.set(1, _start())
+        a.update(1, {"prefs.has_sugar": "low_sugar", "state_index": 1}, flush=False)
+
+        b.set(1, _start())                                   # /start de nuevo en B
+        b.update(1, {"prefs.has_sugar": "high_sugar", "state_index": 7, "state": "ready"})
+
+        a.flush()                                            # A despierta más tarde
+        doc = self.backend.get("1")
+        self.assertEqual(doc["state"], "ready")
+        self.assertEqual(set(doc), {"state", "state_index", "prefs"})
+
+
+class BackendFailureTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = _FailingBackend()
+        self.store = UserStore(self.backend, ttl=0, flush_after=3600)
+
+    def test_failed_flush_keeps_pending_fields(self):
+        self.store.set(1, _start())
+        self.store.update(1, {"prefs.has_sugar": "low_sugar", "state_index": 1}, flush=False)
+        self.backend.down = True
+        with self.assertRaises(ConnectionError):
+            self.store.update(1, {"prefs.has_carbs": "low_carbs", "state": "ready"})
+        self.assertEqual(self.backend.get("1"), START)
+
+        self.backend.down = False
+        self.store.flush(1)
+        self.assertEqual(self.backend.get("1"), {
+            "state_index": 1, "state": "ready",
+            "prefs": {"has_sugar": "low_sugar", "has_carbs": "low_carbs"},
+        })
+
+    def test_stale_flush_error_does_not_fail_other_user(self):
+        store = UserStore(self.backend, flush_after=0.01)
+        store.set(1, _start())
+        store.update(1, {"state_index": 1}, flush=False)
+        time.sleep(0.02)
+        self.backend.down = True
+        with self.assertLogs(level="ERROR"):
+            store.set(2, _start())
+            self.assertEqual(store.get(2), START)
+
+        self.backend.down = False
+        store.get(2)                                         # se reintenta
+        self.assertEqual(self.backend.get("1")["state_index"], 1)
+
+    def test_failed_eviction_keeps_user_cached(self):
+        store = UserStore(self.backend, cache_size=1, ttl=0, flush_after=3600)
+        store.set(1, _start())
+        store.update(1, {"state_index": 3}, flush=False)
+        self.backend.down = True
+        with self.assertLogs(level="ERROR"):
+            store.set(2, _start())
+        self.assertEqual(store.get(1)["state_index"], 3)
+
+        self.backend.down = False
+        store.set(3, _start())
+        self.assertEqual(self.backend.get("1")["state_index"], 3)
+
+
+class SQLiteBackendTest(unittest.TestCase):
+    def test_round_trip_and_nested_update(self):
+        backend = make_backend("sqlite", path=":memory:")
+        self.assertIsInstance(backend, SQLiteBackend)
+        self.assertIsNone(backend.get("1"))
+        backend.set("1", _start())
+        backend.update("1", {"prefs.has_carbs": "low_carbs", "state": "ready"})
+        backend.update("2", {"prefs.has_carbs": "high_carbs"})
+        self.assertEqual(backend.get("1"), {"state_index": 0, "state": "ready", "prefs": {"has_carbs": "low_carbs"}})
+        self.assertEqual(backend.get("2"), {"prefs": {"has_carbs": "high_carbs"}})
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            make_backend("redis")
+
+
+if __name__ == "__main__":
+    unittest.main()
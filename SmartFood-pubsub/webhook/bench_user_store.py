@@ -0,0 +1,140 @@
+"""
+Latencia del estado de usuario del webhook: get+set por mensaje vs UserStore
+----------------------------------------------------------------------------
+
+    python bench_user_store.py --users 200 --rtt-ms 8 --backend sqlite
+
+Reproduce el flujo de `main.py` (/start, las 7 respuestas del cuestionario y
+`--messages` listas de ingredientes por usuario, intercaladas entre usuarios)
+contra un backend local (sqlite / memory) al que se añade `--rtt-ms` de
+latencia por operación para simular el viaje de ida y vuelta a Firestore.
+
+    naive   doc.get() + doc.set(user) completo en cada mensaje (antes)
+    store   UserStore: caché de lectura + escrituras agrupadas
+
+Se mide solo el acceso al estado (sin Telegram ni Pub/Sub): p50 / p99 por
+mensaje y número de operaciones contra el backend. Al final se comprueba que
+ambos dejan el mismo estado en el backend.
+"""
+
+import argparse
+import functools
+import random
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from user_store import UserStore, make_backend
+
+QUESTIONS = ["has_calories", "has_total", "has_sugar", "has_sodium",
+             "has_protein", "has_saturated", "has_carbs"]
+
+
+class _Remote:
+    """Envuelve un backend local con una latencia fija por operación y la cuenta."""
+
+    def __init__(self, backend, rtt: float):
+        self.backend, self.rtt, self.ops = backend, rtt, 0
+
+    def __getattr__(self, name):
+        method = getattr(self.backend, name)
+
+        def call(*args):
+            self.ops += 1
+            time.sleep(self.rtt)
+            return method(*args)
+        return call
+
+
+def _messages(users: int, per_user: int, seed: int) -> List[tuple]:
+    """(chat_id, texto) con el orden de cada usuario respetado y los usuarios intercalados."""
+    rng = random.Random(seed)
+    queues = {
+        u: ["/start"] + [rng.choice(["bajo", "normal", "alto"]) for _ in QUESTIONS]
+        + ["egg, rice"] * per_user
+        for u in range(users)
+    }
+    out = []
+    while queues:
+        u = rng.choice(list(queues))
+        out.append((u, queues[u].pop(0)))
+        if not queues[u]:
+            del queues[u]
+    return out
+
+
+def _naive(backend, chat_id: int, text: str) -> None:
+    key = str(chat_id)
+    user = backend.get(key) or {"state_index": 0, "prefs": {}, "state": "awaiting"}
+    if text == "/start":
+        backend.set(key, {"state_index": 0, "prefs": {}, "state": "awaiting"})
+    elif user["state"] != "ready":
+        idx = user["state_index"]
+        user["prefs"][QUESTIONS[idx]] = text
+        user["state_index"] = idx + 1
+        if idx + 1 >= len(QUESTIONS):
+            user["state"] = "ready"
+        backend.set(key, user)
+
+
+def _store(store: UserStore, chat_id: int, text: str) -> None:
+    user = store.get(chat_id)
+    if text == "/start" or user is None:
+        user = {"state_index": 0, "prefs": {}, "state": "awaiting"}
+        store.set(chat_id, user)
+    if text == "/start":
+        return
+    if user["state"] != "ready":
+        idx = user["state_index"] + 1
+        answer = {f"prefs.{QUESTIONS[idx - 1]}": text, "state_index": idx}
+        if idx >= len(QUESTIONS):
+            store.update(chat_id, {**answer, "state": "ready"})
+        else:
+            store.update(chat_id, answer, flush=False)
+
+
+def _run(handler, messages) -> np.ndarray:
+    times = []
+    for chat_id, text in messages:
+        start = time.perf_counter()
+        handler(chat_id, text)
+        times.append(time.perf_counter() - start)
+    return np.array(times) * 1e3
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--backend", default="sqlite", choices=["sqlite", "memory"])
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--messages", type=int, default=5, help="listas de ingredientes por usuario")
+    ap.add_argument("--rtt-ms", type=float, default=8.0, help="latencia simulada por operación")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    messages = _messages(args.users, args.messages, args.seed)
+    docs: Dict[str, Dict] = {}
+    print(f"{len(messages)} mensajes de {args.users} usuarios, backend {args.backend} "
+          f"+ {args.rtt_ms:.1f} ms por operación")
+    print(f"{'modo':<6} {'p50 ms':>8} {'p99 ms':>8} {'total s':>8} {'ops':>7}")
+
+    for mode in ("naive", "store"):
+        remote = _Remote(make_backend(args.backend), args.rtt_ms / 1e3)
+        if mode == "naive":
+            handler = functools.partial(_naive, remote)
+        else:
+            store = UserStore(remote)
+            handler = functools.partial(_store, store)
+        times = _run(handler, messages)
+        if mode == "store":
+            store.flush()
+        print(f"{mode:<6} {np.percentile(times, 50):8.2f} {np.percentile(times, 99):8.2f} "
+              f"{times.sum() / 1e3:8.2f} {remote.ops:7d}")
+        docs[mode] = {str(u): remote.backend.get(str(u)) for u in range(args.users)}
+
+    print("Mismo estado final en el backend:", docs["naive"] == docs["store"])
+
+
+if __name__ == "__main__":
+    main()
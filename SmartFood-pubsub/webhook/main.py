@@ -4,17 +4,28 @@ Telegram Webhook guarda preferencias y publica ingredientes a Pub/Sub
 Topic texto  : TOPIC_RECOMENDAR   (ingredientes_detectados)
 Topic imagen : TOPIC_DETECT_IMG  (ingredientes_imagen)
 Firestore    : users  (doc.id = chat_id)
+
+Estado de usuario vía user_store.py (caché + escrituras agrupadas):
+USER_STORE        firestore | sqlite | memory (firestore)
+USER_STORE_PATH   fichero del backend sqlite (/tmp/users.db)
+USERS_COLLECTION  colección de Firestore (users)
+USER_CACHE_SIZE   usuarios en la caché de lectura (10000)
+USER_CACHE_TTL    segundos que vale una lectura cacheada (60; 0 = sin caducidad)
+USER_FLUSH_S      antigüedad tras la que una respuesta pendiente se escribe en la siguiente petición (30)
+PUBSUB_*          batching y flush de la publicación (ver publisher.py)
+MODEL_BUCKET, VOCAB_BLOB, MSG_FORMAT  formato de los mensajes (ver mensajes.py)
 """
 
-import json
 import logging
 import os
-from typing import Dict
 
 import functions_framework
 import google.auth
-import requests
-from google.cloud import firestore, pubsub_v1
+
+from mensajes import IMAGEN, PEDIDO, encode, load_vocab
+from publisher import Publisher
+from telegram_client import TelegramClient
+from user_store import UserStore, make_backend
 
 # ─────────── Config ────────────
 BOT_TOKEN = os.environ["BOT_TOKEN"]
@@ -29,9 +40,23 @@ if not PROJECT_ID:
 
 TOPIC_RECOMENDAR = os.getenv("TOPIC_RECOMENDAR", "ingredientes_detectados")  # texto
 TOPIC_DETECT_IMG = os.getenv("TOPIC_DETECT_IMG", "ingredientes_imagen")      # imagen
-
-db = firestore.Client()
-publisher = pubsub_v1.PublisherClient()
+MODEL_BUCKET     = os.getenv("MODEL_BUCKET", "smartfood-models")
+
+USER_STORE       = os.getenv("USER_STORE", "firestore")
+USER_STORE_PATH  = os.getenv("USER_STORE_PATH", "/tmp/users.db")
+USERS_COLLECTION = os.getenv("USERS_COLLECTION", "users")
+USER_CACHE_SIZE  = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL   = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_FLUSH_S     = float(os.getenv("USER_FLUSH_S", "30"))
+
+_BACKEND_ARGS = {"firestore": {"collection": USERS_COLLECTION}, "sqlite": {"path": USER_STORE_PATH}}
+store = UserStore(
+    make_backend(USER_STORE, **_BACKEND_ARGS.get(USER_STORE, {})),
+    cache_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL, flush_after=USER_FLUSH_S,
+)
+tg = TelegramClient(BOT_TOKEN)
+VOCAB = load_vocab(MODEL_BUCKET)
+publisher = Publisher()
 topic_text_path = publisher.topic_path(PROJECT_ID, TOPIC_RECOMENDAR)
 topic_img_path  = publisher.topic_path(PROJECT_ID, TOPIC_DETECT_IMG)
 
@@ -58,12 +83,15 @@ SUFIJOS = {
 
 # ───────── helpers ─────────
 def _send(chat_id: int, text: str) -> None:
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    requests.post(
-        url,
-        json={"chat_id": chat_id, "text": text, "parse_mode": "Markdown"},
-        timeout=10,
-    )
+    # preguntas y errores: síncrono; sin CPU tras responder, la cola de
+    # send_async no se vaciaría hasta la siguiente petición a esta instancia
+    tg.send(chat_id, text)
+
+def _ack(chat_id: int, text: str) -> None:
+    # acuses de foto/ingredientes: la respuesta de verdad llega después por el mensajero.
+    # Se encola antes de publicar: el envío se solapa con la espera de
+    # publisher.flush() en vez de quedarse sin CPU al responder
+    tg.send_async(chat_id, text)
 
 def _pref_entity(rel: str, answer: str) -> str:
     prefix = OPCIONES.get(answer.lower())
@@ -82,18 +110,14 @@ def main(request):
     chat_id = msg["chat"]["id"]
     text    = msg.get("text", "").strip()
 
-    # estado del usuario
-    doc  = db.collection("users").document(str(chat_id))
-    user: Dict = doc.get().to_dict() or {
-        "state_index": 0,
-        "prefs": {},
-        "state": "awaiting",
-    }
+    # estado del usuario (caché; solo lee del backend si no está o ha caducado)
+    user = store.get(chat_id)
 
     # ───────── /start ─────────
-    if text == "/start":
+    if text == "/start" or user is None:
         user = {"state_index": 0, "prefs": {}, "state": "awaiting"}
-        doc.set(user)
+        store.set(chat_id, user)
+    if text == "/start":
         _send(chat_id, QUESTIONS[0][1])         # ① solo la 1ª pregunta
         return "OK", 200
 
@@ -102,11 +126,12 @@ def main(request):
         idx = user["state_index"]
         try:
             rel, _ = QUESTIONS[idx]
-            user["prefs"][rel] = _pref_entity(rel, text)
+            entity = _pref_entity(rel, text)
             idx += 1
+            answer = {f"prefs.{rel}": entity, "state_index": idx}
             if idx >= len(QUESTIONS):
-                user.update({"state": "ready", "state_index": idx})
-                doc.set(user)
+                # fin del cuestionario: se escribe ya, junto con las respuestas pendientes
+                store.update(chat_id, {**answer, "state": "ready"})
                 _send(
                     chat_id,
                     "✅ Preferencias guardadas.\n"
@@ -115,8 +140,7 @@ def main(request):
                     "• envíame una *foto* del plato/ingredientes."
                 )
             else:
-                user["state_index"] = idx
-                doc.set(user)
+                store.update(chat_id, answer, flush=False)
                 _send(chat_id, QUESTIONS[idx][1])
         except ValueError:
             _send(chat_id, "Responde únicamente *bajo*, *normal* o *alto*.")
@@ -125,16 +149,18 @@ def main(request):
     # ───────── foto ─────────
     if "photo" in msg:
         file_id = msg["photo"][-1]["file_id"]
+        _ack(chat_id, "📷 Imagen recibida, detectando ingredientes…")
         publisher.publish(
             topic_img_path,
-            json.dumps({
+            # sin vocabulario: el detector solo reenvía los filtros
+            encode(IMAGEN, {
                 "chat_id": chat_id,
                 "file_id": file_id,
                 "filters": user["prefs"],
                 "k": 5,
-            }).encode()
+            })
         )
-        _send(chat_id, "📷 Imagen recibida, detectando ingredientes…")
+        publisher.flush()
         return "OK", 200
 
     # ───────── texto (lista ingredientes) ─────────
@@ -143,14 +169,15 @@ def main(request):
         _send(chat_id, "❗ No he reconocido ingredientes. Inténtalo de nuevo.")
         return "OK", 200
 
+    _ack(chat_id, "🍳 ¡Recibido! Buscando recetas…")
     publisher.publish(
         topic_text_path,
-        json.dumps({
+        encode(PEDIDO, {
             "chat_id": chat_id,
             "ingredientes": ingredientes,
             "filters": user["prefs"],
             "k": 5,
-        }).encode()
+        }, VOCAB)
     )
-    _send(chat_id, "🍳 ¡Recibido! Buscando recetas…")
+    publisher.flush()
     return "OK", 200
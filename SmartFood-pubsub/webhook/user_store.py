@@ -0,0 +1,267 @@
+"""
+Estado de usuario del webhook con caché y escrituras agrupadas
+----------------------------------------------------------------
+
+Sustituye al `doc.get()` + `doc.set(user)` completo por cada mensaje de
+Telegram. Backends (USER_STORE):
+
+    firestore  colección USERS_COLLECTION, doc.id = chat_id (por defecto)
+    sqlite     fichero USER_STORE_PATH, una fila JSON por usuario (tests / local)
+    memory     diccionario en proceso (tests / benchmark)
+
+`UserStore` encima del backend:
+
+* caché de lectura LRU con TTL (USER_CACHE_SIZE, USER_CACHE_TTL): un usuario
+  que ya terminó el cuestionario no vuelve a leer del backend en cada mensaje;
+* actualizaciones por campo con rutas "prefs.has_sugar" (en Firestore,
+  `set(merge=True)` de solo esos campos, no el documento entero);
+* agrupación de escrituras: `update(..., flush=False)` acumula los campos en
+  memoria y se escriben juntos al llegar un `flush=True` (fin del
+  cuestionario), en la primera petición a la instancia después de USER_FLUSH_S,
+  al expulsar al usuario de la caché o al cerrar el proceso con normalidad.
+  Lo diferido es siempre una actualización por campo; `set` (documento
+  entero, /start) se escribe al momento, porque un set tardío pisaría el
+  estado que otra instancia haya avanzado entretanto.
+
+Compromiso: no hay hilo que escriba en segundo plano (Cloud Functions quita
+la CPU a la instancia al responder), así que USER_FLUSH_S no es un límite
+garantizado. Si la instancia se congela o se recicla (SIGTERM/SIGKILL no
+pasan por atexit) las respuestas pendientes se pierden y el usuario repite
+esas preguntas; otra instancia puede también leer un estado atrasado. Las
+preferencias completas (fin del cuestionario) siempre se escriben al momento.
+
+Si el backend falla, los campos pendientes se conservan y van en la siguiente
+escritura de ese usuario (la del fin del cuestionario incluida). El error solo
+llega a la petición que escribe a ese usuario; el de los flush de otros
+usuarios (caducados, expulsados de la caché, al cerrar) se registra y ya.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+
+def _set_path(doc: Dict, path: str, value: Any) -> None:
+    *parents, leaf = path.split(".")
+    for key in parents:
+        doc = doc.setdefault(key, {})
+    doc[leaf] = value
+
+
+def _nested(fields: Dict[str, Any]) -> Dict:
+    """{"prefs.a": 1, "state": "x"} -> {"prefs": {"a": 1}, "state": "x"}"""
+    out: Dict = {}
+    for path, value in fields.items():
+        _set_path(out, path, value)
+    return out
+
+
+# ───────── backends ─────────
+class MemoryBackend:
+    """Diccionario en proceso; copia al leer y al escribir como haría un backend remoto."""
+
+    def __init__(self):
+        self._docs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Dict | None:
+        with self._lock:
+            doc = self._docs.get(key)
+            return copy.deepcopy(doc) if doc is not None else None
+
+    def set(self, key: str, doc: Dict) -> None:
+        with self._lock:
+            self._docs[key] = copy.deepcopy(doc)
+
+    def update(self, key: str, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            doc = self._docs.setdefault(key, {})
+            for path, value in fields.items():
+                _set_path(doc, path, copy.deepcopy(value))
+
+
+class SQLiteBackend:
+    """Tabla users(id, data JSON) en un fichero local (o ":memory:")."""
+
+    def __init__(self, path: str = ":memory:"):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS users (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Dict | None:
+        row = self._conn.execute("SELECT data FROM users WHERE id = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put(self, key: str, doc: Dict) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO users (id, data) VALUES (?, ?)", (key, json.dumps(doc)))
+
+    def get(self, key: str) -> Dict | None:
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key: str, doc: Dict) -> None:
+        with self._lock:
+            self._put(key, doc)
+
+    def update(self, key: str, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                doc = self._get(key) or {}
+                for path, value in fields.items():
+                    _set_path(doc, path, value)
+                self._put(key, doc)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+class FirestoreBackend:
+    def __init__(self, collection: str = "users", client=None):
+        if client is None:
+            from google.cloud import firestore
+            client = firestore.Client()
+        self._collection = client.collection(collection)
+
+    def get(self, key: str) -> Dict | None:
+        return self._collection.document(key).get().to_dict()
+
+    def set(self, key: str, doc: Dict) -> None:
+        self._collection.document(key).set(doc)
+
+    def update(self, key: str, fields: Dict[str, Any]) -> None:
+        # merge=True solo toca las hojas indicadas y crea el documento si no existe
+        self._collection.document(key).set(_nested(fields), merge=True)
+
+
+BACKENDS = {"firestore": FirestoreBackend, "sqlite": SQLiteBackend, "memory": MemoryBackend}
+
+
+def make_backend(name: str, **kwargs):
+    try:
+        return BACKENDS[name](**kwargs)
+    except KeyError:
+        raise ValueError(f"USER_STORE desconocido: {name} "
+                         f"(opciones: {', '.join(BACKENDS)})") from None
+
+
+# ───────── store ─────────
+class _Pending:
+    __slots__ = ("since", "fields")
+
+    def __init__(self):
+        self.since = time.monotonic()
+        self.fields: Dict[str, Any] = {}
+
+
+class UserStore:
+    """Caché read-through + escrituras por campo agrupadas sobre un backend."""
+
+    def __init__(self, backend, cache_size: int = 10000, ttl: float = 60.0, flush_after: float = 30.0):
+        self.backend = backend
+        self.cache_size = cache_size
+        self.ttl = ttl                         # segundos; 0 = sin caducidad
+        self.flush_after = flush_after         # antigüedad máx. de un cambio sin escribir
+        self.reads = 0                         # operaciones contra el backend
+        self.writes = 0
+        self._cache: "OrderedDict[Hashable, tuple[float, Dict]]" = OrderedDict()
+        self._pending: Dict[Hashable, _Pending] = {}
+        self._lock = threading.RLock()
+        atexit.register(self.flush)
+
+    def get(self, key: Hashable, default: Dict | None = None) -> Dict | None:
+        """Documento del usuario (el de la caché, incluidos los cambios sin escribir).
+
+        No se debe modificar: los cambios van por `update` / `set`.
+        """
+        with self._lock:
+            self._flush_stale()
+            item = self._cache.get(key)
+            if item is not None and (key in self._pending or not self.ttl
+                                     or time.monotonic() - item[0] <= self.ttl):
+                self._cache.move_to_end(key)
+                return item[1]
+        doc = self.backend.get(str(key))
+        with self._lock:
+            self.reads += 1
+            if doc is None:
+                return default
+            self._remember(key, doc)
+        return doc
+
+    def set(self, key: Hashable, doc: Dict) -> None:
+        """Sustituye el documento entero, siempre al momento (descarta lo pendiente)."""
+        with self._lock:
+            self.backend.set(str(key), doc)
+            self._pending.pop(key, None)
+            self.writes += 1
+            self._remember(key, doc)
+
+    def update(self, key: Hashable, fields: Dict[str, Any], flush: bool = True) -> None:
+        """Cambia solo `fields` ({"ruta.con.puntos": valor}); con flush=False quedan pendientes."""
+        doc = self.get(key)                    # read-through: la caché debe reflejar el cambio
+        with self._lock:
+            if doc is None:
+                doc = {}
+                self._remember(key, doc)
+            for path, value in fields.items():
+                _set_path(doc, path, value)
+            pending = self._pending.setdefault(key, _Pending())
+            pending.fields.update(fields)
+            if flush:
+                self._flush_key(key)
+            else:
+                self._flush_stale()
+
+    def flush(self, key: Hashable | None = None) -> None:
+        """Escribe los cambios pendientes de `key` (propaga el error) o de todos (lo registra)."""
+        with self._lock:
+            if key is not None:
+                self._flush_key(key)
+                return
+            for k in list(self._pending):
+                self._try_flush(k)
+
+    def _remember(self, key: Hashable, doc: Dict) -> None:
+        self._cache[key] = (time.monotonic(), doc)
+        self._cache.move_to_end(key)
+        while len(self._cache) > max(self.cache_size, 1):
+            old, item = self._cache.popitem(last=False)
+            if not self._try_flush(old):
+                # sin escribir no se puede soltar: la caché crece hasta que el backend vuelva
+                self._cache[old] = item
+                self._cache.move_to_end(old, last=False)
+                break
+
+    def _flush_key(self, key: Hashable) -> None:
+        pending = self._pending.get(key)
+        if pending is None:
+            return
+        self.backend.update(str(key), pending.fields)
+        # se quita solo si se ha escrito; si no, los campos siguen pendientes
+        self._pending.pop(key, None)
+        self.writes += 1
+
+    def _try_flush(self, key: Hashable) -> bool:
+        """`_flush_key` para otros usuarios: un error no debe romper la petición en curso."""
+        try:
+            self._flush_key(key)
+            return True
+        except Exception:
+            logging.exception(f"[UserStore] no se pudo escribir {key}, se reintenta más tarde")
+            return False
+
+    def _flush_stale(self) -> None:
+        if not self._pending:
+            return
+        limit = time.monotonic() - self.flush_after
+        for key in [k for k, p in self._pending.items() if p.since <= limit]:
+            self._try_flush(key)
@@ -1,15 +1,21 @@
+"""
+Textos de entrenamiento por receta + interacciones que los referencian.
+
+El texto (preferencias, ingredientes, descripción) se construye una sola vez
+por receta en lugar de repetirlo en cada interacción; para recuperar los pares
+(input_text, output_text) por interacción basta unir ambos ficheros por
+`recipe_id`. Los CSV se leen por trozos y se escriben en Parquet.
+"""
+
 import pandas as pd
 
-# Cargar los datos
-recipes = pd.read_csv("data/train/RAW_recipes.csv")
-interactions = pd.read_csv("data/train/interactions_train.csv")
+from preprocessed_reccomend import CHUNK_SIZE, write_chunks
 
-# Seleccionar columnas relevantes
-recipes = recipes[["id", "name", "tags", "ingredients", "steps", "description"]]
-interactions = interactions[["user_id", "recipe_id", "rating"]]
+RAW_RECIPES_PATH = "data/train/RAW_recipes.csv"
+INTERACTIONS_TRAIN_PATH = "data/train/interactions_train.csv"
+RECIPES_OUT = "data/train/processed_recipes.parquet"
+INTERACTIONS_OUT = "data/train/processed_interactions.parquet"
 
-# Combinar datos
-merged_data = pd.merge(interactions, recipes, left_on="recipe_id", right_on="id")
 
 # Preprocesar datos
 def preprocess_data(df):
@@ -21,9 +27,28 @@ def preprocess_data(df):
     df["output_text"] = df["name"]  # El nombre de la receta será el objetivo
     return df
 
-processed_data = preprocess_data(merged_data)
 
-# Guardar datos procesados en un archivo CSV
-processed_data[["input_text", "output_text"]].to_csv("data/train/processed_data.csv", index=False)
+def main():
+    recipe_ids = set()
+
+    def recipe_chunks():
+        for recipes in pd.read_csv(RAW_RECIPES_PATH, chunksize=CHUNK_SIZE,
+                                   usecols=["id", "name", "tags", "ingredients", "description"]):
+            recipe_ids.update(recipes["id"].tolist())
+            recipes = preprocess_data(recipes).rename(columns={"id": "recipe_id"})
+            yield recipes[["recipe_id", "input_text", "output_text"]]
+
+    def interaction_chunks():
+        for chunk in pd.read_csv(INTERACTIONS_TRAIN_PATH, chunksize=CHUNK_SIZE,
+                                 usecols=["user_id", "recipe_id", "rating"]):
+            # Mismo resultado que el merge interno con las recetas
+            yield chunk[chunk["recipe_id"].isin(recipe_ids)]
+
+    n_recipes = write_chunks(recipe_chunks(), RECIPES_OUT)
+    n_interactions = write_chunks(interaction_chunks(), INTERACTIONS_OUT)
+    print(f"Datos preprocesados guardados en '{RECIPES_OUT}' ({n_recipes} recetas) "
+          f"y '{INTERACTIONS_OUT}' ({n_interactions} interacciones)")
+
 
-print("Datos preprocesados guardados en 'data/train/processed_data.csv'")
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,85 @@
-import pandas as pd
 import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Esquemas y escritores de la capa clean (smartfood/src/smartfood/clean_data.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "smartfood", "src", "smartfood"))
+from clean_data import CLEAN_DIR, NUTRITION_COLUMNS, write_interactions, write_recipes  # noqa: E402
 
 # Rutas de los archivos originales y destino
 RAW_RECIPES_PATH = "data/train/RAW_recipes.csv"
 INTERACTIONS_TRAIN_PATH = "data/train/interactions_train.csv"
 INTERACTIONS_TEST_PATH = "data/train/interactions_test.csv"
 INTERACTIONS_VALIDATION_PATH = "data/train/interactions_validation.csv"
-CLEAN_DIR = "data/clean"
 
-# Crear carpeta clean si no existe
-os.makedirs(CLEAN_DIR, exist_ok=True)
+# Filas por trozo leído de los CSV (la memoria pico depende de esto, no del tamaño del fichero)
+CHUNK_SIZE = int(os.getenv("PREPROCESS_CHUNK", "100000"))
+
+
+def parse_nutrition(nutrition):
+    """Convierte la columna "[51.5, 0.0, ...]" en 7 columnas float32, sin eval; lo mal formado queda NaN.
+
+    Orden de Food.com: calorías y, en %VD, grasa, azúcar, sodio, proteína, grasa saturada y carbohidratos.
+    """
+    parts = nutrition.str.strip("[] ").str.split(",", expand=True)
+    parts = parts.reindex(columns=range(len(NUTRITION_COLUMNS)))
+    values = parts.apply(pd.to_numeric, errors="coerce").astype(np.float32)
+    values.columns = NUTRITION_COLUMNS
+    return values
+
+
+def write_chunks(chunks, path):
+    """Escribe un iterable de DataFrames en un único Parquet, un row group por trozo."""
+    writer = None
+    rows = 0
+    try:
+        for chunk in chunks:
+            if writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                writer = pq.ParquetWriter(path, table.schema)
+            else:
+                # El esquema lo fija el primer trozo (un trozo con una columna toda NaN no lo cambia)
+                table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
 
 def preprocess_raw_recipes():
-    """Procesa el archivo RAW_recipes.csv."""
-    recipes = pd.read_csv(RAW_RECIPES_PATH)
-    recipes["nutrition"] = recipes["nutrition"].apply(eval)  # Convertir cadenas a listas
-    recipes["calories"] = recipes["nutrition"].apply(lambda x: x[0])  # Extraer calorías
-    recipes = recipes[["id", "name", "minutes", "tags", "ingredients", "calories"]]
-    recipes.to_csv(os.path.join(CLEAN_DIR, "clean_recipes.csv"), index=False)
-    print("Archivo clean_recipes.csv generado.")
+    """Procesa el archivo RAW_recipes.csv por trozos."""
+    def chunks():
+        for recipes in pd.read_csv(RAW_RECIPES_PATH, chunksize=CHUNK_SIZE,
+                                   usecols=["id", "name", "minutes", "tags", "ingredients", "nutrition"]):
+            nutrition = parse_nutrition(recipes.pop("nutrition"))
+            yield pd.concat([recipes.reset_index(drop=True), nutrition.reset_index(drop=True)], axis=1)
+
+    rows = write_recipes(chunks())
+    print(f"Recetas escritas en {CLEAN_DIR}/recipes ({rows} recetas).")
+
 
 def preprocess_interactions():
-    """Combina y transforma los archivos de interacciones."""
-    train = pd.read_csv(INTERACTIONS_TRAIN_PATH)
-    test = pd.read_csv(INTERACTIONS_TEST_PATH)
-    validation = pd.read_csv(INTERACTIONS_VALIDATION_PATH)
-
-    # Añadir una columna indicando el tipo de conjunto
-    train["split"] = "train"
-    test["split"] = "test"
-    validation["split"] = "validation"
-
-    # Concatenar todos los conjuntos
-    interactions = pd.concat([train, test, validation])
-    interactions = interactions[["user_id", "recipe_id", "rating", "split"]]
-    interactions.to_csv(os.path.join(CLEAN_DIR, "clean_interactions.csv"), index=False)
-    print("Archivo clean_interactions.csv generado.")
+    """Combina y transforma los archivos de interacciones por trozos."""
+    def chunks():
+        for split, path in (("train", INTERACTIONS_TRAIN_PATH),
+                            ("test", INTERACTIONS_TEST_PATH),
+                            ("validation", INTERACTIONS_VALIDATION_PATH)):
+            for chunk in pd.read_csv(path, chunksize=CHUNK_SIZE, usecols=["user_id", "recipe_id", "rating"]):
+                # Añadir una columna indicando el tipo de conjunto
+                yield chunk.assign(split=split)
+
+    rows = write_interactions(chunks())
+    print(f"Interacciones escritas en {CLEAN_DIR}/interactions, particionadas por split ({rows} interacciones).")
+
 
 if __name__ == "__main__":
+    # Crear carpeta clean si no existe
+    os.makedirs(CLEAN_DIR, exist_ok=True)
     preprocess_raw_recipes()
     preprocess_interactions()
@@ -0,0 +1,102 @@
+"""
+Capa `data/clean/` en Parquet particionado, con tipos explícitos.
+
+    data/clean/recipes/part-*.parquet
+    data/clean/interactions/split=train/part-*.parquet
+    data/clean/interactions/split=test/part-*.parquet
+    data/clean/interactions/split=validation/part-*.parquet
+
+Los escritores aceptan un iterable de DataFrames (se escriben por trozos, sin
+cargar todo en memoria) y los convierten a los esquemas de abajo. Los lectores
+leen solo las columnas pedidas y filtran por `split` / `id` antes de
+materializar nada (las particiones que no cumplen el filtro ni se abren):
+
+    read_interactions(columns=["user_id", "recipe_id", "rating"], splits=["train"])
+"""
+
+import os
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+CLEAN_DIR = "data/clean"
+RECIPES_DIR = os.path.join(CLEAN_DIR, "recipes")
+INTERACTIONS_DIR = os.path.join(CLEAN_DIR, "interactions")
+
+NUTRITION_COLUMNS = ["calories", "total_fat", "sugar", "sodium", "protein", "saturated_fat", "carbs"]
+
+RECIPES_SCHEMA = pa.schema(
+    [
+        ("id", pa.int32()),
+        ("name", pa.string()),
+        ("minutes", pa.int32()),
+        ("tags", pa.string()),
+        ("ingredients", pa.string()),
+    ]
+    + [(col, pa.float32()) for col in NUTRITION_COLUMNS]
+)
+
+SPLITS = ["train", "test", "validation"]
+SPLIT_TYPE = pa.dictionary(pa.int8(), pa.string())
+
+INTERACTIONS_SCHEMA = pa.schema([
+    ("user_id", pa.int32()),
+    ("recipe_id", pa.int32()),
+    ("rating", pa.float32()),
+    ("split", SPLIT_TYPE),
+])
+
+_SPLIT_PARTITIONING = ds.partitioning(
+    pa.schema([("split", SPLIT_TYPE)]), dictionaries={"split": pa.array(SPLITS)}, flavor="hive"
+)
+
+
+def _batches(chunks, schema):
+    for chunk in chunks:
+        yield from pa.Table.from_pandas(chunk[schema.names], schema=schema, preserve_index=False).to_batches()
+
+
+def _write(chunks, path, schema, partitioning=None):
+    rows = 0
+
+    def counted():
+        nonlocal rows
+        for batch in _batches(chunks, schema):
+            rows += batch.num_rows
+            yield batch
+
+    ds.write_dataset(
+        counted(), path, schema=schema, format="parquet", partitioning=partitioning,
+        basename_template="part-{i}.parquet", existing_data_behavior="delete_matching",
+    )
+    return rows
+
+
+def write_recipes(chunks, path=RECIPES_DIR):
+    """Escribe trozos de recetas (columnas de RECIPES_SCHEMA); devuelve el número de filas."""
+    return _write(chunks, path, RECIPES_SCHEMA)
+
+
+def write_interactions(chunks, path=INTERACTIONS_DIR):
+    """Escribe trozos de interacciones particionados por `split`; devuelve el número de filas."""
+    return _write(chunks, path, INTERACTIONS_SCHEMA, _SPLIT_PARTITIONING)
+
+
+def recipes_dataset(path=RECIPES_DIR):
+    return ds.dataset(path, schema=RECIPES_SCHEMA, format="parquet")
+
+
+def interactions_dataset(path=INTERACTIONS_DIR):
+    return ds.dataset(path, schema=INTERACTIONS_SCHEMA, format="parquet", partitioning=_SPLIT_PARTITIONING)
+
+
+def read_recipes(path=RECIPES_DIR, columns=None, ids=None):
+    """DataFrame de recetas con solo `columns` y, si se pasa `ids`, solo esas recetas."""
+    filter_ = ds.field("id").isin(list(ids)) if ids is not None else None
+    return recipes_dataset(path).to_table(columns=columns, filter=filter_).to_pandas()
+
+
+def read_interactions(path=INTERACTIONS_DIR, columns=None, splits=None):
+    """DataFrame de interacciones con solo `columns` de los `splits` pedidos (todos si None)."""
+    filter_ = ds.field("split").isin(list(splits)) if splits is not None else None
+    return interactions_dataset(path).to_table(columns=columns, filter=filter_).to_pandas()
@@ -0,0 +1 @@
+"""Construcción del grafo de conocimiento (triples) que consume el recomendador PyKEEN (ver build_triples.py)."""
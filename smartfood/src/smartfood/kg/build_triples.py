@@ -0,0 +1,148 @@
+"""
+Triples del KG de recetas, en el formato del recomendador (head, relation, tail)
+---------------------------------------------------------------------------------
+
+    python -m kg.build_triples --out new_triplets20_optimized.csv
+    python -m kg.build_triples --sample 20000 --target-ingredients --out new_triplets20k.csv
+
+Versión vectorizada de los notebooks `nuevas_tripletas20k.ipynb` y
+`notebook_triplets.ipynb`: sin `ast.literal_eval` ni `iterrows`, cada paso es
+una operación de columna sobre todas las recetas a la vez.
+
+Por receta (head = nombre normalizado) se generan:
+
+    (receta, has_ingredient, <ingrediente>)       uno por ingrediente
+    (receta, has_calories,  low|normal|high_calories)
+    (receta, has_total,     low|normal|high_fat)
+    (receta, has_sugar,     ...)  has_sodium, has_protein, has_saturated, has_carbs
+
+con los umbrales de `NUTRI_RULES` (valor < bajo -> low, <= alto -> normal,
+> alto -> high). Son las relaciones y entidades que manda el webhook en
+`filters`, así que el CSV se sube tal cual como CSV_BLOB o se pasa a
+`export_bundle.py --triples`.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from clean_data import RECIPES_DIR, read_recipes
+
+# columna nutricional -> (umbrales (bajo, alto), relación, sufijo de la entidad)
+NUTRI_RULES = {
+    "calories":      ((174, 520), "has_calories",  "calories"),
+    "total_fat":     ((8, 41),    "has_total",     "fat"),
+    "sugar":         ((9, 68),    "has_sugar",     "sugar"),
+    "sodium":        ((5, 33),    "has_sodium",    "sodium"),
+    "protein":       ((7, 51),    "has_protein",   "protein"),
+    "saturated_fat": ((7, 52),    "has_saturated", "saturated_fat"),
+    "carbs":         ((4, 16),    "has_carbs",     "carbs"),
+}
+LEVELS = np.array(["low", "normal", "high"])
+
+# Ingredientes que reconoce el detector (FoodSeg103 + platos nepalíes), en minúscula
+TARGET_INGREDIENTS = {
+    "bacon", "garden cress-chamsur ko saag-", "green lentils", "chicken gizzards",
+    "red beans", "pumpkin -farsi-", "sajjyun -moringa drumsticks-", "chickpeas",
+    "green brinjal", "buff meat", "ham", "butter", "mutton", "papaya", "paneer",
+    "broccoli", "mayonnaise", "rahar ko daal", "soyabean -bhatmas-", "kimchi",
+    "beaten rice -chiura-", "bethu ko saag", "sugar", "ketchup", "thukpa noodles",
+    "cauliflower", "sausage", "cornflakec", "noodle", "chowmein noodles", "salt",
+    "chili powder", "palak -indian spinach-", "moringa leaves -sajyun ko munta-",
+    "soy sauce", "milk", "green soyabean -hariyo bhatmas-", "tori ko saag",
+    "chicken", "beef", "olive oil", "seaweed", "tofu", "black beans", "minced meat",
+    "green peas", "crab meat", "strawberry", "ginger", "ice", "water melon",
+    "wallnut", "long beans -bodi-", "yellow lentils", "pea", "orange", "fish",
+    "apple", "pear", "wheat"
+}
+
+
+def clean_recipe_names(names: pd.Series) -> pd.Series:
+    """Minúsculas, sin (...) ni [...], solo [a-z0-9 -] y espacios simples."""
+    return (
+        names.str.lower()
+        .str.replace(r"\([^)]*\)", "", regex=True)
+        .str.replace(r"\[[^]]*\]", "", regex=True)
+        .str.replace(r"[^a-z0-9\s-]", "", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def explode_ingredients(ingredients: pd.Series) -> pd.Series:
+    """"['a', "b's"]" -> una fila por ingrediente (minúscula, sin espacios), con el índice de la receta."""
+    parts = ingredients.str.extractall(r"'([^']*)'|\"([^\"]*)\"")
+    exploded = parts[0].fillna(parts[1]).str.strip().str.lower()
+    exploded.index = exploded.index.get_level_values(0)
+    return exploded[exploded != ""]
+
+
+def nutrition_levels(values: pd.Series, thresholds) -> pd.Series:
+    """0 / 1 / 2 (low / normal / high) por receta; -1 si falta el valor."""
+    low, high = thresholds
+    v = values.to_numpy(np.float64)
+    level = (v >= low).astype(np.int8) + (v > high)
+    return pd.Series(np.where(np.isnan(v), -1, level), index=values.index)
+
+
+def build_triples(recipes: pd.DataFrame) -> pd.DataFrame:
+    """DataFrame (head, relation, tail) a partir de name, ingredients y las columnas de NUTRI_RULES."""
+    recipes = recipes.dropna(subset=["name", "ingredients"])
+    heads = clean_recipe_names(recipes["name"])
+    keep = (heads != "") & ~heads.duplicated()      # una receta por nombre normalizado
+    recipes, heads = recipes[keep], heads[keep]
+
+    ingredients = explode_ingredients(recipes["ingredients"])
+    parts = [pd.DataFrame({
+        "head": heads.loc[ingredients.index].to_numpy(),
+        "relation": "has_ingredient",
+        "tail": ingredients.to_numpy(),
+    })]
+
+    for col, (thresholds, relation, suffix) in NUTRI_RULES.items():
+        if col not in recipes:
+            continue
+        level = nutrition_levels(recipes[col], thresholds)
+        known = (level >= 0).to_numpy()
+        parts.append(pd.DataFrame({
+            "head": heads.to_numpy()[known],
+            "relation": relation,
+            "tail": np.char.add(LEVELS[level.to_numpy()[known]], f"_{suffix}"),
+        }))
+
+    return pd.concat(parts, ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+def filter_target(recipes: pd.DataFrame, targets=TARGET_INGREDIENTS) -> pd.DataFrame:
+    """Recetas con al menos un ingrediente de `targets`."""
+    ingredients = explode_ingredients(recipes["ingredients"])
+    return recipes.loc[ingredients.index[ingredients.isin(targets)].unique()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera los triples del KG de recetas")
+    parser.add_argument("--recipes", default=RECIPES_DIR, help="dataset clean de recetas (clean_data.py)")
+    parser.add_argument("--out", default="new_triplets20_optimized.csv")
+    parser.add_argument("--sample", type=int, default=0, help="nº de recetas a muestrear (0 = todas)")
+    parser.add_argument("--target-ingredients", action="store_true",
+                        help="solo recetas con algún ingrediente de TARGET_INGREDIENTS")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    recipes = read_recipes(args.recipes, columns=["name", "ingredients", *NUTRI_RULES])
+    if args.target_ingredients:
+        recipes = filter_target(recipes)
+    if args.sample:
+        recipes = recipes.sample(n=min(args.sample, len(recipes)), random_state=args.seed)
+
+    triples = build_triples(recipes)
+    triples.to_csv(args.out, index=False)
+    print(f"{len(triples)} triples de {triples['head'].nunique()} recetas -> {args.out} "
+          f"({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
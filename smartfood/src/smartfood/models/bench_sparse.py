@@ -0,0 +1,75 @@
+"""
+Embeddings densos vs dispersos en RecommendationModel
+------------------------------------------------------
+
+    python -m models.bench_sparse --users 200000 --items 230000 --steps 50
+
+Cada modo se ejecuta en un proceso aparte (la memoria residente máxima no se
+contamina entre modos) con interacciones sintéticas del tamaño indicado:
+
+    dense   nn.Embedding + AdamW + L2 de las tablas completas (configuración actual)
+    sparse  nn.Embedding(sparse=True) + SparseAdam/AdamW + L2 de las filas del lote
+"""
+
+import argparse
+import multiprocessing as mp
+import resource
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from models.train_recommend import RecommendationModel, build_optimizers, train_step
+
+
+def _run(sparse: bool, args, out: mp.Queue) -> None:
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    model = RecommendationModel(args.users, args.items, args.dim, dropout=0.3, sparse=sparse)
+    optimizers = build_optimizers(model)
+    criterion = nn.SmoothL1Loss()
+
+    def batch():
+        return (torch.randint(args.users, (args.batch_size,)),
+                torch.randint(args.items, (args.batch_size,)),
+                torch.randint(0, 6, (args.batch_size,)).float())
+
+    for _ in range(args.warmup):
+        train_step(model, optimizers, criterion, *batch())
+
+    lat = []
+    for _ in range(args.steps):
+        b = batch()
+        t0 = time.perf_counter()
+        train_step(model, optimizers, criterion, *b).item()
+        lat.append(time.perf_counter() - t0)
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    out.put({"lat": np.array(lat), "rss_mb": rss_mb})
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=200_000)
+    ap.add_argument("--items", type=int, default=230_000)
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--batch-size", type=int, default=128)
+    ap.add_argument("--steps", type=int, default=50)
+    ap.add_argument("--warmup", type=int, default=5)
+    ap.add_argument("--threads", type=int, default=0, help="torch.set_num_threads (0 = por defecto)")
+    args = ap.parse_args()
+
+    ctx = mp.get_context("spawn")
+    print(f"{'modo':8s} {'ms/step':>8} {'p95':>8} {'RSS MB':>8}")
+    for name, sparse in (("dense", False), ("sparse", True)):
+        q = ctx.Queue()
+        p = ctx.Process(target=_run, args=(sparse, args, q))
+        p.start()
+        r = q.get()
+        p.join()
+        print(f"{name:8s} {r['lat'].mean() * 1e3:8.1f} {np.percentile(r['lat'], 95) * 1e3:8.1f} {r['rss_mb']:8.0f}")
+
+
+if __name__ == "__main__":
+    main()
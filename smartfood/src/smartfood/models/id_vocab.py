@@ -0,0 +1,88 @@
+"""
+Vocabularios de IDs (usuario / receta) del modelo de recomendación
+-------------------------------------------------------------------
+
+Cada vocabulario es un array con los IDs originales en el orden de su índice
+consecutivo: `values[i]` es el ID crudo del índice `i`. Se guarda como `.npy`
+junto al checkpoint:
+
+    data/clean/recommendation_model.pth
+    data/clean/recommendation_model.users.npy
+    data/clean/recommendation_model.recipes.npy
+
+Codificar y decodificar es vectorizado (`pd.factorize` / `pd.Index.get_indexer`).
+Al cargar solo se abre el `.npy` como memmap; la tabla hash se construye la
+primera vez que se codifica.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def vocab_paths(checkpoint):
+    """Rutas (usuarios, recetas) de los vocabularios asociados a un checkpoint .pth."""
+    checkpoint = Path(checkpoint)
+    return (checkpoint.with_suffix(".users.npy"), checkpoint.with_suffix(".recipes.npy"))
+
+
+class IdVocab:
+    def __init__(self, values=None, path=None):
+        self._values = None if values is None else self._as_array(values)
+        self._path = path
+        self._index = None
+
+    @staticmethod
+    def _as_array(values):
+        values = np.asarray(values)
+        # .npy sin pickle: los IDs no numéricos se guardan como texto
+        return values.astype(str) if values.dtype == object else values
+
+    @classmethod
+    def fit(cls, ids):
+        """Vocabulario en orden de aparición y códigos de `ids`."""
+        codes, uniques = pd.factorize(np.asarray(ids), sort=False)
+        return cls(uniques), codes.astype(np.int64)
+
+    @classmethod
+    def load(cls, path):
+        """Vocabulario perezoso: no lee el fichero hasta que se usa."""
+        return cls(path=Path(path))
+
+    def save(self, path):
+        np.save(path, self.values)
+
+    @property
+    def values(self):
+        if self._values is None:
+            self._values = np.load(self._path, mmap_mode="r")
+        return self._values
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = pd.Index(self.values)
+        return self._index
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, ids):
+        """Índices de `ids`; -1 para los que no están en el vocabulario."""
+        return self.index.get_indexer(self._as_array(np.atleast_1d(ids))).astype(np.int64)
+
+    def decode(self, codes):
+        return self.values[np.asarray(codes)]
+
+    def extend(self, ids):
+        """Codifica `ids` añadiendo al final los no vistos; los índices existentes no cambian."""
+        ids = self._as_array(np.atleast_1d(ids))
+        codes = self.index.get_indexer(ids).astype(np.int64)
+        unseen = codes < 0
+        if unseen.any():
+            new_codes, new_values = pd.factorize(ids[unseen], sort=False)
+            codes[unseen] = len(self) + new_codes
+            self._values = np.concatenate([np.asarray(self.values), self._as_array(new_values)])
+            self._index = self._index.append(pd.Index(new_values))
+        return codes
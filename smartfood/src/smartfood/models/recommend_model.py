@@ -1,19 +1,217 @@
 # Archivo: models/recommend_model.py
+"""
+Servicio de recomendación sobre el checkpoint de `train_recommend.py`.
+
+Carga `recommendation_model.pth` y los vocabularios de IDs guardados a su lado
+(`.users.npy` / `.recipes.npy`) y puntúa las recetas candidatas por trozos de
+`chunk_size`, manteniendo un top-k acumulado, de modo que la memoria pico no
+depende del número de recetas.
+
+La primera capa del MLP actúa sobre [usuario, receta], así que se separa en
+W_u·u + W_i·i + b: la parte del usuario se calcula una vez por petición y la de
+la receta una vez por trozo (o una sola vez al cargar con `precompute_items`).
+
+Con `two_tower=True` se usa en su lugar el modelo destilado de `two_tower.py`
+(`recommendation_model.two_tower.pth`): las recetas candidatas se puntúan con
+un único producto matriz-vector contra la matriz de recetas precalculada.
+
+Las preferencias nutricionales (claves de `NUTRITION_COLUMNS`: calories,
+total_fat, sugar, sodium, protein, saturated_fat, carbs) filtran por el tercil
+de cada categoría, calculado al cargar; las que vienen se combinan con AND.
+"""
+
+import ast
+
+import numpy as np
+import pandas as pd
+import torch
+
+from clean_data import NUTRITION_COLUMNS, RECIPES_DIR, read_interactions, read_recipes
+from models.id_vocab import IdVocab, vocab_paths
+from models.train_recommend import RecommendationModel
+from models.two_tower import TwoTowerModel, two_tower_path
+
+# Preferencias del cuestionario -> tercil de la categoría nutricional de las recetas
+LEVELS = {"bajo": 0, "low": 0, "normal": 1, "medio": 1, "alto": 2, "high": 2}
+
+
 class RecommendModel:
-    def __init__(self, model_path=None, interactions_path=None):
-        print("Usando modelo de recomendación dummy.")
-    
-    def recommend(self, user_id, preferences={}, ingredients=[]):
-        # Devuelve una lista de IDs de recetas dummy
-        return ["recipe_dummy1", "recipe_dummy2", "recipe_dummy3"]
-    
+    def __init__(self, model_path="data/clean/recommendation_model.pth", interactions_path=None,
+                 recipes_path=RECIPES_DIR, chunk_size=8192, precompute_items=False,
+                 two_tower=False):
+        state = torch.load(model_path, map_location="cpu", weights_only=True)
+        num_users, embedding_dim = state["user_embeddings.weight"].shape
+        num_items = state["item_embeddings.weight"].shape[0]
+        self.model = RecommendationModel(num_users, num_items, embedding_dim)
+        self.model.load_state_dict(state)
+        self.model.eval()
+
+        users_path, recipes_vocab_path = vocab_paths(model_path)
+        self.user_vocab = IdVocab.load(users_path)
+        self.recipe_vocab = IdVocab.load(recipes_vocab_path)
+
+        self.chunk_size = chunk_size
+        self.interactions_path = interactions_path
+        self._popular = None
+
+        # Primera capa del MLP partida en la mitad del usuario y la de la receta
+        first, self._tail = self.model.mlp[0], self.model.mlp[2:]
+        self._w_user = first.weight[:, :embedding_dim].detach()
+        self._w_item = first.weight[:, embedding_dim:].detach()
+        self._bias = first.bias.detach()
+        self._mean_user = self.model.user_embeddings.weight.detach().mean(0)
+        self._item_proj = None
+        if precompute_items:
+            with torch.inference_mode():
+                self._item_proj = self.model.item_embeddings.weight @ self._w_item.T
+
+        self._two_tower = None
+        if two_tower:
+            checkpoint = torch.load(two_tower_path(model_path), map_location="cpu", weights_only=True)
+            self._two_tower = TwoTowerModel(num_users, num_items, embedding_dim, checkpoint["out_dim"])
+            self._two_tower.load_state_dict(checkpoint["state_dict"])
+            self._two_tower.eval()
+            self._item_matrix = self._two_tower.item_matrix()
+            self._mean_user_tt = self._two_tower.user_embeddings.weight.detach().mean(0)
+
+        self._load_recipes(recipes_path)
+
+    # ------------------------------------------------------------------
+    # Datos de recetas (alineados con el índice del vocabulario)
+    # ------------------------------------------------------------------
+    def _load_recipes(self, recipes_path):
+        recipes = read_recipes(recipes_path, columns=["id", "name", "minutes", "ingredients", *NUTRITION_COLUMNS])
+        recipes["idx"] = self.recipe_vocab.encode(recipes["id"].to_numpy())
+        recipes = recipes[recipes["idx"] >= 0]
+        self.recipes = recipes.set_index("id")
+
+        # Terciles de cada categoría nutricional: bajo / normal / alto (-1 sin dato)
+        num_items = self.model.item_embeddings.num_embeddings
+        self._levels = {}
+        for col in NUTRITION_COLUMNS:
+            values = np.full(num_items, np.nan, dtype=np.float32)
+            values[recipes["idx"].to_numpy()] = recipes[col].to_numpy(np.float32)
+            cuts = np.nanquantile(values, [1 / 3, 2 / 3])
+            self._levels[col] = torch.from_numpy(
+                np.where(np.isnan(values), -1, np.digitize(values, cuts)).astype(np.int64)
+            )
+
+        # Índice invertido ingrediente -> recetas
+        exploded = (
+            recipes[["idx", "ingredients"]]
+            .assign(ingredient=recipes["ingredients"].str.strip("[]").str.split(", "))
+            .explode("ingredient")
+        )
+        exploded["ingredient"] = exploded["ingredient"].str.strip("'\"").str.strip().str.lower()
+        # CSR: recetas del ingrediente j en _ing_recipes[_ing_offsets[j]:_ing_offsets[j + 1]]
+        codes, self._ingredients = pd.factorize(exploded["ingredient"], sort=True)
+        order = np.argsort(codes, kind="stable")
+        self._ing_recipes = torch.from_numpy(exploded["idx"].to_numpy(np.int64)[order])
+        self._ing_offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(self._ingredients)))])
+
+    def candidate_mask(self, preferences=None, ingredients=None):
+        """Máscara booleana de recetas que cumplen cada nivel nutricional pedido y contienen algún ingrediente."""
+        mask = torch.ones(self.model.item_embeddings.num_embeddings, dtype=torch.bool)
+        for col, levels in self._levels.items():
+            level = LEVELS.get(str((preferences or {}).get(col, "")).strip().lower())
+            if level is not None:
+                mask &= levels == level
+        if ingredients:
+            found = self._ingredients.get_indexer(ingredients)
+            found = found[found >= 0]
+            if len(found):
+                has_ingredient = torch.zeros_like(mask)
+                for j in found:
+                    has_ingredient[self._ing_recipes[self._ing_offsets[j]:self._ing_offsets[j + 1]]] = True
+                mask &= has_ingredient
+        return mask
+
+    # ------------------------------------------------------------------
+    # Puntuación
+    # ------------------------------------------------------------------
+    def _user_vectors(self, user_ids, embeddings=None, mean=None):
+        """Embeddings de usuario; los desconocidos usan el usuario medio."""
+        if embeddings is None:
+            embeddings, mean = self.model.user_embeddings, self._mean_user
+        codes = torch.from_numpy(self.user_vocab.encode(np.asarray(user_ids)))
+        known = codes >= 0
+        vectors = mean.expand(len(codes), -1).clone()
+        if known.any():
+            vectors[known] = embeddings(codes[known])
+        return vectors
+
+    @torch.inference_mode()
+    def top_k(self, user_ids, k=5, candidates=None):
+        """Top-k (puntuaciones, índices de receta) para un lote de usuarios, por trozos de candidatos."""
+        if candidates is None:
+            candidates = torch.arange(self.model.item_embeddings.num_embeddings)
+        if self._two_tower is not None:
+            return self._top_k_two_tower(user_ids, k, candidates)
+
+        user_part = self._user_vectors(user_ids) @ self._w_user.T + self._bias      # [B, H]
+        batch = user_part.shape[0]
+        best_scores = torch.full((batch, 0), float("-inf"))
+        best_idx = torch.empty((batch, 0), dtype=torch.long)
+
+        for chunk in candidates.split(self.chunk_size):
+            if self._item_proj is not None:
+                item_part = self._item_proj[chunk]
+            else:
+                item_part = self.model.item_embeddings(chunk) @ self._w_item.T       # [C, H]
+            hidden = torch.relu(user_part[:, None, :] + item_part[None, :, :])       # [B, C, H]
+            scores = self._tail(hidden).squeeze(-1)                                   # [B, C]
+
+            scores = torch.cat([best_scores, scores], dim=1)
+            idx = torch.cat([best_idx, chunk.expand(batch, -1)], dim=1)
+            best_scores, pos = scores.topk(min(k, scores.shape[1]), dim=1)
+            best_idx = idx.gather(1, pos)
+        return best_scores, best_idx
+
+    def _top_k_two_tower(self, user_ids, k, candidates):
+        embeddings = self._user_vectors(user_ids, self._two_tower.user_embeddings, self._mean_user_tt)
+        users = self._two_tower.user_vectors(embeddings=embeddings)                # [B, D + 1]
+        if len(candidates) == len(self._item_matrix):
+            scores = users @ self._item_matrix.T
+        else:
+            scores = users @ self._item_matrix[candidates].T
+        best_scores, pos = scores.topk(min(k, len(candidates)), dim=1)
+        return best_scores + self._two_tower.global_bias, candidates[pos]
+
+    def recommend_batch(self, user_ids, preferences=None, ingredients=None, top_n=5):
+        """IDs de receta recomendados para cada usuario del lote (mismos filtros para todos)."""
+        mask = self.candidate_mask(preferences, ingredients)
+        candidates = mask.nonzero().squeeze(1)
+        if len(candidates) == 0:
+            return [[] for _ in user_ids]
+        _, idx = self.top_k(user_ids, top_n, candidates)
+        return [self.recipe_vocab.decode(row).tolist() for row in idx.numpy()]
+
+    def recommend(self, user_id, preferences={}, ingredients=[], top_n=5):
+        return self.recommend_batch([user_id], preferences, ingredients, top_n)[0]
+
+    # ------------------------------------------------------------------
+    # API auxiliar del bot
+    # ------------------------------------------------------------------
     def get_recipe_details(self, recipe_id):
-        # Devuelve detalles dummy para una receta
-        return {"title": f"Receta {recipe_id}", "description": "Descripción de la receta dummy"}
-    
+        if recipe_id not in self.recipes.index:
+            return {"title": f"Receta {recipe_id}", "description": ""}
+        row = self.recipes.loc[recipe_id]
+        ingredients = ast.literal_eval(row["ingredients"]) if isinstance(row["ingredients"], str) else []
+        return {
+            "title": row["name"],
+            "description": ", ".join(ingredients),
+            "minutes": int(row["minutes"]),
+            "calories": float(row["calories"]),
+        }
+
     def get_popular_recipes(self, top_n=5):
-        # Devuelve una lista dummy de recetas populares
-        return [f"recipe_dummy{i}" for i in range(1, top_n + 1)]
-    
+        if self._popular is None:
+            if self.interactions_path:
+                counts = read_interactions(self.interactions_path, columns=["recipe_id"])["recipe_id"].value_counts()
+                self._popular = counts.index.to_list()
+            else:
+                self._popular = self.recipes.index.to_list()
+        return self._popular[:top_n]
+
     def rate_recipe(self, recipe_id, rating):
         print(f"Receta {recipe_id} calificada con {rating} estrellas.")
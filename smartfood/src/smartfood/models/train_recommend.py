@@ -1,32 +1,114 @@
-import pandas as pd
+# Archivo: models/train_recommend.py
+"""
+Entrenamiento del RecommendationModel (MLP sobre embeddings usuario/receta).
+
+Importa `clean_data` y `models.*` desde src/smartfood, como el resto de
+módulos del paquete. Se puede lanzar de cualquiera de las dos formas:
+
+    cd src/smartfood && python -m models.train_recommend
+    python src/smartfood/models/train_recommend.py     # añade src/smartfood a sys.path
+"""
+
+import argparse
+import os
+import sys
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+import numpy as np
 import torch
 import torch.nn as nn
-from torch.utils.data import Dataset, DataLoader, random_split
+from torch.utils.data import Dataset, DataLoader, Sampler
 import torch.optim as optim
 from torch.optim.lr_scheduler import ReduceLROnPlateau
 
+if __package__ in (None, ""):   # ejecutado como script: la carpeta del script es models/
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from clean_data import read_interactions  # noqa: E402
+from models.id_vocab import IdVocab, vocab_paths  # noqa: E402
+
 
 class RecipeDataset(Dataset):
+    """Interacciones como tensores contiguos (user_id, recipe_id: int64; rating: float32).
+
+    `__getitem__` acepta un índice o un lote de índices, de modo que con
+    `IndexBatchSampler` y `batch_size=None` cada lote es un único slicing de tensor.
+    """
+
+    COLUMNS = {"user_id": np.int64, "recipe_id": np.int64, "rating": np.float32}
+
     def __init__(self, interactions):
-        self.interactions = interactions
+        self.user_ids, self.recipe_ids, self.ratings = (
+            torch.from_numpy(np.ascontiguousarray(np.asarray(interactions[col], dtype=dtype)))
+            for col, dtype in self.COLUMNS.items()
+        )
+
+    @classmethod
+    def from_npy(cls, directory):
+        """Carga las columnas guardadas con `save_npy` como memmap (sin copiarlas a RAM)."""
+        directory = Path(directory)
+        return cls({col: np.load(directory / f"{col}.npy", mmap_mode="c") for col in cls.COLUMNS})
+
+    def save_npy(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for col, tensor in zip(self.COLUMNS, (self.user_ids, self.recipe_ids, self.ratings)):
+            np.save(directory / f"{col}.npy", tensor.numpy())
 
     def __len__(self):
-        return len(self.interactions)
+        return len(self.ratings)
 
     def __getitem__(self, idx):
-        user_id = self.interactions.iloc[idx]["user_id"]
-        recipe_id = self.interactions.iloc[idx]["recipe_id"]
-        rating = self.interactions.iloc[idx]["rating"]
-        return torch.tensor(user_id, dtype=torch.long), torch.tensor(recipe_id, dtype=torch.long), torch.tensor(rating, dtype=torch.float)
+        idx = torch.as_tensor(idx, dtype=torch.long)
+        return self.user_ids[idx], self.recipe_ids[idx], self.ratings[idx]
+
+
+def split_indices(n, train_frac=0.8, seed=None):
+    """Permutación aleatoria de 0..n-1 partida en índices de entrenamiento y validación."""
+    generator = torch.Generator().manual_seed(seed) if seed is not None else None
+    perm = torch.randperm(n, generator=generator)
+    train_size = int(train_frac * n)
+    return perm[:train_size], perm[train_size:]
+
+
+class IndexBatchSampler(Sampler):
+    """Lotes de índices como slices de un tensor (permutado en cada época si `shuffle`)."""
+
+    def __init__(self, indices, batch_size, shuffle):
+        self.indices = torch.as_tensor(indices, dtype=torch.long)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+
+    def __len__(self):
+        return -(-len(self.indices) // self.batch_size)
+
+    def __iter__(self):
+        indices = self.indices[torch.randperm(len(self.indices))] if self.shuffle else self.indices
+        return iter(indices.split(self.batch_size))
+
+
+def batch_loader(dataset, indices, batch_size, shuffle, num_workers=0, pin_memory=False):
+    """DataLoader que pide lotes enteros al dataset en lugar de muestra a muestra."""
+    return DataLoader(
+        dataset,
+        sampler=IndexBatchSampler(indices, batch_size, shuffle),
+        batch_size=None,
+        num_workers=num_workers,
+        pin_memory=pin_memory,
+        persistent_workers=num_workers > 0,
+    )
 
 
 class RecommendationModel(nn.Module):
-    def __init__(self, num_users, num_items, embedding_dim, dropout=0.4):
+    def __init__(self, num_users, num_items, embedding_dim, dropout=0.4, sparse=False):
         super(RecommendationModel, self).__init__()
 
-        # Embeddings
-        self.user_embeddings = nn.Embedding(num_users, embedding_dim)
-        self.item_embeddings = nn.Embedding(num_items, embedding_dim)
+        # Embeddings (con sparse=True el gradiente solo contiene las filas del lote)
+        self.sparse = sparse
+        self.user_embeddings = nn.Embedding(num_users, embedding_dim, sparse=sparse)
+        self.item_embeddings = nn.Embedding(num_items, embedding_dim, sparse=sparse)
 
         # Fully connected layers
         self.mlp = nn.Sequential(
@@ -51,103 +133,168 @@ class RecommendationModel(nn.Module):
         x = torch.cat([user_embeds, item_embeds], dim=1)
         return self.mlp(x).squeeze(1)
 
-    def regularization_loss(self):
+    def regularization_loss(self, user_ids=None, item_ids=None):
+        """L2 de los embeddings: de las tablas completas o, si se pasan IDs, solo de esas filas."""
+        if user_ids is None:
+            return self.embedding_regularization * (
+                self.user_embeddings.weight.norm(2) + self.item_embeddings.weight.norm(2)
+            )
         return self.embedding_regularization * (
-            self.user_embeddings.weight.norm(2) + self.item_embeddings.weight.norm(2)
+            self.user_embeddings(user_ids.unique()).norm(2) + self.item_embeddings(item_ids.unique()).norm(2)
         )
 
 
-def normalize_ids(interactions):
-    """Normaliza los IDs de usuarios y recetas para que sean consecutivos."""
-    user_mapping = {user_id: idx for idx, user_id in enumerate(interactions["user_id"].unique())}
-    recipe_mapping = {recipe_id: idx for idx, recipe_id in enumerate(interactions["recipe_id"].unique())}
+def build_optimizers(model, lr=0.002, weight_decay=1e-4):
+    """AdamW para todo el modelo o, con embeddings dispersos, SparseAdam para las tablas + AdamW para el MLP."""
+    if not model.sparse:
+        return [optim.AdamW(model.parameters(), lr=lr, weight_decay=weight_decay)]
+    embeddings = [model.user_embeddings.weight, model.item_embeddings.weight]
+    return [
+        optim.SparseAdam(embeddings, lr=lr),
+        optim.AdamW(model.mlp.parameters(), lr=lr, weight_decay=weight_decay),
+    ]
+
+
+def train_step(model, optimizers, criterion, user_ids, recipe_ids, ratings, autocast=None):
+    """Un paso de entrenamiento; devuelve la pérdida sin desacoplar del dispositivo."""
+    with autocast or nullcontext():
+        predictions = model(user_ids, recipe_ids)
+        if model.sparse:
+            regularization = model.regularization_loss(user_ids, recipe_ids)
+        else:
+            regularization = model.regularization_loss()
+        loss = criterion(predictions.float(), ratings) + regularization
 
-    interactions["user_id"] = interactions["user_id"].map(user_mapping)
-    interactions["recipe_id"] = interactions["recipe_id"].map(recipe_mapping)
+    for optimizer in optimizers:
+        optimizer.zero_grad(set_to_none=True)
+    loss.backward()
+    for optimizer in optimizers:
+        optimizer.step()
+    return loss
 
-    return interactions, user_mapping, recipe_mapping
 
+def normalize_ids(interactions):
+    """Normaliza los IDs de usuarios y recetas para que sean consecutivos."""
+    user_vocab, interactions["user_id"] = IdVocab.fit(interactions["user_id"])
+    recipe_vocab, interactions["recipe_id"] = IdVocab.fit(interactions["recipe_id"])
+
+    return interactions, user_vocab, recipe_vocab
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Entrena RecommendationModel sobre data/clean/interactions")
+    parser.add_argument("--fast", action="store_true",
+                        help="modo rápido: autocast bfloat16 + workers del DataLoader + memoria fijada")
+    parser.add_argument("--bf16", action="store_true", help="autocast bfloat16 (implícito con --fast)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="workers del DataLoader (por defecto 0, o min(4, CPUs) con --fast)")
+    parser.add_argument("--sparse", action="store_true",
+                        help="embeddings dispersos + SparseAdam, regularización solo de las filas del lote")
+    parser.add_argument("--threads", type=int, default=0, help="torch.set_num_threads (0 = por defecto)")
+    parser.add_argument("--splits", nargs="*", default=None, help="splits de interacciones a usar (todos por defecto)")
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--epochs", type=int, default=100)
+    args = parser.parse_args(argv)
+    args.bf16 = args.bf16 or args.fast
+    if args.workers is None:
+        args.workers = min(4, os.cpu_count() or 1) if args.fast else 0
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.threads:
+        torch.set_num_threads(args.threads)
 
-def main():
     # Cargar los datos
-    interactions = pd.read_csv("data/clean/clean_interactions.csv")
+    interactions = read_interactions(columns=["user_id", "recipe_id", "rating"], splits=args.splits)
 
     # Normalizar IDs de usuarios y recetas
-    interactions, user_mapping, recipe_mapping = normalize_ids(interactions)
+    interactions, user_vocab, recipe_vocab = normalize_ids(interactions)
+    checkpoint = "data/clean/recommendation_model.pth"
+    for vocab, path in zip((user_vocab, recipe_vocab), vocab_paths(checkpoint)):
+        vocab.save(path)
 
     # Configuración del modelo
-    num_users = interactions["user_id"].nunique()
-    num_items = interactions["recipe_id"].nunique()
+    num_users = len(user_vocab)
+    num_items = len(recipe_vocab)
     embedding_dim = 256
 
+    # Dispositivo
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    # La memoria fijada solo acelera las copias host -> GPU
+    pin_memory = args.fast and device.type == "cuda"
+    autocast = (
+        torch.autocast(device_type=device.type, dtype=torch.bfloat16) if args.bf16 else nullcontext()
+    )
+
     # Crear dataset y dividir en entrenamiento/validación
     dataset = RecipeDataset(interactions)
-    train_size = int(0.8 * len(dataset))
-    val_size = len(dataset) - train_size
-    train_dataset, val_dataset = random_split(dataset, [train_size, val_size])
+    train_idx, val_idx = split_indices(len(dataset), 0.8)
 
-    train_loader = DataLoader(train_dataset, batch_size=128, shuffle=True)
-    val_loader = DataLoader(val_dataset, batch_size=128, shuffle=False)
+    train_loader = batch_loader(dataset, train_idx, args.batch_size, shuffle=True,
+                                num_workers=args.workers, pin_memory=pin_memory)
+    val_loader = batch_loader(dataset, val_idx, args.batch_size, shuffle=False,
+                              num_workers=args.workers, pin_memory=pin_memory)
 
     # Modelo, pérdida y optimizador
-    model = RecommendationModel(num_users, num_items, embedding_dim, dropout=0.3)
+    model = RecommendationModel(num_users, num_items, embedding_dim, dropout=0.3, sparse=args.sparse)
     criterion = nn.SmoothL1Loss()
-    optimizer = optim.AdamW(model.parameters(), lr=0.002, weight_decay=1e-4)
-    scheduler = ReduceLROnPlateau(optimizer, mode="min", factor=0.5, patience=5)
+    optimizers = build_optimizers(model, lr=0.002, weight_decay=1e-4)
+    schedulers = [ReduceLROnPlateau(opt, mode="min", factor=0.5, patience=5) for opt in optimizers]
 
-    # Dispositivo
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     model.to(device)
 
     # Entrenamiento
-    num_epochs = 100
+    num_epochs = args.epochs
     patience = 20
     best_val_loss = float("inf")
     epochs_no_improve = 0
 
     for epoch in range(num_epochs):
+        epoch_start = time.perf_counter()
         model.train()
-        total_train_loss = 0
+        # Las pérdidas se acumulan en el dispositivo: un único .item() por época
+        total_train_loss = torch.zeros((), device=device)
 
         for user_ids, recipe_ids, ratings in train_loader:
-            user_ids, recipe_ids, ratings = user_ids.to(device), recipe_ids.to(device), ratings.to(device)
-
-            # Forward pass
-            predictions = model(user_ids, recipe_ids)
-            loss = criterion(predictions, ratings) + model.regularization_loss()
-
-            # Backward pass
-            optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
+            user_ids = user_ids.to(device, non_blocking=True)
+            recipe_ids = recipe_ids.to(device, non_blocking=True)
+            ratings = ratings.to(device, non_blocking=True)
 
-            total_train_loss += loss.item()
+            loss = train_step(model, optimizers, criterion, user_ids, recipe_ids, ratings, autocast)
+            total_train_loss += loss.detach()
+        train_time = time.perf_counter() - epoch_start
 
         # Validación
         model.eval()
-        total_val_loss = 0
-        with torch.no_grad():
+        total_val_loss = torch.zeros((), device=device)
+        with torch.no_grad(), autocast:
             for user_ids, recipe_ids, ratings in val_loader:
-                user_ids, recipe_ids, ratings = user_ids.to(device), recipe_ids.to(device), ratings.to(device)
+                user_ids = user_ids.to(device, non_blocking=True)
+                recipe_ids = recipe_ids.to(device, non_blocking=True)
+                ratings = ratings.to(device, non_blocking=True)
                 predictions = model(user_ids, recipe_ids)
-                loss = criterion(predictions, ratings)
-                total_val_loss += loss.item()
+                total_val_loss += criterion(predictions.float(), ratings)
 
-        avg_train_loss = total_train_loss / len(train_loader)
-        avg_val_loss = total_val_loss / len(val_loader)
+        avg_train_loss = total_train_loss.item() / len(train_loader)
+        avg_val_loss = total_val_loss.item() / len(val_loader)
+        epoch_time = time.perf_counter() - epoch_start
 
         # Imprimir métricas
-        current_lr = optimizer.param_groups[0]["lr"]
-        print(f"Epoch {epoch + 1}/{num_epochs}, Train Loss: {avg_train_loss:.4f}, Val Loss: {avg_val_loss:.4f}, LR: {current_lr:.6f}")
+        current_lr = optimizers[0].param_groups[0]["lr"]
+        print(f"Epoch {epoch + 1}/{num_epochs}, Train Loss: {avg_train_loss:.4f}, Val Loss: {avg_val_loss:.4f}, LR: {current_lr:.6f}, "
+              f"{len(train_idx) / train_time:.0f} samples/s, {epoch_time:.1f}s")
 
         # Scheduler
-        scheduler.step(avg_val_loss)
+        for scheduler in schedulers:
+            scheduler.step(avg_val_loss)
 
         # Early stopping
         if avg_val_loss < best_val_loss:
             best_val_loss = avg_val_loss
             epochs_no_improve = 0
-            torch.save(model.state_dict(), "data/clean/recommendation_model.pth")
+            torch.save(model.state_dict(), checkpoint)
             print(f"Modelo mejorado guardado en epoch {epoch + 1}")
         else:
             epochs_no_improve += 1
@@ -0,0 +1,160 @@
+# Archivo: models/two_tower.py
+"""
+Variante two-tower de RecommendationModel, destilada del MLP entrenado.
+
+Cada torre proyecta su embedding a un vector de `out_dim` y la puntuación es
+
+    score(u, i) = <f(u), g(i)> + b_i + b_0
+
+con lo que todas las recetas caben en una matriz [num_items, out_dim + 1]
+(`item_matrix`, el sesgo va en la última columna) y servir a un usuario es un
+único GEMV + top-k, en lugar de pasar cada receta por el MLP.
+
+El alumno se inicializa con los embeddings del profesor y aprende a imitar sus
+puntuaciones sobre las interacciones reales más pares aleatorios
+(usuario, receta), que son los que ve en producción al puntuar el catálogo:
+
+    python -m models.two_tower --epochs 5
+    -> data/clean/recommendation_model.two_tower.pth
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+import torch.optim as optim
+
+from clean_data import INTERACTIONS_DIR, read_interactions
+from models.id_vocab import IdVocab, vocab_paths
+from models.train_recommend import RecommendationModel
+
+
+def two_tower_path(checkpoint):
+    return Path(checkpoint).with_suffix(".two_tower.pth")
+
+
+class TwoTowerModel(nn.Module):
+    def __init__(self, num_users, num_items, embedding_dim, out_dim=64, hidden_dim=256):
+        super().__init__()
+        self.user_embeddings = nn.Embedding(num_users, embedding_dim)
+        self.item_embeddings = nn.Embedding(num_items, embedding_dim)
+        self.user_tower = nn.Sequential(nn.Linear(embedding_dim, hidden_dim), nn.ReLU(), nn.Linear(hidden_dim, out_dim))
+        self.item_tower = nn.Sequential(nn.Linear(embedding_dim, hidden_dim), nn.ReLU(), nn.Linear(hidden_dim, out_dim))
+        self.item_bias = nn.Embedding(num_items, 1)
+        self.global_bias = nn.Parameter(torch.zeros(()))
+        nn.init.zeros_(self.item_bias.weight)
+
+    @classmethod
+    def from_teacher(cls, teacher, out_dim=64):
+        """Alumno con las dimensiones y los embeddings del modelo MLP."""
+        num_users, embedding_dim = teacher.user_embeddings.weight.shape
+        student = cls(num_users, teacher.item_embeddings.num_embeddings, embedding_dim, out_dim)
+        student.user_embeddings.weight.data.copy_(teacher.user_embeddings.weight.data)
+        student.item_embeddings.weight.data.copy_(teacher.item_embeddings.weight.data)
+        return student
+
+    def user_vectors(self, user_ids=None, embeddings=None):
+        """[B, out_dim + 1]: vector de usuario con un 1 final que multiplica al sesgo de la receta."""
+        if embeddings is None:
+            embeddings = self.user_embeddings(user_ids)
+        u = self.user_tower(embeddings)
+        return torch.cat([u, torch.ones_like(u[:, :1])], dim=1)
+
+    def item_vectors(self, item_ids):
+        return torch.cat([self.item_tower(self.item_embeddings(item_ids)), self.item_bias(item_ids)], dim=1)
+
+    def forward(self, user_ids, item_ids):
+        return (self.user_vectors(user_ids) * self.item_vectors(item_ids)).sum(1) + self.global_bias
+
+    @torch.inference_mode()
+    def item_matrix(self, chunk_size=65536):
+        """Vectores de todas las recetas, [num_items, out_dim + 1]."""
+        ids = torch.arange(self.item_embeddings.num_embeddings)
+        return torch.cat([self.item_vectors(chunk) for chunk in ids.split(chunk_size)])
+
+
+def distill(teacher, student, user_ids, item_ids, epochs=5, batch_size=4096, random_ratio=1.0, lr=1e-3):
+    """Ajusta `student` a las puntuaciones de `teacher` (MSE) sobre interacciones + pares aleatorios."""
+    teacher.eval()
+    num_users = student.user_embeddings.num_embeddings
+    num_items = student.item_embeddings.num_embeddings
+    optimizer = optim.AdamW(student.parameters(), lr=lr)
+    n = len(user_ids)
+    n_random = int(n * random_ratio)
+
+    for epoch in range(epochs):
+        epoch_start = time.perf_counter()
+        users = torch.cat([user_ids, torch.randint(num_users, (n_random,))])
+        items = torch.cat([item_ids, torch.randint(num_items, (n_random,))])
+        perm = torch.randperm(len(users))
+        total = torch.zeros(())
+        for batch in perm.split(batch_size):
+            u, i = users[batch], items[batch]
+            with torch.no_grad():
+                target = teacher(u, i)
+            loss = nn.functional.mse_loss(student(u, i), target)
+            optimizer.zero_grad(set_to_none=True)
+            loss.backward()
+            optimizer.step()
+            total += loss.detach()
+        steps = -(-len(users) // batch_size)
+        print(f"Epoch {epoch + 1}/{epochs}, Distill MSE: {total.item() / steps:.5f}, "
+              f"{time.perf_counter() - epoch_start:.1f}s")
+    return student
+
+
+@torch.inference_mode()
+def topk_agreement(teacher, student, user_ids, k=10, num_items=None):
+    """Recall@k medio del top-k del alumno respecto al del profesor sobre todo el catálogo."""
+    num_items = num_items or teacher.item_embeddings.num_embeddings
+    items = torch.arange(num_items)
+    matrix = student.item_matrix()
+    recall = []
+    for u in user_ids.tolist():
+        ref = teacher(torch.full_like(items, u), items).topk(k).indices
+        got = (student.user_vectors(torch.tensor([u])) @ matrix.T).squeeze(0).topk(k).indices
+        recall.append(len(set(ref.tolist()) & set(got.tolist())) / k)
+    return sum(recall) / len(recall)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Destila recommendation_model.pth en un modelo two-tower")
+    parser.add_argument("--checkpoint", default="data/clean/recommendation_model.pth")
+    parser.add_argument("--interactions", default=INTERACTIONS_DIR)
+    parser.add_argument("--splits", nargs="*", default=None, help="splits de interacciones a usar (todos por defecto)")
+    parser.add_argument("--out-dim", type=int, default=64)
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=4096)
+    parser.add_argument("--random-ratio", type=float, default=1.0,
+                        help="pares aleatorios (usuario, receta) por cada interacción real")
+    parser.add_argument("--eval-users", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    state = torch.load(args.checkpoint, map_location="cpu", weights_only=True)
+    num_users, embedding_dim = state["user_embeddings.weight"].shape
+    teacher = RecommendationModel(num_users, state["item_embeddings.weight"].shape[0], embedding_dim)
+    teacher.load_state_dict(state)
+    teacher.eval()
+
+    user_vocab, recipe_vocab = (IdVocab.load(p) for p in vocab_paths(args.checkpoint))
+    interactions = read_interactions(args.interactions, columns=["user_id", "recipe_id"], splits=args.splits)
+    user_ids = torch.from_numpy(user_vocab.encode(interactions["user_id"].to_numpy()))
+    item_ids = torch.from_numpy(recipe_vocab.encode(interactions["recipe_id"].to_numpy()))
+    known = (user_ids >= 0) & (item_ids >= 0)
+
+    student = TwoTowerModel.from_teacher(teacher, args.out_dim)
+    distill(teacher, student, user_ids[known], item_ids[known],
+            epochs=args.epochs, batch_size=args.batch_size, random_ratio=args.random_ratio)
+
+    eval_users = torch.randperm(num_users)[:args.eval_users]
+    print(f"Recall@10 respecto al MLP: {topk_agreement(teacher, student, eval_users):.3f}")
+
+    out = two_tower_path(args.checkpoint)
+    torch.save({"out_dim": args.out_dim, "state_dict": student.state_dict()}, out)
+    print(f"Modelo two-tower guardado en {out}")
+
+
+if __name__ == "__main__":
+    main()
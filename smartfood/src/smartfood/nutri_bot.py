@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import logging
+import os
 import random
 
 import pandas as pd
@@ -26,8 +27,9 @@ logger = logging.getLogger(__name__)
 # ------------------------------------------------------------------
 # INICIALIZACIÓN DE MODELOS
 # ------------------------------------------------------------------
-yolo_model = YOLO("src/smartfood/models/yolov8x.pt") 
-recommend_model = RecommendModel("data/clean/recommendation_model.pth", interactions_path="data/clean/clean_interactions.csv")
+# YOLO_WEIGHTS admite también los artefactos exportados (.torchscript, .onnx, .int8.onnx)
+yolo_model = YOLO(os.getenv("YOLO_WEIGHTS", "src/smartfood/models/yolov8x.pt"), task="detect")
+recommend_model = RecommendModel("data/clean/recommendation_model.pth", interactions_path="data/clean/interactions")
 
 # Diccionario para almacenar datos temporales de usuarios
 user_data_store = {}
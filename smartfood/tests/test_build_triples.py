@@ -0,0 +1,69 @@
+"""Tests for `kg.build_triples` on a small fixture (same output as the notebooks)."""
+
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "smartfood"))
+
+from kg.build_triples import NUTRI_RULES, build_triples, clean_recipe_names, nutrition_levels  # noqa: E402
+
+RECIPES = pd.DataFrame({
+    "name": [
+        "Arriba  Baked Winter Squash (Mexican Style)",
+        "arriba baked winter squash",                   # mismo nombre normalizado: se descarta
+        "Mom's [Best] Chili!",
+        "(only notes)",                                 # nombre vacío tras limpiar
+        "No ingredients",
+    ],
+    "ingredients": [
+        "['winter squash', 'mexican seasoning', 'Honey ']",
+        "['butter']",
+        "[\"baker's chocolate\", 'beef', 'beef']",
+        "['salt']",
+        None,
+    ],
+    "calories": [173.9, 51.5, 520.0, 10.0, 10.0],
+    "sugar": [9.0, 0.0, 68.1, 0.0, 0.0],
+})
+
+
+class TestBuildTriples(unittest.TestCase):
+    """(head, relation, tail) de build_triples y umbrales de NUTRI_RULES."""
+
+    def test_clean_recipe_names(self):
+        self.assertEqual(
+            clean_recipe_names(RECIPES["name"]).tolist(),
+            ["arriba baked winter squash", "arriba baked winter squash", "moms chili", "", "no ingredients"],
+        )
+
+    def test_triples(self):
+        triples = build_triples(RECIPES)
+        self.assertEqual(list(triples.columns), ["head", "relation", "tail"])
+        self.assertFalse(triples.duplicated().any())
+        self.assertEqual(set(map(tuple, triples.to_numpy())), {
+            ("arriba baked winter squash", "has_ingredient", "winter squash"),
+            ("arriba baked winter squash", "has_ingredient", "mexican seasoning"),
+            ("arriba baked winter squash", "has_ingredient", "honey"),
+            ("arriba baked winter squash", "has_calories", "low_calories"),
+            ("arriba baked winter squash", "has_sugar", "normal_sugar"),
+            ("moms chili", "has_ingredient", "baker's chocolate"),
+            ("moms chili", "has_ingredient", "beef"),
+            ("moms chili", "has_calories", "normal_calories"),
+            ("moms chili", "has_sugar", "high_sugar"),
+        })
+
+    def test_level_thresholds(self):
+        # valor < bajo -> low, <= alto -> normal, > alto -> high; NaN -> sin triple
+        for col, ((low, high), _, _) in NUTRI_RULES.items():
+            with self.subTest(col=col):
+                values = pd.Series([low - 0.1, low, high, high + 0.1, np.nan])
+                self.assertEqual(nutrition_levels(values, (low, high)).tolist(), [0, 1, 1, 2, -1])
+
+    def test_missing_nutrition_value_has_no_level_triple(self):
+        recipes = RECIPES.iloc[[0]].assign(calories=np.nan)
+        relations = set(build_triples(recipes)["relation"])
+        self.assertEqual(relations, {"has_ingredient", "has_sugar"})